@@ -0,0 +1,429 @@
+# scripts/benchmark.py
+"""Concurrent benchmark runner for the NL → SQL → answer pipeline.
+
+Usage:
+    python benchmark.py                     # real DeepSeek + MySQL
+    python benchmark.py --offline           # local fake LLM, no database
+    python benchmark.py --offline --replica # ... executing SQL on an in-memory fixture replica
+    python benchmark.py --concurrency 8 --output benchmark_results.json
+    python benchmark.py --offline --compare-batch   # batched vs per-question SQL generation
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import llm_integration
+from llm_integration import (
+    BENCHMARK_QUERIES,
+    BENCHMARK_SCHEMA,
+    _results_to_natural_language,
+    _stream_results_to_natural_language,
+    query_to_sql,
+    query_to_sql_batch,
+)
+from result_cache import get_result_cache
+from fast_path import FastPath, IntentMatch, fixture_known_values, get_fast_path, load_known_values
+from replica import fixture_replica, get_replica
+from results_encoder import encode_results
+from sql_cache import get_sql_cache
+from stats_engine import fixture_stats, set_stats
+from telemetry import HistogramSink, add_sink, cached_prompt_tokens, remove_sink
+
+STAGES = ("sql_generation", "execution", "narration", "time_to_first_token", "total")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of a list of floats"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def summarize_latencies(values: List[float]) -> Dict[str, float]:
+    """Latency summary (milliseconds) for one pipeline stage"""
+    ms = [v * 1000 for v in values]
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        "p50_ms": round(_percentile(ms, 50), 2),
+        "p90_ms": round(_percentile(ms, 90), 2),
+        "p95_ms": round(_percentile(ms, 95), 2),
+        "p99_ms": round(_percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+    }
+
+
+def _run_one(
+    query_id: int,
+    query: str,
+    schema: Optional[str],
+    execute: Callable[[str], List[Dict[str, Any]]],
+    llm_client: Any,
+    analysis_type: str,
+    use_cache: bool,
+    stream: bool = False,
+    fast_path: Optional[FastPath] = None,
+    run_match: Optional[Callable[[IntentMatch], List[Dict[str, Any]]]] = None,
+) -> Dict[str, Any]:
+    """Run the three pipeline stages for one question, generating SQL only once"""
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    local = fast_path.answer(query, run=run_match) if fast_path else None
+    if local:
+        timings["total"] = timings["time_to_first_token"] = time.perf_counter() - start
+        return {
+            "query_id": query_id,
+            "query": query,
+            "sql": local.sql,
+            "answer": local.answer,
+            "rows": len(local.rows),
+            "served_by": f"fast_path:{local.intent}",
+            "error": None,
+            "latency_ms": {k: round(v * 1000, 2) for k, v in timings.items()},
+        }
+
+    sql = query_to_sql(query, schema, llm_client=llm_client, use_cache=use_cache)
+    timings["sql_generation"] = time.perf_counter() - start
+
+    rows: List[Dict[str, Any]] = []
+    error = None
+    if not sql:
+        error = "Unable to generate a valid database query"
+    else:
+        t0 = time.perf_counter()
+        try:
+            rows = execute(sql)
+        except Exception as e:
+            error = f"Query execution failed: {e}"
+        timings["execution"] = time.perf_counter() - t0
+
+    encoded = encode_results(rows)
+    if error:
+        answer = f"❌ {error}"
+    elif stream:
+        t0 = time.perf_counter()
+        parts = []
+        for text in _stream_results_to_natural_language(
+            query, rows, analysis_type, llm_client=llm_client, use_cache=use_cache
+        ):
+            if not parts:
+                timings["time_to_first_token"] = time.perf_counter() - start
+            parts.append(text)
+        answer = "".join(parts)
+        timings["narration"] = time.perf_counter() - t0
+    else:
+        t0 = time.perf_counter()
+        answer = _results_to_natural_language(
+            query=query,
+            results=rows,
+            analysis_type=analysis_type,
+            llm_client=llm_client,
+            use_cache=use_cache,
+        )
+        timings["narration"] = time.perf_counter() - t0
+        # Without streaming the first byte arrives with the whole answer
+        timings["time_to_first_token"] = time.perf_counter() - start
+
+    timings["total"] = time.perf_counter() - start
+    return {
+        "query_id": query_id,
+        "query": query,
+        "sql": sql,
+        "answer": answer,
+        "rows": len(rows),
+        "result_tokens": encoded.token_estimate,
+        "results_summarized": encoded.summarized,
+        "served_by": "llm",
+        "error": error,
+        "latency_ms": {k: round(v * 1000, 2) for k, v in timings.items()},
+    }
+
+
+def run_benchmark(
+    queries: List[str],
+    schema: Optional[str],
+    llm_client: Any = None,
+    execute: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+    concurrency: int = 4,
+    analysis_type: str = "auto",
+    use_cache: bool = True,
+    stream: bool = False,
+    output_path: Optional[str] = "benchmark_results.json",
+    verbose: bool = True,
+    fast_path: Optional[FastPath] = None,
+    run_match: Optional[Callable[[IntentMatch], List[Dict[str, Any]]]] = None,
+) -> Dict[str, Any]:
+    """
+    Run every query through the pipeline with at most `concurrency` in flight.
+    With `fast_path`, questions it recognises are answered locally (executed with
+    `run_match`, default: pooled connection) and the rest go to the LLM.
+    Returns (and optionally writes) per-query results plus a latency summary.
+    """
+    if execute is None:
+        execute = lambda sql: llm_integration.execute_sql(sql, use_cache=use_cache)  # noqa: E731
+    if verbose:
+        print(f"\n=== Benchmark Test ({len(queries)} queries, concurrency={concurrency}) ===\n")
+
+    # Fine-grained spans (pool waits, EXPLAIN, fetch), token usage and cache hits for this run
+    histograms = add_sink(HistogramSink())
+    wall_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = [
+                pool.submit(
+                    _run_one, i, q, schema, execute, llm_client, analysis_type, use_cache,
+                    stream, fast_path, run_match,
+                )
+                for i, q in enumerate(queries, 1)
+            ]
+            results = [f.result() for f in futures]
+    finally:
+        remove_sink(histograms)
+    wall_time = time.perf_counter() - wall_start
+
+    if verbose:
+        for r in results:
+            print(f"Query {r['query_id']}/{len(queries)}: {r['query']}")
+            print(f"SQL: {r['sql']}")
+            print(f"Response:\n{r['answer']}\n")
+            print("-" * 80)
+
+    summary = {
+        "queries": len(queries),
+        "concurrency": concurrency,
+        "stream": stream,
+        "failures": sum(1 for r in results if r["error"]),
+        "wall_time_s": round(wall_time, 3),
+        "throughput_qps": round(len(queries) / wall_time, 3) if wall_time else 0.0,
+        "stages": {
+            stage: summarize_latencies(
+                [r["latency_ms"][stage] / 1000 for r in results if stage in r["latency_ms"]]
+            )
+            for stage in STAGES
+        },
+        "telemetry": histograms.snapshot(),
+    }
+    if fast_path:
+        local = [r["latency_ms"]["total"] / 1000 for r in results if r["served_by"] != "llm"]
+        remote = [r["latency_ms"]["total"] / 1000 for r in results if r["served_by"] == "llm"]
+        summary["fast_path"] = {
+            "served_locally": len(local),
+            "served_by_llm": len(remote),
+            "local_total": summarize_latencies(local),
+            "llm_total": summarize_latencies(remote),
+            "p50_saved_ms": round(
+                summarize_latencies(remote)["p50_ms"] - summarize_latencies(local)["p50_ms"], 2
+            )
+            if local and remote
+            else None,
+        }
+    cache = get_sql_cache() if use_cache else None
+    if cache:
+        summary["sql_cache"] = cache.stats()
+    result_cache = get_result_cache(llm_integration._activities_version) if use_cache else None
+    if result_cache:
+        summary["result_cache"] = result_cache.stats()
+    report = {"summary": summary, "results": results}
+
+    if verbose:
+        print(f"\nWall time: {summary['wall_time_s']}s, throughput: {summary['throughput_qps']} q/s")
+        for stage, stats in summary["stages"].items():
+            print(
+                f"  {stage:<20} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms"
+            )
+        if "fast_path" in summary:
+            fp = summary["fast_path"]
+            print(
+                f"Fast path: {fp['served_locally']}/{len(queries)} served locally"
+                f" (p50 {fp['local_total']['p50_ms']}ms vs {fp['llm_total']['p50_ms']}ms via the LLM)"
+            )
+
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        if verbose:
+            print(f"\nBenchmark test complete, results saved to {output_path}")
+    return report
+
+
+class UsageMeter:
+    """Wraps an OpenAI-compatible client and totals calls and reported token usage"""
+
+    def __init__(self, llm_client: Any):
+        self._client = llm_client
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs: Any):
+        response = self._client.chat.completions.create(**kwargs)
+        usage = getattr(response, "usage", None)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+            self.cached_prompt_tokens += cached_prompt_tokens(usage) if usage else 0
+        return response
+
+    def totals(self) -> Dict[str, int]:
+        return {
+            "llm_calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+        }
+
+
+def compare_batch_sql(
+    queries: List[str],
+    schema: Optional[str],
+    llm_client: Any = None,
+    batch_size: int = llm_integration.SQL_BATCH_SIZE,
+    output_path: Optional[str] = "benchmark_results.json",
+    verbose: bool = True,
+) -> Dict[str, Any]:
+    """
+    Generate SQL for every query twice, one request per question and then
+    batched, with the SQL cache bypassed, and report calls, tokens and wall time.
+    """
+    llm_client = llm_client or llm_integration.get_client()
+    paths = {}
+
+    meter = UsageMeter(llm_client)
+    start = time.perf_counter()
+    single_sql = [query_to_sql(q, schema, llm_client=meter, use_cache=False) for q in queries]
+    paths["per_question"] = dict(meter.totals(), wall_time_s=round(time.perf_counter() - start, 3))
+
+    meter = UsageMeter(llm_client)
+    start = time.perf_counter()
+    batch_sql = query_to_sql_batch(
+        queries, schema, llm_client=meter, use_cache=False, batch_size=batch_size
+    )
+    paths["batched"] = dict(meter.totals(), wall_time_s=round(time.perf_counter() - start, 3))
+
+    single, batched = paths["per_question"], paths["batched"]
+    report = {
+        "queries": len(queries),
+        "batch_size": batch_size,
+        **paths,
+        "saved": {
+            "llm_calls": single["llm_calls"] - batched["llm_calls"],
+            "prompt_tokens": single["prompt_tokens"] - batched["prompt_tokens"],
+            "wall_time_s": round(single["wall_time_s"] - batched["wall_time_s"], 3),
+        },
+        "mismatched_sql": [
+            q for q, a, b in zip(queries, single_sql, batch_sql) if a != b
+        ],
+    }
+
+    if verbose:
+        print(f"\n=== Batched SQL generation ({len(queries)} queries, batch_size={batch_size}) ===\n")
+        for name, stats in paths.items():
+            print(
+                f"  {name:<14} calls={stats['llm_calls']} prompt_tokens={stats['prompt_tokens']}"
+                f" wall={stats['wall_time_s']}s"
+            )
+        saved = report["saved"]
+        print(
+            f"  {'saved':<14} calls={saved['llm_calls']} prompt_tokens={saved['prompt_tokens']}"
+            f" wall={saved['wall_time_s']}s"
+        )
+        if report["mismatched_sql"]:
+            print(f"  ⚠️ {len(report['mismatched_sql'])} queries got different SQL when batched")
+
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump({"batch_comparison": report}, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NL query pipeline")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--offline", action="store_true", help="Use the local fake LLM and skip MySQL")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency (s)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the SQL and result caches")
+    parser.add_argument("--stream", action="store_true", help="Stream narration and measure time to first token")
+    parser.add_argument(
+        "--static-schema", action="store_true",
+        help="Send the hard-coded schema instead of the introspected, per-question one",
+    )
+    parser.add_argument(
+        "--no-fast-path", action="store_true", help="Send every question to the LLM"
+    )
+    parser.add_argument(
+        "--compare-batch", action="store_true",
+        help="Compare batched against per-question SQL generation instead",
+    )
+    parser.add_argument(
+        "--replica", action="store_true",
+        help="Execute SQL on the local replica (offline: built from the fixture employees)",
+    )
+    parser.add_argument("--batch-size", type=int, default=llm_integration.SQL_BATCH_SIZE)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    llm_client = None
+    execute = None
+    run_match = None
+    if args.offline:
+        from fake_llm import FakeLLMClient
+
+        llm_client = FakeLLMClient(latency=args.llm_latency, jitter=args.llm_latency / 2)
+        execute = lambda sql: []  # noqa: E731  (no database offline)
+        run_match = lambda match: []  # noqa: E731
+        set_stats(fixture_stats())  # narration facts from the fixture employees
+        args.no_cache = True  # keep canned SQL and answers out of the persistent caches
+
+    replica = None
+    if args.replica:
+        replica = fixture_replica() if args.offline else get_replica(enabled=True)
+        execute = lambda sql: replica.run_guarded(sql).rows  # noqa: E731
+        run_match = lambda match: replica.query(match.sql, match.params)  # noqa: E731
+
+    fast_path = None
+    if not args.no_fast_path:
+        if replica:
+            fast_path = FastPath(load_known_values(replica, "activities"))
+        else:
+            # Offline there is no database to load departments and names from
+            fast_path = FastPath(fixture_known_values()) if args.offline else get_fast_path()
+
+    # Per-question introspected schema unless offline (no database) or asked for the static one
+    schema = BENCHMARK_SCHEMA if args.offline or args.static_schema else None
+
+    if args.compare_batch:
+        compare_batch_sql(
+            BENCHMARK_QUERIES, schema, llm_client=llm_client,
+            batch_size=args.batch_size, output_path=args.output,
+        )
+        return
+
+    run_benchmark(
+        BENCHMARK_QUERIES,
+        schema,
+        llm_client=llm_client,
+        execute=execute,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        stream=args.stream,
+        output_path=args.output,
+        fast_path=fast_path,
+        run_match=run_match,
+    )
+
+
+if __name__ == "__main__":
+    main()
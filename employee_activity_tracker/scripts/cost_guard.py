@@ -0,0 +1,127 @@
+# scripts/cost_guard.py
+"""Cost-aware execution of LLM-generated SQL.
+
+Before a generated statement runs it is EXPLAINed; plans estimated to touch
+more than QUERY_MAX_ESTIMATED_ROWS rows are rejected. Accepted statements are
+rewritten with a row cap (LIMIT) and a MAX_EXECUTION_TIME hint, then read
+through a server-side streaming cursor in bounded batches. Rejections raise
+QueryRejected; truncation is reported on the returned GuardedResult.
+"""
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import pymysql.cursors
+
+import telemetry
+
+MAX_ESTIMATED_ROWS = int(os.getenv("QUERY_MAX_ESTIMATED_ROWS", 1_000_000))
+MAX_RESULT_ROWS = int(os.getenv("QUERY_MAX_ROWS", 5000))
+MAX_EXECUTION_MS = int(os.getenv("QUERY_TIMEOUT_MS", 5000))
+FETCH_BATCH_SIZE = int(os.getenv("QUERY_FETCH_BATCH", 500))
+
+_TRAILING_LIMIT_RE = re.compile(
+    r"\bLIMIT\s+(?:(\d+)\s*,\s*)?(\d+)(?:\s+OFFSET\s+(\d+))?\s*$", re.IGNORECASE
+)
+_LEADING_SELECT_RE = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+
+
+class QueryRejected(ValueError):
+    """The plan for a generated statement is too expensive to run"""
+
+    def __init__(self, reason: str, estimated_rows: Optional[int] = None):
+        super().__init__(reason)
+        self.estimated_rows = estimated_rows
+
+
+class GuardedResult(NamedTuple):
+    rows: List[Dict[str, Any]]
+    truncated: bool
+    estimated_rows: Optional[int]
+    executed_sql: str
+
+    def notice(self) -> Optional[str]:
+        """Caller-facing message when the result set was cut off"""
+        if not self.truncated:
+            return None
+        return f"⚠️ Results truncated to the first {len(self.rows)} rows."
+
+
+def estimate_rows(cursor, sql: str) -> int:
+    """
+    Rough plan size from EXPLAIN: within a select id tables are nested-loop
+    joined (multiply rows × filtered%), separate select ids add up.
+    """
+    cursor.execute(f"EXPLAIN {sql}")
+    per_select: Dict[Any, float] = {}
+    for row in cursor.fetchall():
+        rows = float(row.get("rows") or 1)
+        filtered = float(row.get("filtered") or 100.0) / 100.0
+        per_select[row.get("id")] = per_select.get(row.get("id"), 1.0) * max(rows * filtered, 1.0)
+    return int(sum(per_select.values()))
+
+
+def cap_rows(sql: str, max_rows: int) -> str:
+    """Ensure the outermost query returns at most max_rows + 1 rows (the +1 detects truncation)"""
+    sql = sql.strip().rstrip(";").rstrip()
+    cap = max_rows + 1
+    match = _TRAILING_LIMIT_RE.search(sql)
+    if not match:
+        return f"{sql}\nLIMIT {cap}"
+    offset = match.group(1) or match.group(3)
+    if int(match.group(2)) <= cap:
+        return sql
+    limit = f"LIMIT {offset}, {cap}" if offset else f"LIMIT {cap}"
+    return sql[: match.start()] + limit
+
+
+def add_time_limit(sql: str, timeout_ms: int) -> str:
+    """MAX_EXECUTION_TIME optimizer hint on a leading SELECT (WITH queries use the session variable)"""
+    return _LEADING_SELECT_RE.sub(f"SELECT /*+ MAX_EXECUTION_TIME({timeout_ms}) */", sql, count=1)
+
+
+def run_guarded(
+    conn,
+    sql: str,
+    max_estimated_rows: int = MAX_ESTIMATED_ROWS,
+    max_rows: int = MAX_RESULT_ROWS,
+    timeout_ms: int = MAX_EXECUTION_MS,
+    batch_size: int = FETCH_BATCH_SIZE,
+) -> GuardedResult:
+    """EXPLAIN, reject or rewrite, then stream at most `max_rows` rows"""
+    with telemetry.span("db_explain") as span, conn.cursor() as cursor:
+        estimated = estimate_rows(cursor, sql)
+        span.set(estimated_rows=estimated)
+    if estimated > max_estimated_rows:
+        raise QueryRejected(
+            f"estimated {estimated:,} rows exceeds the limit of {max_estimated_rows:,}",
+            estimated,
+        )
+
+    executed_sql = add_time_limit(cap_rows(sql, max_rows), timeout_ms)
+    uses_hint = executed_sql != cap_rows(sql, max_rows)
+    rows: List[Dict[str, Any]] = []
+    previous_ms: Optional[int] = None
+    cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        if not uses_hint:
+            cursor.execute("SELECT @@SESSION.max_execution_time AS previous_ms")
+            previous_ms = int(cursor.fetchone()["previous_ms"])
+            cursor.execute(f"SET SESSION max_execution_time = {int(timeout_ms)}")
+        with telemetry.span("db_execute"):
+            cursor.execute(executed_sql)
+        with telemetry.span("db_fetch") as span:
+            while len(rows) <= max_rows:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                rows.extend(batch)
+            span.set(rows=len(rows))
+    finally:
+        cursor.close()  # drains at most the capped remainder
+        if previous_ms is not None:
+            with conn.cursor() as reset:
+                reset.execute(f"SET SESSION max_execution_time = {previous_ms}")
+
+    truncated = len(rows) > max_rows
+    return GuardedResult(rows[:max_rows], truncated, estimated, executed_sql)
@@ -0,0 +1,181 @@
+# scripts/db.py
+"""Shared MySQL access for every script: one driver (PyMySQL), one config,
+and a sized, health-checked connection pool.
+
+    from db import get_connection
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS n FROM activities")
+"""
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+import pymysql
+import pymysql.cursors
+
+# Environment variables configuration
+env_path = Path(__file__).parent.parent / ".env"
+if env_path.exists():
+    from dotenv import load_dotenv
+
+    load_dotenv(env_path)
+
+# Database configuration (defaults match docker-compose.yml)
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "mysql"),
+    "port": int(os.getenv("DB_PORT", 3306)),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", "123456"),
+    "database": os.getenv("DB_NAME", "employee_tracking"),
+    "charset": "utf8mb4",
+    "cursorclass": pymysql.cursors.DictCursor,
+    "connect_timeout": 10,
+}
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+
+
+def connect(**overrides: Any) -> pymysql.connections.Connection:
+    """Open a dedicated (unpooled) connection, e.g. for bulk loads needing special flags"""
+    return pymysql.connect(**{**DB_CONFIG, **overrides})
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of at most `size` connections.
+    Connections are created lazily, pinged when they have been idle longer than
+    `ping_interval`, recycled after `recycle` seconds, and rolled back on release
+    so no transaction or stale snapshot leaks to the next borrower.
+    """
+
+    def __init__(
+        self,
+        size: int = DB_POOL_SIZE,
+        config: Optional[Dict[str, Any]] = None,
+        timeout: float = 10.0,
+        ping_interval: float = 30.0,
+        recycle: float = 3600.0,
+    ):
+        self.size = size
+        self.config = config or DB_CONFIG
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.recycle = recycle
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._meta: Dict[int, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _new_connection(self) -> pymysql.connections.Connection:
+        conn = pymysql.connect(**self.config)
+        now = time.monotonic()
+        with self._lock:
+            self._meta[id(conn)] = {"created": now, "last_used": now}
+            self.created += 1
+        return conn
+
+    def _discard(self, conn) -> None:
+        with self._lock:
+            self._meta.pop(id(conn), None)
+            self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn) -> bool:
+        meta = self._meta.get(id(conn))
+        now = time.monotonic()
+        if meta is None or now - meta["created"] > self.recycle:
+            return False
+        if now - meta["last_used"] > self.ping_interval:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def acquire(self) -> pymysql.connections.Connection:
+        """Borrow a connection, blocking up to `timeout` seconds when all are in use"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No database connection available within {self.timeout}s")
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._new_connection()
+                if self._healthy(conn):
+                    with self._lock:
+                        self.reused += 1
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn) -> None:
+        """Return a borrowed connection; broken ones are dropped instead of pooled"""
+        try:
+            conn.rollback()
+            with self._lock:
+                self._meta[id(conn)]["last_used"] = time.monotonic()
+            self._idle.put(conn)
+        except Exception:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[pymysql.connections.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close all idle connections (borrowed ones close on release)"""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "created": self.created,
+            "reused": self.reused,
+            "discarded": self.discarded,
+        }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool sized by DB_POOL_SIZE"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+@contextmanager
+def get_connection() -> Iterator[pymysql.connections.Connection]:
+    """Borrow a connection from the shared pool for the duration of a `with` block"""
+    with get_pool().connection() as conn:
+        yield conn
@@ -0,0 +1,143 @@
+# scripts/fake_llm.py
+"""Deterministic local stand-in for the OpenAI-compatible DeepSeek client.
+
+It answers SQL-generation prompts (single or batched) with canned SQL for the
+20 benchmark questions and narration prompts with a fixed sentence, after a
+simulated, seeded latency. Used to time the pipeline offline.
+
+Usage mimics DeepSeek's context cache: prompt text whose leading 256-character
+blocks were already sent in an earlier call is reported as
+`prompt_cache_hit_tokens`, so prefix-friendly prompt layouts show up offline.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+# Canned SQL for the benchmark questions (from a reference DeepSeek run, updated to the current prompt)
+CANNED_SQL = {
+    "What is the email address of the employee who is the Sales Manager?": "SELECT DISTINCT email\nFROM activities\nWHERE job_title = 'Sales Manager';",
+    "Which employee in the company works in the Product Development department?": "SELECT DISTINCT full_name\nFROM activities\nWHERE department = 'Product Development';",
+    "What was the sales revenue of 'Wei Zhang' for the week starting on '2024-08-28'?": "SELECT total_sales_rmb\nFROM activities\nWHERE full_name = 'Wei Zhang' AND week_number = 7;",
+    "Who are the employees working in the 'Finance' department?": "SELECT DISTINCT employee_id, full_name\nFROM activities\nWHERE department = 'Finance';",
+    "Retrieve the total number of meetings attended by 'Na Li' in her weekly updates.": "SELECT SUM(num_meetings)\nFROM activities\nWHERE full_name = 'Na Li';",
+    "Which employees worked more than 40 hours during week 1?": "SELECT DISTINCT employee_id, full_name\nFROM activities\nWHERE week_number = 1 AND hours_worked > 40;",
+    "How many employees does the company have in total?": "SELECT COUNT(DISTINCT employee_id) FROM activities;",
+    "What is the average hours worked by all employees during week 2?": "SELECT AVG(hours_worked) FROM activities WHERE week_number = 2;",
+    "How much total sales revenue has the Sales department generated to date?": "SELECT SUM(total_sales_rmb)\nFROM activities\nWHERE department = 'Sales';",
+    "What is the total sales revenue generated by the company during week 1?": "SELECT SUM(total_sales_rmb)\nFROM activities\nWHERE week_number = 1;",
+    "Who worked the most hours during the first week of September 2024?": "SELECT full_name, hours_worked\nFROM activities\nWHERE week_number BETWEEN 7 AND 10\nORDER BY hours_worked DESC\nLIMIT 1;",
+    "Which employee attended the most meetings during week 2?": "SELECT employee_id, full_name, num_meetings\nFROM activities\nWHERE week_number = 2\nORDER BY num_meetings DESC\nLIMIT 1;",
+    "Which employees in the company were hired during a time of industry recession?": "SELECT DISTINCT employee_id, full_name\nFROM activities\nWHERE YEAR(hire_date) BETWEEN 2020 AND 2021;",
+    "Who are the employees that faced challenges with customer retention, and what solutions did they propose?": "SELECT DISTINCT employee_id, full_name, activities\nFROM activities\nWHERE MATCH(activities) AGAINST('retention* engagement* feedback* challenge* solution*' IN BOOLEAN MODE);",
+    "Which employees work in roles that likely require data analysis or reporting skills?": "SELECT DISTINCT employee_id, full_name, job_title\nFROM activities\nWHERE job_title LIKE '%analyst%'\n   OR job_title LIKE '%reporting%'\n   OR job_title LIKE '%data%';",
+    "List all employees who work in the IT department within the company.": "SELECT DISTINCT employee_id, full_name\nFROM activities\nWHERE department = 'IT';",
+    "Compare the hours worked by 'Wei Zhang' and 'Tao Huang' during week 1.": "SELECT full_name, hours_worked\nFROM activities\nWHERE full_name IN ('Wei Zhang', 'Tao Huang')\n  AND week_number = 1;",
+    "Who are the top 3 employees by total hours worked during the last 4 weeks?": "SELECT employee_id, full_name, SUM(hours_worked) AS total_hours\nFROM activities\nWHERE week_number BETWEEN (SELECT MAX(week_number) - 3 FROM activities) AND (SELECT MAX(week_number) FROM activities)\nGROUP BY employee_id, full_name\nORDER BY total_hours DESC\nLIMIT 3;",
+    "Who achieved the highest sales revenue in a single week, and when?": "SELECT full_name, week_number, total_sales_rmb\nFROM activities\nWHERE total_sales_rmb = (SELECT MAX(total_sales_rmb) FROM activities)\nLIMIT 1;",
+    "What is the total number of hours worked and average sales revenue for employees in the Business Development department?": "SELECT SUM(hours_worked) AS total_hours_worked,\n       AVG(total_sales_rmb) AS average_sales_revenue\nFROM activities\nWHERE department = 'Business Development';",
+}
+
+DEFAULT_SQL = "SELECT DISTINCT employee_id, full_name FROM activities;"
+
+# Granularity of the simulated prefix cache, in characters
+CACHE_BLOCK = 256
+
+_NUMBERED_QUERY_RE = re.compile(r"^\s*(\d+)\.\s+(.+?)\s*$", re.MULTILINE)
+
+
+class FakeLLMClient:
+    """Drop-in replacement for `OpenAI(...)` exposing `chat.completions.create`"""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        seed: int = 42,
+        sql_responses: Optional[Dict[str, str]] = None,
+        chunk_latency: float = 0.002,
+    ):
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.jitter = jitter
+        self.seed = seed
+        self.sql_responses = CANNED_SQL if sql_responses is None else sql_responses
+        self.calls = 0
+        self._prefixes: Set[str] = set()
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _delay(self, prompt: str) -> float:
+        """Seeded per-prompt latency, independent of call order and thread"""
+        if not self.jitter:
+            return self.latency
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest()
+        rng = random.Random(int.from_bytes(digest[:8], "big"))
+        return self.latency + rng.uniform(0, self.jitter)
+
+    def _sql_for(self, text: str) -> str:
+        # Longest match first so overlapping questions stay deterministic
+        for question in sorted(self.sql_responses, key=len, reverse=True):
+            if question in text:
+                return self.sql_responses[question]
+        return DEFAULT_SQL
+
+    def _answer(self, prompt: str) -> str:
+        if "Only output the SQL statement" in prompt:
+            return self._sql_for(prompt)
+        if "mapping every query number to its SQL statement" in prompt:
+            # Batched prompt: numbered questions between "# User queries" and the output rules
+            section = prompt.split("# User queries", 1)[1].split("# Output requirements", 1)[0]
+            return json.dumps(
+                {n: self._sql_for(q) for n, q in _NUMBERED_QUERY_RE.findall(section)},
+                ensure_ascii=False,
+            )
+        return "Based on the query results, here is the answer to your question."
+
+    def _cached_chars(self, prompt: str) -> int:
+        """Length of the longest block-aligned prefix seen before; remembers this prompt's blocks"""
+        hits, blocks = 0, []
+        for end in range(CACHE_BLOCK, len(prompt) + 1, CACHE_BLOCK):
+            blocks.append(hashlib.sha256(prompt[:end].encode("utf-8")).hexdigest())
+        with self._lock:
+            for n, block in enumerate(blocks, 1):
+                if block not in self._prefixes:
+                    break
+                hits = n
+            self._prefixes.update(blocks)
+        return hits * CACHE_BLOCK
+
+    def _stream(self, content: str) -> Iterator[Any]:
+        """Word-sized chunks shaped like OpenAI `stream=True` deltas"""
+        for i, word in enumerate(content.split(" ")):
+            if i:
+                time.sleep(self.chunk_latency)
+            text = word if i == 0 else " " + word
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs: Any):
+        prompt = "\n".join(m["content"] for m in messages)
+        time.sleep(self._delay(prompt))
+        with self._lock:
+            self.calls += 1
+
+        content = self._answer(prompt)
+        cached = self._cached_chars(prompt) // 4
+        if stream:
+            return self._stream(content)
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(content) // 4,
+            total_tokens=len(prompt) // 4 + len(content) // 4,
+            prompt_cache_hit_tokens=cached,
+            prompt_cache_miss_tokens=len(prompt) // 4 - cached,
+        )
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+            usage=usage,
+        )
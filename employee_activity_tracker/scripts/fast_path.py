@@ -0,0 +1,508 @@
+# scripts/fast_path.py
+"""Rule-based fast path for simple lookup questions.
+
+Questions such as "Who works in the Finance department?" or "What is the
+total sales revenue during week 1?" don't need two LLM round trips. An intent
+matcher recognises a handful of question shapes, but only when every value it
+needs (department, employee name, job title, week) is one that exists in the
+database, and only when a question shape covers the whole question: every
+other word has to be part of the shape, so "hired in 2024" or "by Account
+Managers" is never silently dropped. It returns parameterized SQL and an
+answer template. Anything else returns None and goes down the LLM path.
+
+    fast = get_fast_path()
+    local = fast.answer(question) if fast else None
+"""
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import telemetry
+from db import get_connection
+from replica import get_replica
+
+FAST_PATH_TTL = float(os.getenv("FAST_PATH_TTL", 300))
+
+_QUOTED_RE = re.compile(r"'([^']+)'|\"([^\"]+)\"")
+_CAPITALIZED_WORD_RE = re.compile(r"\b[A-Z][A-Za-z]*\b")
+_WEEK_RE = re.compile(r"\bweek\s+(\d{1,3})\b", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")  # keeps the sign: "more than -40"
+_PUNCTUATION_RE = re.compile(r"[^\w<>' ]|'(?!s\b)")
+
+# Question shapes over the canonical text (see FastPath.canonical): lower case,
+# punctuation dropped, known values replaced by <dept>, <person>, <title>,
+# <week> and <num>. Patterns must match the whole question, so any word no
+# slot or pattern accounts for (a year, "manager", "recession") falls through.
+_COMPANY = r"(?: (?:in|at|across|within) the company| in total| overall| altogether| to date| so far)?"
+_WHAT_IS = r"(?:(?:what|how much) (?:is|was|were|are) |(?:retrieve|find|show|give me|list) )?(?:the )?"
+_EMAIL = r"email(?: address(?:es)?)?"
+_INTENT_PATTERNS = {
+    "email_of_role": (
+        rf"{_WHAT_IS}{_EMAIL} (?:of|for) (?:the |all |each )?"
+        r"(?:(?:employees?|person|people|staff) (?:who (?:is|are|works? as) |with the (?:job )?title )(?:an? |the )?)?<title>",
+        rf"{_WHAT_IS}<title>'s {_EMAIL}",
+    ),
+    "email_of_employee": (
+        rf"{_WHAT_IS}{_EMAIL} (?:of|for) <person>",
+        rf"{_WHAT_IS}<person>'s {_EMAIL}",
+    ),
+    "department_members": (
+        r"(?:who|which (?:employees?|people|staff)|list|show|name)(?: all| me)?"
+        r"(?: (?:are |is )?(?:the |all )?(?:employees?|people|staff|members))?(?: in the company)?"
+        r"(?: who| that)?(?: works?| working| are| is)? in the <dept> department"
+        r"(?: (?:within|in|at) the company)?",
+    ),
+    "headcount": (
+        r"how many (?:employees|people|staff)"
+        r"(?: (?:are there|are|work|do we have|does (?:the company|the <dept> department) have))?"
+        r"(?: (?:in|at|within) the (?:company|<dept> department))?(?: in total| overall| altogether)?",
+    ),
+    "employee_meetings": (
+        rf"{_WHAT_IS}total number of meetings (?:attended|held|had) by <person>"
+        r"(?: in (?:his|her|their) weekly updates| in total| overall| so far| to date)?",
+        r"how many meetings (?:did|has) <person> (?:attend|attended|have|had)"
+        r"(?: in total| overall| so far| to date)?",
+    ),
+    "hours_over_in_week": (
+        r"(?:who|which employees?|what employees?|list(?: all)? employees who) worked more than <num> hours"
+        r" (?:during|in) week <week>",
+    ),
+    "week_average_hours": (
+        rf"{_WHAT_IS}average (?:number of )?hours worked(?: by (?:all |the )?(?:employees|staff|people))?"
+        r" (?:during|in) week <week>",
+    ),
+    "week_total_sales": (
+        rf"{_WHAT_IS}total sales(?: revenue)?(?: (?:generated|earned|made))?"
+        r"(?: by (?:the company|all employees))? (?:during|in|for) week <week>",
+    ),
+    "department_total_sales": (
+        rf"how much (?:total )?sales(?: revenue)? has the <dept> department (?:generated|made|earned){_COMPANY}",
+        rf"{_WHAT_IS}total sales(?: revenue)? (?:of|for|generated by) the <dept> department{_COMPANY}",
+    ),
+    "compare_hours_in_week": (
+        r"compare the hours worked by <person>(?: (?:and )?<person>)+ (?:during|in) week <week>",
+    ),
+}
+_INTENT_RES = {
+    intent: [re.compile(pattern) for pattern in patterns] for intent, patterns in _INTENT_PATTERNS.items()
+}
+
+
+class KnownValues(NamedTuple):
+    """Values a template may bind; anything else goes to the LLM"""
+
+    departments: Sequence[str]
+    employees: Sequence[str]
+    job_titles: Sequence[str]
+    weeks: Sequence[int]
+
+
+class IntentMatch(NamedTuple):
+    intent: str
+    sql: str
+    params: tuple
+    render: Callable[[List[Dict[str, Any]]], str]
+
+
+class FastAnswer(NamedTuple):
+    intent: str
+    sql: str
+    params: tuple
+    rows: List[Dict[str, Any]]
+    answer: str
+
+
+def _money(value: Any) -> str:
+    return f"{float(value or 0):,.2f} RMB"
+
+
+def _hours(value: Any) -> str:
+    return f"{float(value or 0):,.1f}"
+
+
+def _names(rows: List[Dict[str, Any]]) -> str:
+    names = sorted({r["full_name"] for r in rows})
+    return names[0] if len(names) == 1 else ", ".join(names[:-1]) + f" and {names[-1]}"
+
+
+def load_known_values(conn, source: Optional[str] = None) -> KnownValues:
+    """
+    Distinct departments, names and titles (employees table when the normalized
+    layout is installed, unless `source` names the table)
+    """
+    from normalized_schema import normalized_schema_installed
+
+    if source is None:
+        source = "employees" if normalized_schema_installed(conn) else "activities"
+    with conn.cursor() as cursor:
+
+        def distinct(column: str, table: str = source) -> List[Any]:
+            cursor.execute(f"SELECT DISTINCT {column} AS v FROM {table} WHERE {column} IS NOT NULL")
+            return [row["v"] for row in cursor.fetchall()]
+
+        return KnownValues(
+            departments=distinct("department"),
+            employees=distinct("full_name"),
+            job_titles=distinct("job_title"),
+            weeks=distinct("week_number", "activities"),
+        )
+
+
+def fixture_known_values(weeks: int = 10) -> KnownValues:
+    """Known values of the fixture employees in populate_data.py (offline benchmarks)"""
+    from populate_data import employees
+
+    return KnownValues(
+        departments=sorted({e["dept"] for e in employees}),
+        employees=[e["name"] for e in employees],
+        job_titles=sorted({e["job"] for e in employees}),
+        weeks=list(range(1, weeks + 1)),
+    )
+
+
+class Canonical(NamedTuple):
+    """A question with its known values lifted out into slots"""
+
+    text: str
+    departments: List[str]
+    people: List[str]
+    titles: List[str]
+    weeks: List[int]
+    numbers: List[float]
+
+
+class FastPath:
+    """Intent matcher plus SQL/answer templates over a snapshot of known values"""
+
+    def __init__(self, known: KnownValues):
+        self.known = known
+        self._employees = {name.lower(): name for name in known.employees}
+        self._max_name_words = max((len(name.split()) for name in known.employees), default=0)
+        self._weeks = set(known.weeks)
+        # Longest first, so "Sales Manager" wins over a bare "Manager"
+        self._department_res = [
+            (dept, re.compile(rf"['\"]?\b{re.escape(dept)}\b['\"]?(?:'s)?\s+department\b", re.IGNORECASE))
+            for dept in sorted(known.departments, key=len, reverse=True)
+        ]
+        self._title_res = [
+            (title, re.compile(rf"['\"]?\b{re.escape(title)}s?\b(?:['\"](?!s\b))?", re.IGNORECASE))
+            for title in sorted(known.job_titles, key=len, reverse=True)
+        ]
+        self._intents = {
+            "email_of_role": self._email_of_role,
+            "email_of_employee": self._email_of_employee,
+            "department_members": self._department_members,
+            "headcount": self._headcount,
+            "employee_meetings": self._employee_meetings,
+            "hours_over_in_week": self._hours_over_in_week,
+            "week_average_hours": self._week_average_hours,
+            "week_total_sales": self._week_total_sales,
+            "department_total_sales": self._department_total_sales,
+            "compare_hours_in_week": self._compare_hours_in_week,
+        }
+
+    # Value extraction ----------------------------------------------------
+    def _people_spans(self, question: str):
+        """(start, end, name) of known employees, quoted or as runs of capitalized words"""
+        for quoted in _QUOTED_RE.finditer(question):
+            name = self._employees.get((quoted.group(1) or quoted.group(2)).strip().lower())
+            if name:
+                yield quoted.start(), quoted.end(), name
+        words = list(_CAPITALIZED_WORD_RE.finditer(question))
+        for i in range(len(words)):
+            for n in range(min(self._max_name_words, len(words) - i), 0, -1):
+                run = words[i : i + n]
+                if any(question[a.end() : b.start()] != " " for a, b in zip(run, run[1:])):
+                    continue
+                name = self._employees.get(question[run[0].start() : run[-1].end()].lower())
+                if name:
+                    yield run[0].start(), run[-1].end(), name
+                    break
+
+    def canonical(self, question: str) -> Canonical:
+        """
+        Replace known departments ("<dept> department"), employees, job titles,
+        weeks and other numbers with slot tokens; lower-case and drop punctuation
+        """
+        spans = []  # (start, end, token, slot, value)
+        for dept, pattern in self._department_res:
+            spans += [(m.start(), m.end(), "<dept> department", "dept", dept) for m in pattern.finditer(question)]
+        spans += [(a, b, "<person>", "person", name) for a, b, name in self._people_spans(question)]
+        for title, pattern in self._title_res:
+            spans += [(m.start(), m.end(), "<title>", "title", title) for m in pattern.finditer(question)]
+        spans += [(m.start(), m.end(), "week <week>", "week", int(m.group(1))) for m in _WEEK_RE.finditer(question)]
+        spans += [(m.start(), m.end(), "<num>", "num", float(m.group())) for m in _NUMBER_RE.finditer(question)]
+
+        # Earlier-listed slot kinds win overlaps (a department over a title, a week over a number)
+        accepted: List[tuple] = []
+        for span in spans:
+            if all(span[1] <= other[0] or other[1] <= span[0] for other in accepted):
+                accepted.append(span)
+
+        slots: Dict[str, list] = {"dept": [], "person": [], "title": [], "week": [], "num": []}
+        parts: List[str] = []
+        position = 0
+        for start, end, token, slot, value in sorted(accepted, key=lambda span: span[0]):
+            parts.append(question[position:start].lower())
+            parts.append(f" {token} ")
+            slots[slot].append(value)
+            position = end
+        parts.append(question[position:].lower())
+        text = " ".join(_PUNCTUATION_RE.sub(" ", "".join(parts)).split()).replace(" 's", "'s")
+        return Canonical(text, slots["dept"], slots["person"], slots["title"], slots["week"], slots["num"])
+
+    @staticmethod
+    def _fits(intent: str, c: Canonical) -> bool:
+        return any(pattern.fullmatch(c.text) for pattern in _INTENT_RES[intent])
+
+    def _week(self, c: Canonical) -> Optional[int]:
+        """The question's single week, if it is one the database has"""
+        weeks = set(c.weeks)
+        return weeks.pop() if len(weeks) == 1 and c.weeks[0] in self._weeks else None
+
+    @staticmethod
+    def _one(values: List[Any]) -> Optional[Any]:
+        return values[0] if len(set(values)) == 1 else None
+
+    # Intents ---------------------------------------------------------------
+    # Each intent only sees questions its patterns match in full, so the slot
+    # values below are all the question asks about.
+    def _email_of_role(self, c: Canonical) -> Optional[IntentMatch]:
+        title = self._one(c.titles)
+        if not title:
+            return None
+        return IntentMatch(
+            "email_of_role",
+            "SELECT DISTINCT full_name, email FROM activities WHERE job_title = %s ORDER BY full_name",
+            (title,),
+            lambda rows: (
+                f"No employee with the job title {title} was found."
+                if not rows
+                else "; ".join(f"{r['full_name']} ({title}): {r['email']}" for r in rows)
+            ),
+        )
+
+    def _email_of_employee(self, c: Canonical) -> Optional[IntentMatch]:
+        person = self._one(c.people)
+        if not person:
+            return None
+        return IntentMatch(
+            "email_of_employee",
+            "SELECT DISTINCT full_name, email FROM activities WHERE full_name = %s",
+            (person,),
+            lambda rows: (
+                f"No email address is recorded for {person}."
+                if not rows
+                else f"{person}'s email address is {rows[0]['email']}."
+            ),
+        )
+
+    def _department_members(self, c: Canonical) -> Optional[IntentMatch]:
+        dept = self._one(c.departments)
+        if not dept:
+            return None
+        return IntentMatch(
+            "department_members",
+            "SELECT DISTINCT employee_id, full_name FROM activities WHERE department = %s "
+            "ORDER BY full_name",
+            (dept,),
+            lambda rows: (
+                f"No employees were found in the {dept} department."
+                if not rows
+                else f"The {dept} department has {len({r['full_name'] for r in rows})} "
+                f"employee(s): {_names(rows)}."
+            ),
+        )
+
+    def _headcount(self, c: Canonical) -> Optional[IntentMatch]:
+        dept = self._one(c.departments)
+        if c.departments and not dept:
+            return None
+        sql = "SELECT COUNT(DISTINCT employee_id) AS employees FROM activities"
+        if dept:
+            sql, params, scope = f"{sql} WHERE department = %s", (dept,), f"the {dept} department"
+        else:
+            params, scope = (), "the company"
+        return IntentMatch(
+            "headcount",
+            sql,
+            params,
+            lambda rows: f"There are {rows[0]['employees'] if rows else 0} employees in {scope}.",
+        )
+
+    def _employee_meetings(self, c: Canonical) -> Optional[IntentMatch]:
+        person = self._one(c.people)
+        if not person:
+            return None
+        return IntentMatch(
+            "employee_meetings",
+            "SELECT SUM(num_meetings) AS meetings, COUNT(*) AS weeks FROM activities "
+            "WHERE full_name = %s",
+            (person,),
+            lambda rows: (
+                f"No weekly updates were found for {person}."
+                if not rows or not rows[0]["weeks"]
+                else f"{person} attended {int(rows[0]['meetings'] or 0)} meetings in total "
+                f"across {rows[0]['weeks']} weekly updates."
+            ),
+        )
+
+    def _hours_over_in_week(self, c: Canonical) -> Optional[IntentMatch]:
+        week = self._week(c)
+        if week is None or len(c.numbers) != 1:
+            return None
+        threshold = c.numbers[0]
+        return IntentMatch(
+            "hours_over_in_week",
+            "SELECT DISTINCT employee_id, full_name, hours_worked FROM activities "
+            "WHERE week_number = %s AND hours_worked > %s ORDER BY hours_worked DESC",
+            (week, threshold),
+            lambda rows: (
+                f"No employees worked more than {threshold:g} hours during week {week}."
+                if not rows
+                else f"{len(rows)} employee(s) worked more than {threshold:g} hours during week {week}: "
+                + ", ".join(f"{r['full_name']} ({_hours(r['hours_worked'])} hours)" for r in rows)
+                + "."
+            ),
+        )
+
+    def _week_average_hours(self, c: Canonical) -> Optional[IntentMatch]:
+        week = self._week(c)
+        if week is None:
+            return None
+        return IntentMatch(
+            "week_average_hours",
+            "SELECT AVG(hours_worked) AS avg_hours, COUNT(*) AS records FROM activities "
+            "WHERE week_number = %s",
+            (week,),
+            lambda rows: (
+                f"No hours were recorded for week {week}."
+                if not rows or not rows[0]["records"]
+                else f"Employees worked an average of {_hours(rows[0]['avg_hours'])} hours during "
+                f"week {week} (across {rows[0]['records']} weekly updates)."
+            ),
+        )
+
+    def _week_total_sales(self, c: Canonical) -> Optional[IntentMatch]:
+        week = self._week(c)
+        if week is None:
+            return None
+        return IntentMatch(
+            "week_total_sales",
+            "SELECT SUM(total_sales_rmb) AS total_sales FROM activities WHERE week_number = %s",
+            (week,),
+            lambda rows: (
+                f"Total sales revenue during week {week} was "
+                f"{_money(rows[0]['total_sales'] if rows else 0)}."
+            ),
+        )
+
+    def _department_total_sales(self, c: Canonical) -> Optional[IntentMatch]:
+        dept = self._one(c.departments)
+        if not dept:
+            return None
+        return IntentMatch(
+            "department_total_sales",
+            "SELECT SUM(total_sales_rmb) AS total_sales FROM activities WHERE department = %s",
+            (dept,),
+            lambda rows: (
+                f"The {dept} department has generated {_money(rows[0]['total_sales'] if rows else 0)} "
+                "in total sales revenue to date."
+            ),
+        )
+
+    def _compare_hours_in_week(self, c: Canonical) -> Optional[IntentMatch]:
+        people = list(dict.fromkeys(c.people))
+        week = self._week(c)
+        if len(people) < 2 or week is None:
+            return None
+        placeholders = ", ".join(["%s"] * len(people))
+
+        def render(rows: List[Dict[str, Any]]) -> str:
+            by_name = {r["full_name"]: r["hours_worked"] for r in rows}
+            parts = [
+                f"{name}: {_hours(by_name[name])} hours" if name in by_name else f"{name}: no record"
+                for name in people
+            ]
+            return f"Hours worked during week {week}: " + "; ".join(parts) + "."
+
+        return IntentMatch(
+            "compare_hours_in_week",
+            f"SELECT full_name, hours_worked FROM activities "
+            f"WHERE full_name IN ({placeholders}) AND week_number = %s",
+            (*people, week),
+            render,
+        )
+
+    # Public API -----------------------------------------------------------
+    def match(self, question: str) -> Optional[IntentMatch]:
+        """
+        The intent whose question shape covers the whole question, or None.
+        Words no slot or shape accounts for mean the question asks something
+        the templates cannot answer, so it goes to the LLM.
+        """
+        c = self.canonical(question)
+        for intent, build in self._intents.items():
+            if self._fits(intent, c):
+                found = build(c)
+                if found:
+                    return found
+        return None
+
+    def answer(
+        self,
+        question: str,
+        run: Optional[Callable[[IntentMatch], List[Dict[str, Any]]]] = None,
+    ) -> Optional[FastAnswer]:
+        """Match, execute (with `run`, default: pooled connection) and render, or None"""
+        with telemetry.span("fast_path") as span:
+            found = self.match(question)
+            span.set(intent=found.intent if found else None)
+            if not found:
+                return None
+            rows = (run or run_match)(found)
+            span.set(rows=len(rows))
+        telemetry.count("fast_path_hits", 1, intent=found.intent)
+        return FastAnswer(found.intent, found.sql, found.params, rows, found.render(rows))
+
+
+def run_match(match: IntentMatch) -> List[Dict[str, Any]]:
+    """Execute a template's parameterized SQL on the replica (QUERY_BACKEND=replica) or a pooled connection"""
+    replica = get_replica()
+    if replica:
+        return replica.query(match.sql, match.params)
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(match.sql, match.params)
+            return list(cursor.fetchall())
+
+
+_default: Optional[FastPath] = None
+_loaded_at = 0.0
+_default_lock = threading.Lock()
+
+
+def get_fast_path() -> Optional[FastPath]:
+    """
+    Process-wide matcher over known values reloaded every FAST_PATH_TTL seconds
+    (FAST_PATH=off disables it; None while the database is unreachable).
+    """
+    global _default, _loaded_at
+    if os.getenv("FAST_PATH", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    with _default_lock:
+        if time.monotonic() - _loaded_at >= FAST_PATH_TTL:
+            _loaded_at = time.monotonic()
+            try:
+                replica = get_replica()
+                if replica:
+                    _default = FastPath(load_known_values(replica, "activities"))
+                else:
+                    with get_connection() as conn:
+                        _default = FastPath(load_known_values(conn))
+            except Exception as e:
+                print(f"⚠️ Fast path disabled, could not load known values: {e}")
+                _default = None
+        return _default
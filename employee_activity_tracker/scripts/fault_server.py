@@ -0,0 +1,373 @@
+# scripts/fault_server.py
+"""Local OpenAI-compatible chat endpoint with injected faults, for exercising llm_gateway.py.
+
+POST /v1/chat/completions is answered by the offline FakeLLMClient (JSON or
+`stream=True` server-sent events). Before answering, each request draws its faults:
+
+    error_rate       share failing with 500
+    rate_limit_rate  share failing with 429 + Retry-After
+    slow_rate        share delayed by slow_latency on top of latency (a latency tail)
+    down             every request fails with 503 (an outage)
+
+Faults can be changed while the server runs (POST /faults with a JSON object of
+the fields above); GET /stats reports what was injected.
+
+    python fault_server.py --port 8100 --error-rate 0.2 --slow-rate 0.05
+    DEEPSEEK_BASE_URL=http://localhost:8100/v1 ...    # point a client at it
+    python fault_server.py --self-check               # gateway scenarios against an in-process server
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Tuple
+
+from fake_llm import FakeLLMClient
+
+FAULT_FIELDS = ("error_rate", "rate_limit_rate", "slow_rate", "latency", "slow_latency", "retry_after", "down")
+
+
+class FaultConfig:
+    """Mutable, thread-safe fault settings with a seeded draw per request"""
+
+    def __init__(
+        self,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        latency: float = 0.01,
+        slow_latency: float = 1.0,
+        retry_after: float = 1.0,
+        down: bool = False,
+        seed: int = 42,
+    ):
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.slow_rate = slow_rate
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.retry_after = retry_after
+        self.down = down
+        self.counts = {"requests": 0, "errors": 0, "rate_limited": 0, "slow": 0, "down": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def update(self, **settings: Any) -> None:
+        with self._lock:
+            for name, value in settings.items():
+                if name not in FAULT_FIELDS:
+                    raise ValueError(f"unknown fault setting: {name}")
+                setattr(self, name, bool(value) if name == "down" else float(value))
+
+    def draw(self) -> Tuple[int, float]:
+        """(HTTP status to fail with or 200, seconds to delay) for the next request"""
+        with self._lock:
+            self.counts["requests"] += 1
+            if self.down:
+                self.counts["down"] += 1
+                return 503, 0.0
+            roll = self._rng.random()
+            delay = self.latency
+            if self._rng.random() < self.slow_rate:
+                self.counts["slow"] += 1
+                delay += self.slow_latency
+            if roll < self.error_rate:
+                self.counts["errors"] += 1
+                return 500, delay
+            if roll < self.error_rate + self.rate_limit_rate:
+                self.counts["rate_limited"] += 1
+                return 429, 0.0
+            return 200, delay
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            settings = {name: getattr(self, name) for name in FAULT_FIELDS}
+            return {"faults": settings, "injected": dict(self.counts)}
+
+
+def _completion(model: str, content: str, usage: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        ],
+        "usage": usage,
+    }
+
+
+def _chunk(model: str, completion_id: str, text: str, finish: bool = False) -> Dict[str, Any]:
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "delta": {} if finish else {"content": text},
+                "finish_reason": "stop" if finish else None,
+            }
+        ],
+    }
+
+
+def make_handler(faults: FaultConfig) -> type:
+    llm = FakeLLMClient(latency=0.0, chunk_latency=0.0)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:  # keep the console quiet
+            pass
+
+        def _json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self) -> None:
+            if self.path == "/stats":
+                self._json(200, faults.stats())
+            else:
+                self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self) -> None:
+            if self.path == "/faults":
+                try:
+                    faults.update(**self._body())
+                except (ValueError, TypeError) as e:
+                    self._json(400, {"error": {"message": str(e)}})
+                    return
+                self._json(200, faults.stats())
+                return
+            if self.path not in ("/v1/chat/completions", "/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+
+            request = self._body()
+            status, delay = faults.draw()
+            time.sleep(delay)
+            if status == 429:
+                self._json(
+                    429,
+                    {"error": {"message": "rate limited", "type": "rate_limit_error"}},
+                    {"Retry-After": f"{faults.retry_after:g}"},
+                )
+                return
+            if status != 200:
+                self._json(status, {"error": {"message": f"injected {status}", "type": "server_error"}})
+                return
+
+            model = request.get("model", "deepseek-chat")
+            messages = request.get("messages", [])
+            response = llm.create(model=model, messages=messages)
+            content = response.choices[0].message.content
+            if not request.get("stream"):
+                # DeepSeek-style usage, including the simulated prefix-cache hits
+                self._json(200, _completion(model, content, vars(response.usage)))
+                return
+
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                text = word if i == 0 else " " + word
+                self.wfile.write(f"data: {json.dumps(_chunk(model, completion_id, text))}\n\n".encode("utf-8"))
+            self.wfile.write(f"data: {json.dumps(_chunk(model, completion_id, '', True))}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    return Handler
+
+
+def start_server(faults: FaultConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve in a daemon thread; the bound port is server.server_address[1]"""
+    server = ThreadingHTTPServer((host, port), make_handler(faults))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Self-check ===========================================================
+def _ask(gateway: Any, question: str = "How many employees does the company have in total?", **kwargs: Any) -> Any:
+    return gateway.chat.completions.create(
+        model="deepseek-chat",
+        messages=[{"role": "user", "content": f"{question}\nOnly output the SQL statement"}],
+        max_tokens=200,
+        **kwargs,
+    )
+
+
+def _p99(latencies: List[float]) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] if ordered else 0.0
+
+
+def self_check() -> bool:
+    """Run the gateway against injected faults; prints one line per scenario"""
+    from openai import OpenAI
+
+    from llm_gateway import CircuitBreaker, CircuitOpen, LLMGateway, LLMTimeout
+    from llm_integration import _results_to_natural_language, llm_unavailable
+
+    faults = FaultConfig()
+    server = start_server(faults)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    def gateway(**settings: Any) -> LLMGateway:
+        upstream = OpenAI(api_key="local", base_url=base_url, max_retries=0, timeout=10)
+        return LLMGateway(upstream, **settings)
+
+    def reset(**settings: Any) -> None:
+        defaults = {name: 0.0 for name in FAULT_FIELDS}
+        defaults.update(latency=0.01, slow_latency=1.0, down=False)
+        defaults.update(settings)
+        faults.update(**defaults)
+
+    results: List[Tuple[str, bool, str]] = []
+
+    def scenario(name: str, check: Callable[[], Tuple[bool, str]]) -> None:
+        try:
+            ok, detail = check()
+        except Exception as e:
+            ok, detail = False, f"{type(e).__name__}: {e}"
+        results.append((name, ok, detail))
+        print(f"{'✅' if ok else '❌'} {name}: {detail}")
+
+    def retries() -> Tuple[bool, str]:
+        reset(error_rate=0.2, rate_limit_rate=0.05)
+        gw = gateway(max_retries=5, backoff_base=0.01, hedge=False, breaker=CircuitBreaker(threshold=10))
+        answers = [_ask(gw).choices[0].message.content for _ in range(50)]
+        stats = gw.stats()
+        ok = all(answers) and stats["retries"] > 0
+        return ok, f"50/50 answered through {stats['failures']} injected failures, {stats['retries']} retries"
+
+    def streaming() -> Tuple[bool, str]:
+        reset(error_rate=0.3)
+        gw = gateway(max_retries=5, backoff_base=0.01, breaker=CircuitBreaker(threshold=10))
+        text = "".join(
+            chunk.choices[0].delta.content or ""
+            for chunk in _ask(gw, stream=True)
+            if chunk.choices
+        )
+        return text.startswith("SELECT"), f"streamed {len(text)} chars after {gw.stats()['retries']} retries"
+
+    def hedging() -> Tuple[bool, str]:
+        reset(slow_rate=0.03, slow_latency=1.0)
+        tails = {}
+        for hedge in (False, True):
+            gw = gateway(hedge=hedge, hedge_min_samples=10, backoff_base=0.01)
+            latencies = []
+            for _ in range(120):
+                start = time.perf_counter()
+                _ask(gw)
+                latencies.append(time.perf_counter() - start)
+            tails[hedge] = (_p99(latencies[20:]), gw.stats())
+        (plain, _), (hedged, stats) = tails[False], tails[True]
+        ok = stats["hedges"] > 0 and hedged < plain / 2
+        return ok, (
+            f"p99 {plain * 1000:.0f}ms → {hedged * 1000:.0f}ms with "
+            f"{stats['hedges']} hedges ({stats['hedge_wins']} won)"
+        )
+
+    def timeouts() -> Tuple[bool, str]:
+        reset(slow_rate=1.0, slow_latency=2.0)
+        gw = gateway(timeout=0.3, max_retries=1, backoff_base=0.01, hedge=False)
+        start = time.perf_counter()
+        try:
+            _ask(gw)
+            return False, "slow upstream answered"
+        except LLMTimeout:
+            elapsed = time.perf_counter() - start
+        return elapsed < 1.0, f"gave up after {elapsed:.2f}s ({gw.stats()['timeouts']} timed-out attempts)"
+
+    def circuit() -> Tuple[bool, str]:
+        reset(down=True)
+        gw = gateway(max_retries=2, backoff_base=0.01, breaker=CircuitBreaker(threshold=3, reset_timeout=0.5))
+        try:
+            _ask(gw)
+        except CircuitOpen:
+            return False, "opened before any attempt"
+        except Exception:
+            pass
+        start = time.perf_counter()
+        try:
+            _ask(gw)
+            return False, "outage answered"
+        except CircuitOpen:
+            fail_fast_ms = (time.perf_counter() - start) * 1000
+        rows = [{"employee_id": "E001", "full_name": "Wei Zhang", "hours_worked": 42}]
+        degraded = _results_to_natural_language("Who worked most?", rows, "auto", llm_client=gw, use_cache=False)
+        ok = llm_unavailable(gw) and degraded.startswith("⚠️") and fail_fast_ms < 50
+        detail = f"open after {gw.stats()['failures']} failures, rejected in {fail_fast_ms:.1f}ms, narration → raw rows"
+
+        reset()
+        time.sleep(0.5)
+        _ask(gw)
+        state = gw.breaker.state
+        return ok and state == "closed", f"{detail}; half-open probe closed it ({state})"
+
+    scenario("retries", retries)
+    scenario("streaming", streaming)
+    scenario("hedging", hedging)
+    scenario("timeouts", timeouts)
+    scenario("circuit breaker", circuit)
+    server.shutdown()
+    return all(ok for _, ok, _ in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fault-injecting OpenAI-compatible endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--down", action="store_true")
+    parser.add_argument("--self-check", action="store_true", help="Run the gateway scenarios and exit")
+    args = parser.parse_args()
+
+    if args.self_check:
+        sys.exit(0 if self_check() else 1)
+
+    faults = FaultConfig(
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        slow_rate=args.slow_rate,
+        latency=args.latency,
+        slow_latency=args.slow_latency,
+        retry_after=args.retry_after,
+        down=args.down,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(faults))
+    print(f"Fault server on http://{args.host}:{args.port}/v1 ({json.dumps(faults.stats()['faults'])})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
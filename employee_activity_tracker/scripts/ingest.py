@@ -0,0 +1,474 @@
+# scripts/ingest.py
+"""Idempotent, resumable ingest of weekly activity files into `activities`.
+
+Files are CSV (with a header row, or headerless in ACTIVITY_COLUMNS order as
+written by `populate_data.py --output-dir`) or JSONL (one object per line).
+They are streamed line by line, so memory stays flat whatever the file size.
+Each record is validated; bad records are counted, reported and skipped.
+
+Valid rows are upserted on the unique (employee_id, week_number) key in
+batched transactions: a week delivered twice updates the row instead of
+duplicating it. The key is added on first use, after removing existing
+duplicates (the newest row of each key is kept).
+
+Progress is checkpointed per file in `ingest_files` (byte offset, rows read
+and rejected, a fingerprint of the file's head) in the same transaction as each
+batch. A re-run skips finished files, resumes files that grew or were cut off
+by a crash at the last committed offset, and starts over on a file whose
+already-read head changed (it was replaced rather than appended to).
+
+    python ingest.py incoming/week_11.csv incoming/week_11_fixes.jsonl
+    python ingest.py --dir incoming/             # every .csv/.jsonl/.ndjson, in name order
+    python ingest.py --dir incoming/ --validate-only
+    python ingest.py --status
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from populate_data import ACTIVITY_COLUMNS, INSERT_SQL, KEY_COLUMNS
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 1000))
+UNIQUE_KEY = "uq_employee_week"
+FILE_SUFFIXES = (".csv", ".jsonl", ".ndjson")
+# Bytes hashed to recognise a file that was replaced rather than appended to
+HEAD_BYTES = 4096
+# Rejected records printed per file (all of them go to --rejects)
+MAX_WARNINGS = 10
+
+CHECKPOINT_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_files (
+    path VARCHAR(512) PRIMARY KEY,
+    fingerprint CHAR(64) NOT NULL,
+    byte_offset BIGINT NOT NULL DEFAULT 0,
+    rows_read BIGINT NOT NULL DEFAULT 0,
+    rows_rejected BIGINT NOT NULL DEFAULT 0,
+    completed_at DATETIME NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+)
+"""
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class FileStats(NamedTuple):
+    """Outcome of ingesting one file"""
+
+    path: str
+    status: str  # new, resumed or skipped
+    read: int
+    rejected: int
+    inserted: int
+    updated: int
+    seconds: float
+
+
+# Validation ===========================================================
+def _text(record: Dict[str, Any], field: str, max_len: int, required: bool = True) -> str:
+    value = record.get(field)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f"{field} is missing")
+    if len(value) > max_len:
+        raise ValueError(f"{field} is longer than {max_len} characters")
+    return value
+
+
+def _number(record: Dict[str, Any], field: str, integer: bool, low: float, high: float, default=None):
+    value = record.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if default is None:
+            raise ValueError(f"{field} is missing")
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} is not a number: {value!r}") from None
+    if integer:
+        if not number.is_integer():
+            raise ValueError(f"{field} is not a whole number: {value!r}")
+        number = int(number)
+    if not low <= number <= high:
+        raise ValueError(f"{field} {number} is outside {low:g}..{high:g}")
+    return number
+
+
+def validate_record(record: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Row tuple in ACTIVITY_COLUMNS order; raises ValueError naming the first bad field"""
+    email = _text(record, "email", 100)
+    if not _EMAIL_RE.match(email):
+        raise ValueError(f"email is not an address: {email!r}")
+    hire_date = _text(record, "hire_date", 10)
+    try:
+        hire_date = date.fromisoformat(hire_date).isoformat()
+    except ValueError:
+        raise ValueError(f"hire_date is not YYYY-MM-DD: {hire_date!r}") from None
+    return (
+        _text(record, "employee_id", 20),
+        _text(record, "full_name", 100),
+        _number(record, "week_number", True, 1, 10**6),
+        _number(record, "num_meetings", True, 0, 1000, default=0),
+        round(_number(record, "total_sales_rmb", False, 0, 10**12, default=0.0), 2),
+        round(_number(record, "hours_worked", False, 0, 168), 1),
+        _text(record, "activities", 65535, required=False),
+        _text(record, "department", 50),
+        hire_date,
+        email,
+        _text(record, "job_title", 100),
+    )
+
+
+# Streaming readers ====================================================
+class _Lines:
+    """Text lines from a binary file, tracking the byte offset after the last line read.
+
+    A trailing line without a newline may still be being written, so it is
+    left for the next run rather than consumed.
+    """
+
+    def __init__(self, f, offset: int):
+        self._f = f
+        self._f.seek(offset)
+        self.offset = offset
+
+    def __iter__(self) -> "_Lines":
+        return self
+
+    def __next__(self) -> str:
+        line = self._f.readline()
+        if not line.endswith(b"\n"):
+            raise StopIteration
+        if self.offset == 0 and line.startswith(b"\xef\xbb\xbf"):
+            line = line[3:]
+            self.offset += 3
+        self.offset += len(line)
+        return line.decode("utf-8")
+
+
+def _csv_columns(f) -> Tuple[Tuple[str, ...], int]:
+    """Column order and the offset where data starts: header row if present, else ACTIVITY_COLUMNS"""
+    lines = _Lines(f, 0)
+    first = next(csv.reader(lines), None)
+    names = tuple(c.strip().lower() for c in first or ())
+    if "employee_id" in names:
+        return names, lines.offset
+    return ACTIVITY_COLUMNS, 0
+
+
+def read_records(path: Path, offset: int = 0) -> Iterator[Tuple[int, Optional[Dict[str, Any]], str]]:
+    """(offset after the record, record or None, error) for each record from `offset` on"""
+    with open(path, "rb") as f:
+        if path.suffix.lower() == ".csv":
+            columns, data_start = _csv_columns(f)
+            lines = _Lines(f, max(offset, data_start))
+            for values in csv.reader(lines):
+                if not any(v.strip() for v in values):
+                    continue
+                if len(values) != len(columns):
+                    yield lines.offset, None, f"expected {len(columns)} fields, got {len(values)}"
+                    continue
+                yield lines.offset, dict(zip(columns, values)), ""
+        else:
+            lines = _Lines(f, offset)
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield lines.offset, None, f"invalid JSON: {e}"
+                    continue
+                if not isinstance(record, dict):
+                    yield lines.offset, None, "not a JSON object"
+                    continue
+                yield lines.offset, record, ""
+
+
+def read_head(path: Path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(HEAD_BYTES)
+
+
+def head_fingerprint(head: bytes, upto: int) -> str:
+    """Hash of the file's first bytes up to `upto`, so appending keeps it stable"""
+    return hashlib.sha256(head[: min(upto, HEAD_BYTES)]).hexdigest()
+
+
+def discover(paths: List[str], directory: Optional[str]) -> List[Path]:
+    files = [Path(p) for p in paths]
+    if directory:
+        files += sorted(
+            p for p in Path(directory).iterdir() if p.is_file() and p.suffix.lower() in FILE_SUFFIXES
+        )
+    return [p.resolve() for p in files]
+
+
+# Database side ========================================================
+def ensure_checkpoint_table(conn) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute(CHECKPOINT_DDL)
+    conn.commit()
+
+
+def has_unique_key(conn) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) AS n FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'activities' AND INDEX_NAME = %s",
+            (UNIQUE_KEY,),
+        )
+        return cursor.fetchone()["n"] > 0
+
+
+def ensure_unique_key(conn) -> int:
+    """
+    Add UNIQUE (employee_id, week_number) if missing, first deleting older
+    duplicates of each key; returns the number of rows deleted (-1 if the key existed)
+    """
+    if has_unique_key(conn):
+        return -1
+    with conn.cursor() as cursor:
+        removed = cursor.execute(
+            """
+            DELETE older FROM activities older
+            JOIN activities newer
+              ON newer.employee_id = older.employee_id
+             AND newer.week_number = older.week_number
+             AND newer.id > older.id
+            """
+        )
+        cursor.execute(
+            f"ALTER TABLE activities ADD UNIQUE KEY {UNIQUE_KEY} (employee_id, week_number)"
+        )
+    conn.commit()
+    return removed
+
+
+def load_checkpoint(conn, path: Path) -> Optional[Dict[str, Any]]:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT * FROM ingest_files WHERE path = %s", (str(path),))
+        return cursor.fetchone()
+
+
+def _save_checkpoint(cursor, path: Path, fingerprint: str, offset: int, read: int, rejected: int, done: bool) -> None:
+    cursor.execute(
+        """
+        INSERT INTO ingest_files (path, fingerprint, byte_offset, rows_read, rows_rejected, completed_at)
+        VALUES (%s, %s, %s, %s, %s, IF(%s, NOW(), NULL))
+        ON DUPLICATE KEY UPDATE
+            fingerprint = VALUES(fingerprint), byte_offset = VALUES(byte_offset),
+            rows_read = VALUES(rows_read), rows_rejected = VALUES(rows_rejected),
+            completed_at = VALUES(completed_at)
+        """,
+        (str(path), fingerprint, offset, read, rejected, done),
+    )
+
+
+def upsert_batch(cursor, rows: List[Tuple[Any, ...]]) -> Tuple[int, int]:
+    """Upsert rows (the last one wins within the batch); returns (inserted, updated)"""
+    latest = {(row[0], row[2]): row for row in rows}
+    rows = list(latest.values())
+    placeholders = ", ".join(["(%s, %s)"] * len(latest))
+    cursor.execute(
+        "SELECT COUNT(*) AS n FROM activities "
+        f"WHERE (employee_id, week_number) IN ({placeholders})",
+        [value for key in latest for value in key],
+    )
+    existing = cursor.fetchone()["n"]
+    # MySQL counts 1 per inserted row, 2 per changed row and 0 per unchanged row
+    affected = cursor.executemany(INSERT_SQL, rows) or 0
+    inserted = len(rows) - existing
+    return inserted, max(0, affected - inserted) // 2
+
+
+def ingest_file(
+    conn,
+    path: Path,
+    batch_size: int = INGEST_BATCH_SIZE,
+    rejects=None,
+    restart: bool = False,
+) -> FileStats:
+    """Stream one file into activities from its checkpoint; each batch commits with its offset"""
+    start = time.perf_counter()
+    head = read_head(path)
+    size = path.stat().st_size
+    checkpoint = None if restart else load_checkpoint(conn, path)
+    offset, read, rejected, status = 0, 0, 0, "new"
+    if (
+        checkpoint
+        and checkpoint["byte_offset"] <= size
+        and checkpoint["fingerprint"] == head_fingerprint(head, checkpoint["byte_offset"])
+    ):
+        offset, read, rejected = (
+            checkpoint["byte_offset"], checkpoint["rows_read"], checkpoint["rows_rejected"]
+        )
+        if offset == size and checkpoint["completed_at"]:
+            return FileStats(str(path), "skipped", 0, 0, 0, 0, 0.0)
+        status = "resumed" if offset else "new"
+
+    inserted = updated = 0
+    read_before, rejected_before = read, rejected
+    batch: List[Tuple[Any, ...]] = []
+
+    def commit(upto: int, done: bool = False) -> None:
+        nonlocal inserted, updated
+        with conn.cursor() as cursor:
+            if batch:
+                new, changed = upsert_batch(cursor, batch)
+                inserted += new
+                updated += changed
+            _save_checkpoint(cursor, path, head_fingerprint(head, upto), upto, read, rejected, done)
+        conn.commit()
+        batch.clear()
+
+    try:
+        for offset, record, error in read_records(path, offset):
+            read += 1
+            if record is not None:
+                try:
+                    batch.append(validate_record(record))
+                except ValueError as e:
+                    error = str(e)
+            if error:
+                rejected += 1
+                _report_reject(path, offset, error, record, rejected - rejected_before, rejects)
+            if len(batch) >= batch_size:
+                commit(offset)
+        commit(offset, done=True)
+    except Exception:
+        conn.rollback()
+        raise
+    return FileStats(
+        str(path), status, read - read_before, rejected - rejected_before, inserted, updated,
+        time.perf_counter() - start,
+    )
+
+
+def _report_reject(path: Path, offset: int, error: str, record: Any, nth: int, rejects) -> None:
+    if nth <= MAX_WARNINGS:
+        print(f"⚠️ {path.name} (before byte {offset}): {error}")
+    elif nth == MAX_WARNINGS + 1:
+        print(f"⚠️ {path.name}: further rejected records not shown")
+    if rejects:
+        rejects.write(
+            json.dumps({"file": str(path), "offset": offset, "error": error, "record": record}, default=str)
+            + "\n"
+        )
+
+
+def finish_ingest(conn, updated: int) -> None:
+    """Partitions, rollups and cache invalidation after rows were inserted or updated"""
+    from normalized_schema import normalized_schema_installed, rebuild_rollups, refresh_rollups
+    from partitions import extend_partitions
+    from result_cache import bump_rewrite_version, bump_table_version
+
+    added = extend_partitions(conn)
+    if added:
+        print(f"Added partitions ahead of the newest week: {', '.join(added)}")
+    if normalized_schema_installed(conn):
+        # refresh_rollups only folds new ids; changed rows need a recompute
+        folded = rebuild_rollups(conn) if updated else refresh_rollups(conn)
+        print(f"Folded {folded} rows into employees / rollup tables")
+    with conn.cursor() as cursor:
+        bump_table_version(cursor, "activities")
+        if updated:
+            # The id-based replica re-copies on its next sync
+            bump_rewrite_version(cursor, "activities")
+    conn.commit()
+
+
+# CLI ==================================================================
+def validate_only(files: List[Path], rejects=None) -> int:
+    """Read and validate without a database; returns the number of rejected records"""
+    total_rejected = 0
+    for path in files:
+        read = rejected = 0
+        for offset, record, error in read_records(path):
+            read += 1
+            if record is not None:
+                try:
+                    validate_record(record)
+                except ValueError as e:
+                    error = str(e)
+            if error:
+                rejected += 1
+                _report_reject(path, offset, error, record, rejected, rejects)
+        print(f"{'✅' if not rejected else '⚠️'} {path.name}: {read - rejected}/{read} records valid")
+        total_rejected += rejected
+    return total_rejected
+
+
+def print_status(conn) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT * FROM ingest_files ORDER BY path")
+        rows = cursor.fetchall()
+    for row in rows:
+        state = f"done {row['completed_at']}" if row["completed_at"] else "in progress"
+        print(
+            f"{row['path']}: {row['rows_read']} read, {row['rows_rejected']} rejected, "
+            f"byte {row['byte_offset']} ({state})"
+        )
+    if not rows:
+        print("No files ingested yet.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upsert weekly activity files into activities")
+    parser.add_argument("files", nargs="*", help="CSV or JSONL files")
+    parser.add_argument("--dir", help="Ingest every .csv/.jsonl/.ndjson file here, in name order")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Rows per transaction")
+    parser.add_argument("--rejects", help="Append rejected records to this JSONL file")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and re-read files from the start")
+    parser.add_argument("--validate-only", action="store_true", help="Validate files without touching the database")
+    parser.add_argument("--status", action="store_true", help="List checkpointed files")
+    args = parser.parse_args()
+
+    files = discover(args.files, args.dir)
+    if not files and not args.status:
+        parser.error("no input files")
+
+    rejects = open(args.rejects, "a", encoding="utf-8") if args.rejects else None
+    try:
+        if args.validate_only:
+            sys.exit(1 if validate_only(files, rejects) else 0)
+
+        from db import get_connection
+
+        with get_connection() as conn:
+            ensure_checkpoint_table(conn)
+            if args.status:
+                print_status(conn)
+                return
+            removed = ensure_unique_key(conn)
+            if removed >= 0:
+                print(f"Added unique key ({', '.join(KEY_COLUMNS)}); removed {removed} duplicate rows")
+
+            inserted = updated = 0
+            for path in files:
+                stats = ingest_file(conn, path, args.batch_size, rejects, args.restart)
+                inserted += stats.inserted
+                updated += stats.updated
+                if stats.status == "skipped":
+                    print(f"{path.name}: already ingested, skipped")
+                    continue
+                print(
+                    f"✅ {path.name} ({stats.status}): {stats.read} read, {stats.rejected} rejected, "
+                    f"{stats.inserted} inserted, {stats.updated} updated in {stats.seconds:.2f}s"
+                )
+            if inserted or updated or removed > 0:
+                finish_ingest(conn, updated + max(removed, 0))
+    finally:
+        if rejects:
+            rejects.close()
+
+
+if __name__ == "__main__":
+    main()
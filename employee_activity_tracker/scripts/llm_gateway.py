@@ -0,0 +1,298 @@
+# scripts/llm_gateway.py
+"""Resilience layer in front of the OpenAI-compatible DeepSeek client.
+
+LLMGateway wraps any client exposing `chat.completions.create` and is itself a
+drop-in client:
+
+    gateway = LLMGateway(OpenAI(..., max_retries=0))
+    gateway.chat.completions.create(model=..., messages=[...])
+
+Every call gets:
+
+    timeout       each attempt is abandoned after LLM_TIMEOUT seconds (LLMTimeout)
+    retries       timeouts, connection errors, 408/409/429 and 5xx are retried up to
+                  LLM_MAX_RETRIES times with full-jitter exponential backoff
+                  (Retry-After is honoured); other 4xx fail immediately
+    hedging       a non-streaming attempt still running after the p95 latency of
+                  recent calls of the same shape (or LLM_HEDGE_AFTER seconds) gets a
+                  second, identical request; the first success wins
+    circuit       LLM_BREAKER_THRESHOLD consecutive failed attempts open the circuit.
+                  While open, calls fail fast with CircuitOpen; after
+                  LLM_BREAKER_RESET seconds one probe is let through and its outcome
+                  closes or re-opens the circuit
+
+Callers catch CircuitOpen to degrade (cached, fast-path or raw-result answers)
+instead of waiting on an unhealthy upstream. See fault_server.py for a local
+fault-injecting endpoint and a self-check.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from openai import APIConnectionError
+
+import telemetry
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "on").lower() not in ("0", "off", "false", "no")
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 0)) or None  # None: adaptive p95
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 32))
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class CircuitOpen(Exception):
+    """The upstream is considered unhealthy; the call was not attempted"""
+
+
+class LLMTimeout(TimeoutError):
+    """An attempt did not complete within the gateway timeout"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transport failures, timeouts, throttling and server errors are worth retrying"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError, APIConnectionError))
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header on an HTTP error response, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open → half-open (one probe) → closed/open"""
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls are being refused (open, or half-open with a probe in flight)"""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.state == "half_open" and self._probing
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips}
+
+
+class LatencyTracker:
+    """Recent successful-call latencies per request shape, for the hedge threshold"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[Any, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Any, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: Any, pct: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _shape(kwargs: Dict[str, Any]) -> Tuple[Any, ...]:
+    # SQL generation, batches and narration have very different latency profiles, so
+    # each gets its own hedge threshold. max_tokens is adaptive (prompts.py) and would
+    # split one prompt across many shapes; the opening of the first message names the
+    # prompt instead
+    messages = kwargs.get("messages") or [{}]
+    opening = str(messages[0].get("content", ""))[:64]
+    return kwargs.get("model"), opening, bool(kwargs.get("stream"))
+
+
+class LLMGateway:
+    """OpenAI-compatible client with timeouts, retries, hedged requests and a circuit breaker"""
+
+    def __init__(
+        self,
+        llm_client: Any,
+        timeout: float = LLM_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+        hedge: bool = LLM_HEDGE,
+        hedge_after: Optional[float] = LLM_HEDGE_AFTER,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        breaker: Optional[CircuitBreaker] = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+    ):
+        self._client = llm_client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        # Attempts run here so a stuck request can be abandoned at the deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._counts = {
+            "calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+            "timeouts": 0, "failures": 0, "rejected": 0,
+        }
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _bump(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += value
+        if name != "calls" and name != "attempts":
+            telemetry.count(f"llm_{name}", value)
+
+    def hedge_delay(self, key: Any) -> Optional[float]:
+        """Seconds to wait before hedging a call of this shape, or None to not hedge"""
+        if not self.hedge or self.breaker.state != "closed":
+            return None
+        if self.hedge_after:
+            return self.hedge_after
+        return self.latency.percentile(key, 95, self.hedge_min_samples)
+
+    def backoff(self, retry: int, error: Optional[BaseException]) -> float:
+        """Full-jitter exponential backoff, at least any Retry-After the server asked for"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (retry - 1)))
+        server_delay = _retry_after(error) if error is not None else None
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.backoff_max))
+        return delay
+
+    def create(self, **kwargs: Any) -> Any:
+        self._bump("calls")
+        key = _shape(kwargs)
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt and not self.breaker.is_open():
+                self._bump("retries")
+                time.sleep(self.backoff(attempt, last_error))
+            if not self.breaker.allow():
+                self._bump("rejected")
+                raise CircuitOpen("LLM upstream unavailable (circuit open)") from last_error
+            try:
+                response, seconds = self._attempt(kwargs, key)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered; a bad request says nothing about its health
+                    self.breaker.record_success()
+                    raise
+                self._bump("failures")
+                self.breaker.record_failure()
+                last_error = e
+                continue
+            self.breaker.record_success()
+            self.latency.add(key, seconds)
+            return response
+        raise last_error
+
+    def _attempt(self, kwargs: Dict[str, Any], key: Any) -> Tuple[Any, float]:
+        """One logical attempt (plus at most one hedge); (response, seconds) or raises"""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        hedge_at = None
+        if not kwargs.get("stream"):
+            delay = self.hedge_delay(key)
+            hedge_at = start + delay if delay is not None else None
+
+        self._bump("attempts")
+        primary = self._executor.submit(self._client.chat.completions.create, **kwargs)
+        pending: List[Future] = [primary]
+        error: Optional[BaseException] = None
+        while pending:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            until = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, _ = wait(pending, timeout=until - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is not primary:
+                    self._bump("hedge_wins")
+                for other in pending:
+                    other.cancel()
+                return response, time.perf_counter() - start
+            if not done and hedge_at is not None and time.perf_counter() >= hedge_at:
+                hedge_at = None
+                self._bump("hedges")
+                self._bump("attempts")
+                pending.append(self._executor.submit(self._client.chat.completions.create, **kwargs))
+
+        if pending:
+            for future in pending:
+                future.cancel()
+            self._bump("timeouts")
+            raise LLMTimeout(f"LLM request timed out after {self.timeout:g}s")
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        counts["breaker"] = self.breaker.stats()
+        return counts
@@ -1,9 +1,28 @@
 # scripts/llm_integration.py
+import json
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from openai import OpenAI
 from pathlib import Path
-from typing import Optional, Any, List, Dict, Union
-import mysql.connector  # Added: Database connection
+from typing import Optional, Any, Iterator, List, Dict, Tuple, Union
+from cost_guard import GuardedResult, QueryRejected, run_guarded
+from db import get_pool  # Shared pooled database access
+from fast_path import FastAnswer, get_fast_path
+from llm_gateway import LLM_TIMEOUT, CircuitOpen, LLMGateway
+from replica import get_replica
+from prompts import PromptTemplate, batch_sql_budget, get_template, narration_budget, sql_budget
+from normalized_schema import ACTIVITIES_TEXT_COLUMNS, DERIVED_TABLES, NORMALIZED_SCHEMA
+from partitions import prune_sql
+from result_cache import get_result_cache, probe_table_version, rows_digest
+from results_encoder import encode_results
+from schema_provider import EXCLUDED_TABLES, get_schema_provider
+from stats_engine import narration_facts
+from sql_cache import get_sql_cache, schema_fingerprint
+import telemetry
 
 # Environment variables configuration
 env_path = Path(__file__).parent.parent / ".env"
@@ -12,95 +31,165 @@ if env_path.exists():
 
     load_dotenv(env_path)
 
-# Initialize client
-client = OpenAI(
-    api_key=os.getenv("DEEPSEEK_API_KEY"), base_url="https://api.deepseek.com"
+# Client: timeouts, retries, hedging and circuit breaking live in the gateway
+_client: Optional[LLMGateway] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMGateway:
+    """
+    Process-wide DeepSeek gateway, built on first use so offline paths (which
+    pass their own client) never need DEEPSEEK_API_KEY.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMGateway(
+                OpenAI(
+                    api_key=os.getenv("DEEPSEEK_API_KEY"),
+                    base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+                    timeout=LLM_TIMEOUT,
+                    max_retries=0,
+                )
+            )
+        return _client
+
+LLM_UNAVAILABLE_ANSWER = (
+    "❌ The language model is temporarily unavailable. Cached answers and simple "
+    "lookups are still served; please retry this question shortly."
 )
 
-# Added: Database connection configuration (example, actual values should come from environment variables)
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "localhost"),
-    "user": os.getenv("DB_USER", "root"),
-    "password": os.getenv("DB_PASSWORD", ""),
-    "database": os.getenv("DB_NAME", "analytics"),
-}
 
+def llm_unavailable(llm_client: Any = None) -> bool:
+    """True while the client's circuit breaker is refusing calls"""
+    breaker = getattr(llm_client or get_client(), "breaker", None)
+    return bool(breaker and breaker.is_open())
+
+
+def _raw_results_answer(results: List[Dict[str, Any]]) -> str:
+    """Degraded answer while narration is unavailable: the encoded rows themselves"""
+    if not results:
+        return "⚠️ Narration unavailable. The query returned no rows."
+    return f"⚠️ Narration unavailable; query results:\n{encode_results(results).text}"
 
+
+@contextmanager
 def get_db_connection():
-    """Added: Get database connection"""
+    """Borrow a pooled database connection (yields None if the database is unreachable)"""
+    pool = get_pool()
     try:
-        return mysql.connector.connect(**DB_CONFIG)
+        with telemetry.span("db_acquire"):
+            conn = pool.acquire()
     except Exception as e:
         print(f"⚠️ Database connection failed: {e}")  # CHANGED: Translated to English
-        return None
+        yield None
+        return
+
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
 
 
-def query_to_sql(natural_language_query: str, table_schema: str) -> Optional[str]:
+# Questions packed into one batched SQL-generation request
+SQL_BATCH_SIZE = int(os.getenv("SQL_BATCH_SIZE", 10))
+
+
+def _complete(
+    template: PromptTemplate,
+    fields: Dict[str, str],
+    max_tokens: int,
+    stage: str,
+    llm_client: Any = None,
+    temperature: float = 0.1,
+) -> Any:
+    """
+    One chat completion from a prompt template. A response cut off by the adaptive
+    budget (finish_reason "length") is retried once with twice the budget.
+    """
+    messages = template.render(**fields)
+    for attempt in range(2):
+        response = (llm_client or get_client()).chat.completions.create(
+            model="deepseek-chat",
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        telemetry.record_usage(response, stage, prompt=template.id)
+        choice = response.choices[0] if response.choices else None
+        if attempt or getattr(choice, "finish_reason", None) != "length":
+            return response
+        telemetry.count("llm_truncated", 1, stage=stage, prompt=template.id)
+        max_tokens *= 2
+    return response
+
+
+def query_to_sql(
+    natural_language_query: str,
+    table_schema: Optional[str] = None,
+    llm_client: Any = None,
+    use_cache: bool = True,
+) -> Optional[str]:
     """
     Optimized DeepSeek SQL generation function
+    table_schema: schema text for the prompt; None introspects the database and
+    sends only the tables/columns relevant to the question
+    llm_client: any OpenAI-compatible client, defaults to get_client()
+    use_cache: look up / store the generated SQL in the persistent SQL cache
     """
-    prompt = f"""
-    # Role
-    You are a professional MySQL database engineer, focused on converting natural language queries into precise SQL statements.
-
-    # Database structure
-    {table_schema}
-
-    # Task
-    Convert the following query into MySQL syntax, strictly following these rules:
-
-    # Rules
-    1. **Output only the SQL statement**, without any explanations, tags, or comments
-    2. You must start with one of these syntax structures:
-       - SELECT
-       - WITH (CTE query)
-    3. Do not use these operations:
-       - DROP, DELETE, UPDATE, INSERT, ALTER
-    4. Field reference format:
-       - Use field names directly (e.g., `department`)
-       - Do not wrap fields in backticks or quotes
-    5. Date handling:
-       - Use `DATE(hire_date)` to process dates
-       - For year comparisons, use `YEAR(hire_date) = 2023`
-    
-    # Additional SQL generation guidelines: [NEW SECTION]
-    - Map date references to our week numbering system. Week numbering system (example): Week 1: 2024-08-01 to 2024-08-07, Week 7: 2024-08-28 to 2024-09-03
-    - If the query mentions "2024-08-28", use week_number = 7 instead of WEEK functions
-    - Use broader search terms for semantic queries (e.g., use LIKE '%retention%' instead of multiple conditions)
-    - For time periods, map calendar references to our sequential week numbers (e.g., "September 2024" → weeks 7-10)
-    - Always include DISTINCT when counting or listing employees to avoid duplication
-    - When searching for recession periods, include years 2020-2021
-    - For "last 4 weeks", use week_number BETWEEN (SELECT MAX(week_number) - 3 FROM activities) AND (SELECT MAX(week_number) FROM activities)
-    - For customer experience/retention queries, use:
-    WHERE activities LIKE '%customer retention%'
-     OR activities LIKE '%retention%'
-     OR activities LIKE '%engagement%'
-     OR activities LIKE '%feedback%'
-     OR activities LIKE '%challenge%'
-     OR activities LIKE '%solution%'
-
-    # User query
-    {natural_language_query}
-
-    # Output requirements
-    Only output the SQL statement that complies with the above rules, without any other content!
+    if table_schema is None:
+        table_schema = schema_for([natural_language_query])
+    template = get_template("sql")
+    with telemetry.span("sql_generation", prompt=template.id) as span:
+        fingerprint = schema_fingerprint(table_schema, template.fingerprint)
+        cache = get_sql_cache() if use_cache else None
+        if cache:
+            cached_sql = cache.get(natural_language_query, fingerprint)
+            telemetry.cache_lookup("sql", bool(cached_sql))
+            span.set(cache_hit=bool(cached_sql))
+            if cached_sql:
+                return cached_sql
+
+        budget = sql_budget(natural_language_query)
+        span.set(max_tokens=budget)
+        try:
+            response = _complete(
+                template,
+                {"table_schema": table_schema, "natural_language_query": natural_language_query},
+                budget,
+                "sql_generation",
+                llm_client,
+            )
+            sql = response.choices[0].message.content.strip()
+
+            if not _validate_sql(sql):
+                raise ValueError("SQL syntax validation failed")
+            if cache:
+                cache.put(natural_language_query, fingerprint, sql)
+            return sql
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            print(f"⚠️ DeepSeek API error: {e}")
+            return None
+
+
+def schema_for(questions: List[str]) -> str:
     """
-
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            max_tokens=200,
+    Introspected schema pruned to what `questions` mention, following SCHEMA_LAYOUT
+    (falls back to the static BENCHMARK_SCHEMA when the database is unreachable)
+    """
+    if os.getenv("SCHEMA_LAYOUT", "wide") == "normalized":
+        provider = get_schema_provider(
+            visible_columns={"activities": ACTIVITIES_TEXT_COLUMNS}
         )
-        sql = response.choices[0].message.content.strip()
-
-        if not _validate_sql(sql):
-            raise ValueError("SQL syntax validation failed")
-        return sql
+    else:
+        provider = get_schema_provider(exclude_tables=EXCLUDED_TABLES + DERIVED_TABLES)
+    try:
+        with telemetry.span("schema_lookup", questions=len(questions)):
+            return provider.schema_for_many(questions)
     except Exception as e:
-        print(f"⚠️ DeepSeek API error: {e}")
-        return None
+        print(f"⚠️ Schema introspection failed, using the static schema: {e}")
+        return BENCHMARK_SCHEMA
 
 
 def _validate_sql(sql: str) -> bool:
@@ -112,94 +201,485 @@ def _validate_sql(sql: str) -> bool:
     )
 
 
+def _parse_batch_sql(content: str, count: int) -> Dict[int, str]:
+    """Per-question SQL (1-based) from a batched response; malformed output yields {}"""
+    text = content.strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        data = json.loads(text[start : end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    parsed = {}
+    for key, sql in data.items():
+        try:
+            index = int(str(key).strip().rstrip("."))
+        except ValueError:
+            continue
+        if 1 <= index <= count and isinstance(sql, str):
+            parsed[index] = sql.strip()
+    return parsed
+
+
+def _generate_sql_batch(
+    questions: List[str], table_schema: str, llm_client: Any = None
+) -> Dict[int, str]:
+    """One LLM request for several questions; returns whatever SQL could be parsed"""
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+    template = get_template("sql_batch")
+    budget = batch_sql_budget(questions)
+    with telemetry.span(
+        "sql_generation_batch", questions=len(questions), prompt=template.id, max_tokens=budget
+    ) as span:
+        try:
+            response = _complete(
+                template,
+                {"table_schema": table_schema, "numbered_queries": numbered},
+                budget,
+                "sql_generation_batch",
+                llm_client,
+            )
+            parsed = _parse_batch_sql(response.choices[0].message.content, len(questions))
+            span.set(parsed=len(parsed))
+            return parsed
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            print(f"⚠️ DeepSeek API error (batch of {len(questions)}): {e}")
+            return {}
+
+
+def query_to_sql_batch(
+    questions: List[str],
+    table_schema: Optional[str] = None,
+    llm_client: Any = None,
+    use_cache: bool = True,
+    batch_size: int = SQL_BATCH_SIZE,
+) -> List[Optional[str]]:
+    """
+    Generate SQL for many questions with one LLM request per `batch_size` questions.
+    Cached questions are answered from the SQL cache; questions whose batched SQL is
+    missing or fails validation fall back to a single query_to_sql call.
+    Returns one SQL string (or None) per question, in order. With no
+    `table_schema`, each batch gets the introspected schema relevant to its questions.
+    """
+    cache = get_sql_cache() if use_cache else None
+    results: List[Optional[str]] = [None] * len(questions)
+
+    def fingerprint(question: str) -> str:
+        # Same key query_to_sql would use, so both paths share cache entries
+        schema = table_schema if table_schema is not None else schema_for([question])
+        return schema_fingerprint(schema, get_template("sql").fingerprint)
+
+    pending: Dict[str, List[int]] = {}  # question -> positions, so duplicates are asked once
+    for i, question in enumerate(questions):
+        cached_sql = cache.get(question, fingerprint(question)) if cache else None
+        if cached_sql:
+            results[i] = cached_sql
+        else:
+            pending.setdefault(question, []).append(i)
+
+    unique = list(pending)
+    for start in range(0, len(unique), max(1, batch_size)):
+        chunk = unique[start : start + max(1, batch_size)]
+        chunk_schema = table_schema if table_schema is not None else schema_for(chunk)
+        generated = _generate_sql_batch(chunk, chunk_schema, llm_client) if len(chunk) > 1 else {}
+        for n, question in enumerate(chunk, 1):
+            sql = generated.get(n)
+            if sql and _validate_sql(sql):
+                if cache:
+                    cache.put(question, fingerprint(question), sql)
+            else:
+                sql = query_to_sql(question, table_schema, llm_client=llm_client, use_cache=use_cache)
+            for i in pending[question]:
+                results[i] = sql
+    return results
+
+
 # Added core functionality ==============================================
+def _fast_answer(query: str) -> Optional[FastAnswer]:
+    """Templated answer for simple lookups (FAST_PATH=off disables), or None to take the LLM path"""
+    fast = get_fast_path()
+    if not fast:
+        return None
+    try:
+        return fast.answer(query)
+    except Exception as e:
+        print(f"⚠️ Fast path failed, falling back to the LLM: {e}")
+        return None
+
+
+def _activities_version() -> Optional[str]:
+    """Cheap version probe of the activities table (or its replica) for the result cache"""
+    replica = get_replica()
+    if replica:
+        return replica.version()
+    with get_db_connection() as db_conn:
+        if not db_conn:
+            return None
+        return probe_table_version(db_conn, "activities")
+
+
+def execute_guarded(sql: str, use_cache: bool = True) -> GuardedResult:
+    """
+    Run a validated SELECT through the cost guard (EXPLAIN admission, row cap,
+    time limit, streamed fetch). Raises QueryRejected / ConnectionError on failure.
+    With QUERY_BACKEND=replica it runs on the local replica instead, falling back
+    to MySQL for SQL the replica cannot answer (e.g. normalized-layout tables).
+    """
+    with telemetry.span("execution") as span:
+        cache = get_result_cache(_activities_version) if use_cache else None
+        if cache:
+            cached = cache.get_rows(sql)
+            telemetry.cache_lookup("rows", cached is not None)
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                span.set(rows=len(cached.rows))
+                return cached
+
+        replica = get_replica()
+        if replica:
+            try:
+                result = replica.run_guarded(sql)
+                span.set(rows=len(result.rows), truncated=result.truncated, backend="replica")
+                telemetry.count("rows_returned", len(result.rows))
+                if cache:
+                    cache.put_rows(sql, result)
+                return result
+            except Exception as e:
+                print(f"⚠️ Replica could not run the query, using MySQL: {e}")
+
+        with get_db_connection() as db_conn:
+            if not db_conn:
+                raise ConnectionError("Database connection failed")
+            # Constant week bounds on partitioned storage so MySQL prunes partitions
+            result = run_guarded(db_conn, prune_sql(db_conn, sql))
+
+        span.set(rows=len(result.rows), truncated=result.truncated)
+        telemetry.count("rows_returned", len(result.rows))
+        if cache:
+            cache.put_rows(sql, result)
+        return result
+
+
+def execute_sql(sql: str, use_cache: bool = True) -> List[Dict[str, Any]]:
+    """Run a validated SELECT and return the (possibly capped) rows as dicts (raises on failure)"""
+    return execute_guarded(sql, use_cache=use_cache).rows
+
+
 def query_to_natural_language(
     query: str,
-    table_schema: str,
+    table_schema: Optional[str] = None,
     analysis_type: str = "auto",  # 'auto'|'numerical'|'qualitative'
+    sql: Optional[str] = None,
+    llm_client: Any = None,
+    use_cache: bool = True,
 ) -> str:
     """
     End-to-end natural language query processing
     Input: Natural language question + table structure
     Output: Natural language answer
+    Pass `sql` to reuse an already generated statement instead of asking the LLM again.
+    With `use_cache`, repeat questions over an unchanged table skip the DB and the LLM.
     """
+    with telemetry.span("question", analysis_type=analysis_type):
+        return _query_to_natural_language(
+            query, table_schema, analysis_type, sql, llm_client, use_cache
+        )
+
+
+def _query_to_natural_language(
+    query: str,
+    table_schema: Optional[str],
+    analysis_type: str,
+    sql: Optional[str],
+    llm_client: Any,
+    use_cache: bool,
+) -> str:
+    # 0. Simple lookups are answered from templates without the LLM
+    if sql is None:
+        local = _fast_answer(query)
+        if local:
+            return local.answer
+
     # 1. Generate SQL
-    sql = query_to_sql(query, table_schema)
+    if sql is None:
+        sql = query_to_sql(query, table_schema, llm_client=llm_client, use_cache=use_cache)
     if not sql:
+        if llm_unavailable(llm_client):
+            return LLM_UNAVAILABLE_ANSWER
         return "❌ Unable to generate a valid database query."  # CHANGED: Translated to English
 
     # 2. Execute query
-    db_conn = get_db_connection()
-    if not db_conn:
-        return "❌ Database connection failed"  # CHANGED: Translated to English
-
     try:
-        cursor = db_conn.cursor(dictionary=True)
-        cursor.execute(sql)
-        results = cursor.fetchall()
+        guarded = execute_guarded(sql, use_cache=use_cache)
+    except ConnectionError:
+        return "❌ Database connection failed"  # CHANGED: Translated to English
+    except QueryRejected as e:
+        return f"❌ Query rejected by cost guard: {str(e)}"
     except Exception as e:
         return f"❌ Query execution failed: {str(e)}"  # CHANGED: Translated to English
-    finally:
-        db_conn.close()
 
     # 3. Convert to natural language
-    return _results_to_natural_language(
-        query=query, results=results, analysis_type=analysis_type
+    answer = _results_to_natural_language(
+        query=query,
+        results=guarded.rows,
+        analysis_type=analysis_type,
+        llm_client=llm_client,
+        use_cache=use_cache,
     )
+    notice = guarded.notice()
+    return f"{notice}\n{answer}" if notice else answer
+
+
+def query_to_natural_language_batch(
+    queries: List[str],
+    table_schema: Optional[str] = None,
+    analysis_type: str = "auto",
+    llm_client: Any = None,
+    use_cache: bool = True,
+    batch_size: int = SQL_BATCH_SIZE,
+    concurrency: int = 4,
+) -> List[str]:
+    """
+    Answer many questions: simple lookups come from the fast path, SQL for the
+    rest from query_to_sql_batch, then each statement is executed and narrated
+    (up to `concurrency` at a time). Returns one answer per question, in order.
+    """
+    local = [_fast_answer(query) for query in queries]
+    remaining = [query for query, fast in zip(queries, local) if not fast]
+    sqls = iter(
+        query_to_sql_batch(
+            remaining, table_schema, llm_client=llm_client, use_cache=use_cache,
+            batch_size=batch_size,
+        )
+    )
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = []
+        for query, fast in zip(queries, local):
+            if fast:
+                futures.append(None)
+                continue
+            # "" rather than None: the batch already fell back to single calls
+            futures.append(
+                pool.submit(
+                    query_to_natural_language, query, table_schema, analysis_type,
+                    next(sqls) or "", llm_client, use_cache,
+                )
+            )
+        return [
+            fast.answer if fast else future.result() for fast, future in zip(local, futures)
+        ]
+
+
+def _narration_request(
+    query: str, results: List[Dict[str, Any]], analysis_type: str
+) -> Tuple[PromptTemplate, Dict[str, str], int]:
+    """Template, fields and completion budget for narrating query results"""
+    template = get_template("narration")
+    encoded = encode_results(results)
+    fields = {
+        "query": query,
+        "analysis_type": analysis_type,
+        "results_label": "summary + sample rows" if encoded.summarized else "CSV, header first",
+        "results": encoded.text,
+    }
+    if "facts" in template.fields:
+        fields["facts"] = _narration_facts(results) or "None for these results."
+    budget = narration_budget(len(results), analysis_type, encoded.summarized)
+    return template, fields, budget
+
+
+def _narration_facts(results: List[Dict[str, Any]]) -> str:
+    """Precomputed comparison figures for the prompt; "" if they cannot be computed"""
+    try:
+        return narration_facts(results)
+    except Exception as e:
+        print(f"⚠️ Narration statistics failed, narrating without them: {e}")
+        return ""
 
 
 def _results_to_natural_language(
-    query: str, results: List[Dict[str, Any]], analysis_type: str
+    query: str,
+    results: List[Dict[str, Any]],
+    analysis_type: str,
+    llm_client: Any = None,
+    use_cache: bool = True,
 ) -> str:
     """Convert query results to natural language"""
-    prompt = f"""
-    # Task
-    Answer the user's question in natural language based on database query results.
-    
-    # User question
-    {query}
-
-    # Query results (JSON format)
-    {results}
-
-    # Response requirements
-    1. Focus processing based on analysis type:
-       - "numerical": Emphasize numbers and statistical information
-       - "qualitative": Analyze patterns and trends
-       - "auto": Automatically determine the best approach
-    2. If results are empty, state "No relevant data found"
-    3. Answer in English, maintaining professionalism while being easy to understand
-    4. If results contain duplicate entries (e.g., same employee appearing multiple times), summarize them as a single entry in the response.
-    5. - For numerical results: 
-    -If value > average: "This is X% higher than the company average of Y." 
-    -If value < average: "This is X% lower than the company average of Y."
-    
-    # Response formatting guidelines: [NEW SECTION]
-    - Focus on answering the question directly without mentioning data structure issues like duplication
-    - Use a consistent structure for responses: start with a direct answer, then provide supporting details
-    - When results are empty, suggest possible reasons and alternatives
-    - For numerical queries, always include the key figures prominently
-    - For qualitative queries, highlight patterns and insights
-    - Ignore duplicate entries in results when formulating your response
-    - For comparisons, clearly state the differences with specific values
-    - If the query involves specific dates, periods, or ranges, reference them explicitly in your answer
-    - Provide context for numerical values when appropriate (e.g., "which is 20% higher than average")
-    """
-
+    with telemetry.span("narration", rows=len(results)) as span:
+        cache = get_result_cache(_activities_version) if use_cache else None
+        digest = rows_digest(results)
+        if cache:
+            cached_answer = cache.get_answer(query, digest, analysis_type)
+            telemetry.cache_lookup("answer", cached_answer is not None)
+            span.set(cache_hit=cached_answer is not None)
+            if cached_answer is not None:
+                return cached_answer
+
+        template, fields, budget = _narration_request(query, results, analysis_type)
+        span.set(prompt=template.id, max_tokens=budget)
+        try:
+            response = _complete(template, fields, budget, "narration", llm_client, temperature=0.3)
+            answer = response.choices[0].message.content
+            if cache:
+                cache.put_answer(query, digest, analysis_type, answer)
+            return answer
+        except CircuitOpen:
+            span.set(error="CircuitOpen")
+            return _raw_results_answer(results)
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            return f"❌ Response generation failed: {str(e)}"
+
+
+def _stream_results_to_natural_language(
+    query: str,
+    results: List[Dict[str, Any]],
+    analysis_type: str,
+    llm_client: Any = None,
+    use_cache: bool = True,
+) -> Iterator[str]:
+    """Streaming variant of _results_to_natural_language: yields answer chunks as they arrive"""
+    # A span would leak its context across yields, so the duration is observed at the end
+    start = time.perf_counter()
+    cache = get_result_cache(_activities_version) if use_cache else None
+    digest = rows_digest(results)
+    if cache:
+        cached_answer = cache.get_answer(query, digest, analysis_type)
+        telemetry.cache_lookup("answer", cached_answer is not None)
+        if cached_answer is not None:
+            yield cached_answer
+            telemetry.observe(
+                "narration", time.perf_counter() - start, rows=len(results), cache_hit=True
+            )
+            return
+
+    parts = []
+    # Chunks already shown cannot be retried, so a truncated stream is only counted
+    template, fields, budget = _narration_request(query, results, analysis_type)
     try:
-        response = client.chat.completions.create(
+        stream = (llm_client or get_client()).chat.completions.create(
             model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
+            messages=template.render(**fields),
             temperature=0.3,
+            max_tokens=budget,
+            stream=True,
         )
-        return response.choices[0].message.content
+        for chunk in stream:
+            # Providers that report usage on streams send it on a final, choice-less chunk
+            telemetry.record_usage(chunk, "narration", prompt=template.id)
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                parts.append(text)
+                yield text
+            if getattr(chunk.choices[0], "finish_reason", None) == "length":
+                telemetry.count("llm_truncated", 1, stage="narration", prompt=template.id)
     except Exception as e:
-        return f"❌ Response generation failed: {str(e)}"
+        telemetry.observe(
+            "narration", time.perf_counter() - start, rows=len(results), error=type(e).__name__
+        )
+        if isinstance(e, CircuitOpen) and not parts:
+            yield _raw_results_answer(results)
+        else:
+            yield f"❌ Response generation failed: {str(e)}"
+        return
 
+    telemetry.observe("narration", time.perf_counter() - start, rows=len(results), stream=True)
+    if cache:
+        cache.put_answer(query, digest, analysis_type, "".join(parts))
 
-def benchmark_test():
-    """Run benchmark test for all 20 example queries"""
-    schema = """
+
+def stream_natural_language(
+    query: str,
+    table_schema: Optional[str] = None,
+    analysis_type: str = "auto",
+    sql: Optional[str] = None,
+    llm_client: Any = None,
+    use_cache: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of query_to_natural_language.
+    Yields stage events first ({"type": "stage", "stage": "sql_generated" | "rows_fetched" | "narrating"},
+    or a single "fast_path" stage when a template answers the question locally),
+    a {"type": "notice"} event if the cost guard truncated the rows, then {"type": "token", "text": ...} per answer chunk, and finally
+    {"type": "done", "answer": ..., "ttfb_ms": ..., "total_ms": ...} where ttfb_ms is the
+    time to the first answer token.
+    """
+    start = time.perf_counter()
+
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - start) * 1000, 2)
+
+    def done(answer: str, ttfb_ms: Optional[float]) -> Dict[str, Any]:
+        telemetry.observe(
+            "question", time.perf_counter() - start, analysis_type=analysis_type, stream=True
+        )
+        return {"type": "done", "answer": answer, "ttfb_ms": ttfb_ms, "total_ms": elapsed_ms()}
+
+    if sql is None:
+        local = _fast_answer(query)
+        if local:
+            yield {
+                "type": "stage",
+                "stage": "fast_path",
+                "intent": local.intent,
+                "elapsed_ms": elapsed_ms(),
+            }
+            ttfb_ms = elapsed_ms()
+            yield {"type": "token", "text": local.answer}
+            yield done(local.answer, ttfb_ms)
+            return
+        sql = query_to_sql(query, table_schema, llm_client=llm_client, use_cache=use_cache)
+    if not sql:
+        if llm_unavailable(llm_client):
+            yield done(LLM_UNAVAILABLE_ANSWER, None)
+        else:
+            yield done("❌ Unable to generate a valid database query.", None)
+        return
+    yield {"type": "stage", "stage": "sql_generated", "sql": sql, "elapsed_ms": elapsed_ms()}
+
+    try:
+        guarded = execute_guarded(sql, use_cache=use_cache)
+    except ConnectionError:
+        yield done("❌ Database connection failed", None)
+        return
+    except QueryRejected as e:
+        yield done(f"❌ Query rejected by cost guard: {str(e)}", None)
+        return
+    except Exception as e:
+        yield done(f"❌ Query execution failed: {str(e)}", None)
+        return
+    results = guarded.rows
+    yield {
+        "type": "stage",
+        "stage": "rows_fetched",
+        "rows": len(results),
+        "truncated": guarded.truncated,
+        "estimated_rows": guarded.estimated_rows,
+        "elapsed_ms": elapsed_ms(),
+    }
+    if guarded.truncated:
+        yield {"type": "notice", "text": guarded.notice()}
+
+    yield {"type": "stage", "stage": "narrating", "elapsed_ms": elapsed_ms()}
+    parts = []
+    ttfb_ms = None
+    for text in _stream_results_to_natural_language(
+        query, results, analysis_type, llm_client=llm_client, use_cache=use_cache
+    ):
+        if ttfb_ms is None:
+            ttfb_ms = elapsed_ms()
+        parts.append(text)
+        yield {"type": "token", "text": text}
+    yield done("".join(parts), ttfb_ms)
+
+
+WIDE_SCHEMA = """
     activities(
         id INT, 
         employee_id VARCHAR(20), 
@@ -216,58 +696,55 @@ def benchmark_test():
     )
     """
 
-    # 20 example queries
-    queries = [
-        "What is the email address of the employee who is the Sales Manager?",
-        "Which employee in the company works in the Product Development department?",
-        "What was the sales revenue of 'Wei Zhang' for the week starting on '2024-08-28'?",
-        "Who are the employees working in the 'Finance' department?",
-        "Retrieve the total number of meetings attended by 'Na Li' in her weekly updates.",
-        "Which employees worked more than 40 hours during week 1?",
-        "How many employees does the company have in total?",
-        "What is the average hours worked by all employees during week 2?",
-        "How much total sales revenue has the Sales department generated to date?",
-        "What is the total sales revenue generated by the company during week 1?",
-        "Who worked the most hours during the first week of September 2024?",
-        "Which employee attended the most meetings during week 2?",
-        "Which employees in the company were hired during a time of industry recession?",
-        "Who are the employees that faced challenges with customer retention, and what solutions did they propose?",
-        "Which employees work in roles that likely require data analysis or reporting skills?",
-        "List all employees who work in the IT department within the company.",
-        "Compare the hours worked by 'Wei Zhang' and 'Tao Huang' during week 1.",
-        "Who are the top 3 employees by total hours worked during the last 4 weeks?",
-        "Who achieved the highest sales revenue in a single week, and when?",
-        "What is the total number of hours worked and average sales revenue for employees in the Business Development department?",
-    ]
-
-    print("\n=== Benchmark Test ===\n")  # CHANGED: Translated to English
-    results = []
-
-    for i, query in enumerate(queries, 1):
-        print(f"Query {i}/20: {query}")  # CHANGED: Translated to English
-
-        # Generate SQL
-        sql = query_to_sql(query, schema)
-        print(f"SQL: {sql}")
-
-        # Execute query and generate response
-        answer = query_to_natural_language(query, schema, "auto")
-        print(f"Response:\n{answer}\n")  # CHANGED: Translated to English
-        print("-" * 80)
-
-        # Save results
-        results.append({"query_id": i, "query": query, "sql": sql, "answer": answer})
-
-    # Optional: Save results to file
-    import json
-
-    with open("benchmark_results.json", "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
-
-    print(
-        "\nBenchmark test complete, results saved to benchmark_results.json"
-    )  # CHANGED: Translated to English
+# Static schema text for offline runs and as the introspection fallback
+# (SCHEMA_LAYOUT=normalized once `normalized_schema.py --migrate` has run)
+BENCHMARK_SCHEMA = (
+    NORMALIZED_SCHEMA if os.getenv("SCHEMA_LAYOUT", "wide") == "normalized" else WIDE_SCHEMA
+)
+
+# 20 example queries
+BENCHMARK_QUERIES = [
+    "What is the email address of the employee who is the Sales Manager?",
+    "Which employee in the company works in the Product Development department?",
+    "What was the sales revenue of 'Wei Zhang' for the week starting on '2024-08-28'?",
+    "Who are the employees working in the 'Finance' department?",
+    "Retrieve the total number of meetings attended by 'Na Li' in her weekly updates.",
+    "Which employees worked more than 40 hours during week 1?",
+    "How many employees does the company have in total?",
+    "What is the average hours worked by all employees during week 2?",
+    "How much total sales revenue has the Sales department generated to date?",
+    "What is the total sales revenue generated by the company during week 1?",
+    "Who worked the most hours during the first week of September 2024?",
+    "Which employee attended the most meetings during week 2?",
+    "Which employees in the company were hired during a time of industry recession?",
+    "Who are the employees that faced challenges with customer retention, and what solutions did they propose?",
+    "Which employees work in roles that likely require data analysis or reporting skills?",
+    "List all employees who work in the IT department within the company.",
+    "Compare the hours worked by 'Wei Zhang' and 'Tao Huang' during week 1.",
+    "Who are the top 3 employees by total hours worked during the last 4 weeks?",
+    "Who achieved the highest sales revenue in a single week, and when?",
+    "What is the total number of hours worked and average sales revenue for employees in the Business Development department?",
+]
+
+
+def benchmark_test():
+    """Run benchmark test for all 20 example queries (see benchmark.py for options)"""
+    from benchmark import run_benchmark
+
+    run_benchmark(BENCHMARK_QUERIES, None)  # schema introspected per question
 
 
 if __name__ == "__main__":
-    benchmark_test()  # Run benchmark test
+    if len(sys.argv) > 1:
+        # python llm_integration.py "Who are the employees in Finance?" streams one answer
+        for event in stream_natural_language(" ".join(sys.argv[1:])):
+            if event["type"] == "stage":
+                print(f"[{event['stage']} @ {event['elapsed_ms']}ms]", file=sys.stderr)
+            elif event["type"] == "token":
+                print(event["text"], end="", flush=True)
+            elif event["type"] == "notice":
+                print(event["text"], file=sys.stderr)
+            else:
+                print(f"\n\n(first token {event['ttfb_ms']}ms, total {event['total_ms']}ms)")
+    else:
+        benchmark_test()  # Run benchmark test
@@ -0,0 +1,143 @@
+# scripts/load_test.py
+"""Closed-loop load test for service.py.
+
+By default an offline service (fake LLM, no database) is started in-process
+on a free port; pass --url to target a running instance instead. Questions
+cycle through the 20 benchmark queries across --clients client ids, so
+identical in-flight questions get coalesced and per-client limits apply (a
+running instance only honours the ids when the load generator's address is in
+SERVICE_TRUSTED_PROXIES).
+
+    python load_test.py --requests 2000 --concurrency 64
+    python load_test.py --url http://localhost:8000 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from benchmark import summarize_latencies
+from llm_integration import BENCHMARK_QUERIES
+from service import create_app, offline_pipeline
+
+
+async def run_load(
+    url: str,
+    requests: int = 1000,
+    concurrency: int = 32,
+    clients: int = 8,
+    endpoint: str = "/ask",
+    questions: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Fire `requests` POSTs with `concurrency` in flight; latency and status summary"""
+    questions = questions or BENCHMARK_QUERIES
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    coalesced = 0
+    next_index = 0
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        nonlocal next_index, coalesced
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            body = {"question": questions[i % len(questions)]}
+            headers = {"X-Client-Id": f"client-{i % clients}"}
+            start = time.perf_counter()
+            try:
+                async with session.post(url + endpoint, json=body, headers=headers) as resp:
+                    payload = await resp.json()
+                    statuses[resp.status] += 1
+                    if resp.status == 200:
+                        latencies.append(time.perf_counter() - start)
+                        coalesced += bool(payload.get("coalesced"))
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+
+    wall_start = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    wall_time = time.perf_counter() - wall_start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "clients": clients,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(requests / wall_time, 2) if wall_time else 0.0,
+        "ok_rps": round(statuses[200] / wall_time, 2) if wall_time else 0.0,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "coalesced": coalesced,
+        "latency": summarize_latencies(latencies),
+    }
+
+
+async def run_offline(args: argparse.Namespace) -> Dict[str, Any]:
+    """Start an offline service on a free local port and load it"""
+    app = create_app(
+        *offline_pipeline(args.llm_latency),
+        workers=args.workers,
+        max_queue=args.max_queue,
+        rate=args.rate,
+        burst=args.burst,
+        # The load generator stands in for a proxy so its client ids are honoured
+        trusted_proxies=frozenset({"127.0.0.1"}),
+    )
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        return await run_load(
+            f"http://127.0.0.1:{port}", args.requests, args.concurrency, args.clients, args.endpoint
+        )
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the HTTP service")
+    parser.add_argument("--url", help="Target a running service instead of an in-process offline one")
+    parser.add_argument("--endpoint", default="/ask", choices=["/ask", "/sql"])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--clients", type=int, default=8)
+    # In-process offline service settings
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency (s)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Per-client requests/s")
+    parser.add_argument("--burst", type=int, default=1000)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.url:
+        report = asyncio.run(
+            run_load(args.url.rstrip("/"), args.requests, args.concurrency, args.clients, args.endpoint)
+        )
+    else:
+        report = asyncio.run(run_offline(args))
+
+    latency = report["latency"]
+    print(
+        f"{report['requests']} requests in {report['wall_time_s']}s: "
+        f"{report['throughput_rps']} req/s ({report['ok_rps']} ok/s), statuses {report['statuses']}"
+    )
+    print(
+        f"latency p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms p99={latency['p99_ms']}ms, "
+        f"{report['coalesced']} coalesced"
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
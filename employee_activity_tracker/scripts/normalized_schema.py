@@ -0,0 +1,257 @@
+# scripts/normalized_schema.py
+"""Normalized layout derived from the wide `activities` table.
+
+`activities` stays the table loaders write to (and the one the FULLTEXT
+index lives on). From it we maintain:
+
+    employees               one row per employee (dimension)
+    activity_facts          slim numeric facts, one row per activities row
+    employee_totals         per-employee rollup
+    department_week_totals  per-department, per-week rollup
+
+Maintenance is incremental: `refresh_rollups` only folds in activities rows
+above the high-water id recorded in `rollup_state`. Directory and aggregate
+questions then read small tables instead of scanning the fact table.
+
+    python normalized_schema.py --migrate   # create tables and backfill
+    python normalized_schema.py --refresh   # fold in newly inserted rows
+    python normalized_schema.py --rebuild   # recompute from scratch
+"""
+import argparse
+
+from db import get_connection
+
+DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS employees (
+        employee_id VARCHAR(20) PRIMARY KEY,
+        full_name VARCHAR(100) NOT NULL,
+        email VARCHAR(100),
+        department VARCHAR(50),
+        job_title VARCHAR(100),
+        hire_date DATE,
+        INDEX (department),
+        INDEX (full_name)
+    ) COMMENT = 'one row per employee; use for directory questions (who/which/how many employees)'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS activity_facts (
+        activity_id INT PRIMARY KEY,
+        employee_id VARCHAR(20) NOT NULL,
+        week_number INT,
+        num_meetings INT,
+        total_sales_rmb DECIMAL(10, 2),
+        hours_worked DECIMAL(5, 1),
+        INDEX (employee_id, week_number),
+        INDEX (week_number)
+    ) COMMENT = 'one row per employee-week, numbers only; join employees on employee_id'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS employee_totals (
+        employee_id VARCHAR(20) PRIMARY KEY,
+        weeks_reported INT NOT NULL,
+        total_meetings INT NOT NULL,
+        total_sales_rmb DECIMAL(14, 2) NOT NULL,
+        total_hours DECIMAL(10, 1) NOT NULL,
+        first_week INT,
+        last_week INT
+    ) COMMENT = 'all-time totals per employee'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS department_week_totals (
+        department VARCHAR(50) NOT NULL,
+        week_number INT NOT NULL,
+        records INT NOT NULL,
+        total_meetings INT NOT NULL,
+        total_sales_rmb DECIMAL(14, 2) NOT NULL,
+        total_hours DECIMAL(10, 1) NOT NULL,
+        PRIMARY KEY (department, week_number)
+    ) COMMENT = 'totals per department and week (average = total / records)'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        name VARCHAR(64) PRIMARY KEY,
+        high_water_id BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+DERIVED_TABLES = ("employees", "activity_facts", "employee_totals", "department_week_totals")
+
+# activities columns still described to the model in the normalized layout (text search only)
+ACTIVITIES_TEXT_COLUMNS = ("id", "employee_id", "week_number", "activities")
+
+# Schema text for query_to_sql when SCHEMA_LAYOUT=normalized
+NORMALIZED_SCHEMA = """
+    employees(  -- one row per employee; use for directory questions (who/which/how many employees)
+        employee_id VARCHAR(20) PRIMARY KEY,
+        full_name VARCHAR(100),
+        email VARCHAR(100),
+        department VARCHAR(50),
+        job_title VARCHAR(100),
+        hire_date DATE
+    )
+    activity_facts(  -- one row per employee-week, numbers only; join employees on employee_id
+        activity_id INT,
+        employee_id VARCHAR(20),
+        week_number INT,
+        num_meetings INT,
+        total_sales_rmb DECIMAL(10, 2),
+        hours_worked DECIMAL(5, 1)
+    )
+    employee_totals(  -- all-time totals per employee
+        employee_id VARCHAR(20) PRIMARY KEY,
+        weeks_reported INT,
+        total_meetings INT,
+        total_sales_rmb DECIMAL(14, 2),
+        total_hours DECIMAL(10, 1),
+        first_week INT,
+        last_week INT
+    )
+    department_week_totals(  -- totals per department and week (average = total / records)
+        department VARCHAR(50),
+        week_number INT,
+        records INT,
+        total_meetings INT,
+        total_sales_rmb DECIMAL(14, 2),
+        total_hours DECIMAL(10, 1)
+    )
+    activities(  -- weekly free-text updates; only needed for searching the activities text
+        id INT,
+        employee_id VARCHAR(20),
+        week_number INT,
+        activities TEXT
+    )
+    """
+
+
+def normalized_schema_installed(conn) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) AS n FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'rollup_state'"
+        )
+        return cursor.fetchone()["n"] > 0
+
+
+def create_tables(conn) -> None:
+    with conn.cursor() as cursor:
+        for statement in DDL:
+            cursor.execute(statement)
+    conn.commit()
+
+
+def refresh_rollups(conn) -> int:
+    """Fold activities rows above the high-water id into the derived tables"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT high_water_id FROM rollup_state WHERE name = 'activities'")
+        row = cursor.fetchone()
+        high_water = row["high_water_id"] if row else 0
+        cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM activities")
+        max_id = cursor.fetchone()["max_id"]
+
+    if max_id < high_water:
+        # activities was truncated underneath us; ids restarted
+        return rebuild_rollups(conn)
+    if max_id == high_water:
+        return 0
+
+    window = "FROM activities WHERE id > %s AND id <= %s"
+    params = (high_water, max_id)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO employees (employee_id, full_name, email, department, job_title, hire_date)
+            SELECT employee_id, full_name, email, department, job_title, hire_date {window}
+            ON DUPLICATE KEY UPDATE
+                full_name = VALUES(full_name), email = VALUES(email),
+                department = VALUES(department), job_title = VALUES(job_title),
+                hire_date = VALUES(hire_date)
+            """,
+            params,
+        )
+        cursor.execute(
+            f"""
+            INSERT IGNORE INTO activity_facts
+                (activity_id, employee_id, week_number, num_meetings, total_sales_rmb, hours_worked)
+            SELECT id, employee_id, week_number, num_meetings, total_sales_rmb, hours_worked {window}
+            """,
+            params,
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO employee_totals
+                (employee_id, weeks_reported, total_meetings, total_sales_rmb, total_hours,
+                 first_week, last_week)
+            SELECT employee_id, COUNT(*), COALESCE(SUM(num_meetings), 0),
+                   COALESCE(SUM(total_sales_rmb), 0), COALESCE(SUM(hours_worked), 0),
+                   MIN(week_number), MAX(week_number)
+            {window}
+            GROUP BY employee_id
+            ON DUPLICATE KEY UPDATE
+                weeks_reported = weeks_reported + VALUES(weeks_reported),
+                total_meetings = total_meetings + VALUES(total_meetings),
+                total_sales_rmb = total_sales_rmb + VALUES(total_sales_rmb),
+                total_hours = total_hours + VALUES(total_hours),
+                first_week = LEAST(first_week, VALUES(first_week)),
+                last_week = GREATEST(last_week, VALUES(last_week))
+            """,
+            params,
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO department_week_totals
+                (department, week_number, records, total_meetings, total_sales_rmb, total_hours)
+            SELECT department, week_number, COUNT(*), COALESCE(SUM(num_meetings), 0),
+                   COALESCE(SUM(total_sales_rmb), 0), COALESCE(SUM(hours_worked), 0)
+            {window}
+            GROUP BY department, week_number
+            ON DUPLICATE KEY UPDATE
+                records = records + VALUES(records),
+                total_meetings = total_meetings + VALUES(total_meetings),
+                total_sales_rmb = total_sales_rmb + VALUES(total_sales_rmb),
+                total_hours = total_hours + VALUES(total_hours)
+            """,
+            params,
+        )
+        cursor.execute(
+            "INSERT INTO rollup_state (name, high_water_id) VALUES ('activities', %s) "
+            "ON DUPLICATE KEY UPDATE high_water_id = VALUES(high_water_id)",
+            (max_id,),
+        )
+    conn.commit()
+    return max_id - high_water
+
+
+def rebuild_rollups(conn) -> int:
+    """Empty the derived tables and recompute them from all of activities"""
+    with conn.cursor() as cursor:
+        for table in DERIVED_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("DELETE FROM rollup_state WHERE name = 'activities'")
+    conn.commit()
+    return refresh_rollups(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the normalized activities layout")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--migrate", action="store_true", help="Create tables and backfill")
+    group.add_argument("--refresh", action="store_true", help="Fold in new activities rows")
+    group.add_argument("--rebuild", action="store_true", help="Recompute everything")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        if args.migrate:
+            create_tables(conn)
+            folded = refresh_rollups(conn)
+            print(f"✅ Normalized schema ready ({folded} activities rows folded in).")
+            print("Set SCHEMA_LAYOUT=normalized so query_to_sql describes the new tables.")
+        elif args.refresh:
+            print(f"Folded in {refresh_rollups(conn)} new activities rows.")
+        else:
+            print(f"Rebuilt rollups from {rebuild_rollups(conn)} activities rows.")
+
+
+if __name__ == "__main__":
+    main()
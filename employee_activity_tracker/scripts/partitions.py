@@ -0,0 +1,481 @@
+# scripts/partitions.py
+"""Week-partitioned `activities` storage: pruning, maintenance and archival.
+
+`--migrate` range-partitions activities by week_number into blocks of
+PARTITION_WEEKS weeks (plus a catch-all `pmax`) and adds the composite
+indexes behind the common filters: (week_number, department) and
+(employee_id, week_number) (the ingest unique key). MySQL requires every
+unique key to contain the partitioning column, so the primary key becomes
+(id, week_number); `id` stays AUTO_INCREMENT. The migration copies the table
+once, so run it in a quiet window.
+
+InnoDB does not support FULLTEXT indexes on partitioned tables, so the
+migration drops ft_activities. Generated SQL keeps working: on partitioned
+storage prune_sql() rewrites MATCH ... AGAINST into LIKE terms (restricted to
+the partitions the week filter selects). It also inlines the
+`(SELECT MAX(week_number) ... FROM activities)` bounds the SQL prompt uses for
+"last N weeks": MySQL only prunes on constants, and MAX(week_number) is a
+single index lookup.
+
+Bounded partitions are kept PARTITION_LOOKAHEAD blocks ahead of the newest
+week (ingest.py and populate_data.py call extend_partitions() after loading).
+`--archive` exports every partition that lies wholly older than
+ARCHIVE_KEEP_WEEKS before the newest week to a gzip CSV (with a JSON manifest)
+under ARCHIVE_DIR, verifies it, then truncates the partition.
+
+    python partitions.py --migrate
+    python partitions.py --status
+    python partitions.py --extend
+    python partitions.py --archive --keep-weeks 52 [--dry-run]
+    python partitions.py --restore ../archive/activities_w0001-w0013.csv.gz
+    python partitions.py --explain "SELECT ... WHERE week_number BETWEEN (SELECT MAX(week_number) - 3 FROM activities) AND ..."
+"""
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import pymysql.cursors
+
+import telemetry
+
+PARTITION_WEEKS = int(os.getenv("PARTITION_WEEKS", 13))
+PARTITION_LOOKAHEAD = int(os.getenv("PARTITION_LOOKAHEAD", 1))
+PARTITION_LAYOUT_TTL = float(os.getenv("PARTITION_LAYOUT_TTL", 300))
+ARCHIVE_KEEP_WEEKS = int(os.getenv("ARCHIVE_KEEP_WEEKS", 52))
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", Path(__file__).parent.parent / "archive"))
+RESTORE_BATCH_SIZE = 1000
+
+WEEK_DEPARTMENT_INDEX = "ix_week_department"
+CATCH_ALL = "pmax"
+
+# `(SELECT MAX(week_number) - 3 FROM activities)` as written by the SQL prompt
+_MAX_WEEK_RE = re.compile(
+    r"\(\s*SELECT\s+MAX\s*\(\s*week_number\s*\)\s*(?:([+-])\s*(\d+)\s*)?FROM\s+activities\s*\)",
+    re.IGNORECASE,
+)
+_MATCH_RE = re.compile(r"\bMATCH\s*\(", re.IGNORECASE)
+
+
+class Partition(NamedTuple):
+    name: str
+    upper: Optional[int]  # VALUES LESS THAN; None for MAXVALUE
+    rows: int  # InnoDB estimate
+
+    @property
+    def weeks(self) -> str:
+        start = int(self.name[1:]) if self.name != CATCH_ALL else None
+        if start is None:
+            return "rest"
+        return f"{start}-{self.upper - 1}"
+
+
+class Layout(NamedTuple):
+    partitioned: bool
+    fulltext: bool
+
+
+# Layout ===============================================================
+def list_partitions(conn, table: str = "activities") -> List[Partition]:
+    """Partitions of `table` in range order (empty when it is not partitioned)"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound, TABLE_ROWS AS n "
+            "FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            (table,),
+        )
+        return [
+            Partition(
+                row["name"],
+                None if row["bound"] == "MAXVALUE" else int(row["bound"]),
+                int(row["n"] or 0),
+            )
+            for row in cursor.fetchall()
+        ]
+
+
+def is_partitioned(conn, table: str = "activities") -> bool:
+    return bool(list_partitions(conn, table))
+
+
+def max_week(conn) -> Optional[int]:
+    """Newest week in activities (one index lookup once the composite index exists)"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT MAX(week_number) AS w FROM activities")
+        value = cursor.fetchone()["w"]
+    return int(value) if value is not None else None
+
+
+def block_start(week: int, weeks: int = PARTITION_WEEKS) -> int:
+    """First week of the block containing `week` (blocks start at week 1)"""
+    return ((max(week, 1) - 1) // weeks) * weeks + 1
+
+
+def partition_clauses(first: int, upto: int, weeks: int = PARTITION_WEEKS) -> List[str]:
+    """PARTITION clauses for `weeks`-week blocks starting at week `first`, up to (excluding) `upto`"""
+    return [
+        f"PARTITION w{start:04d} VALUES LESS THAN ({start + weeks})"
+        for start in range(first, upto, weeks)
+    ]
+
+
+def _target_upper(newest: Optional[int], weeks: int, lookahead: int) -> int:
+    return block_start(newest or 1, weeks) + weeks * (1 + lookahead)
+
+
+# Maintenance ==========================================================
+def ensure_indexes(conn) -> List[str]:
+    """Composite indexes for week/department and employee/week filters; returns those created"""
+    from ingest import ensure_unique_key
+
+    created = []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) AS n FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'activities' AND INDEX_NAME = %s",
+            (WEEK_DEPARTMENT_INDEX,),
+        )
+        if cursor.fetchone()["n"] == 0:
+            cursor.execute(
+                f"ALTER TABLE activities ADD INDEX {WEEK_DEPARTMENT_INDEX} (week_number, department)"
+            )
+            created.append(WEEK_DEPARTMENT_INDEX)
+    conn.commit()
+    # (employee_id, week_number) doubles as the ingest upsert key
+    if ensure_unique_key(conn) >= 0:
+        created.append("uq_employee_week")
+    return created
+
+
+def migrate(conn, weeks: int = PARTITION_WEEKS, lookahead: int = PARTITION_LOOKAHEAD) -> List[Partition]:
+    """Partition activities by week_number (no-op when it already is); returns the layout"""
+    from search_index import FULLTEXT_INDEX, has_fulltext_index
+
+    created = ensure_indexes(conn)
+    if created:
+        print(f"Added indexes: {', '.join(created)}")
+    if is_partitioned(conn):
+        print("activities is already partitioned")
+        return list_partitions(conn)
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT MIN(week_number) AS lo, MAX(week_number) AS hi FROM activities")
+        bounds = cursor.fetchone()
+        # The first partition also takes any older week (RANGE has no lower bound)
+        clauses = partition_clauses(
+            block_start(bounds["lo"] or 1, weeks), _target_upper(bounds["hi"], weeks, lookahead), weeks
+        )
+        clauses.append(f"PARTITION {CATCH_ALL} VALUES LESS THAN MAXVALUE")
+
+        if has_fulltext_index(conn):
+            print(f"⚠️ Dropping {FULLTEXT_INDEX}: InnoDB cannot partition tables with FULLTEXT indexes")
+            cursor.execute(f"ALTER TABLE activities DROP INDEX {FULLTEXT_INDEX}")
+        # Unique keys must contain the partitioning column
+        cursor.execute(
+            "ALTER TABLE activities DROP PRIMARY KEY, ADD PRIMARY KEY (id, week_number)"
+        )
+        cursor.execute(
+            "ALTER TABLE activities PARTITION BY RANGE (week_number) (\n    "
+            + ",\n    ".join(clauses)
+            + "\n)"
+        )
+    conn.commit()
+    reset_layout()
+    return list_partitions(conn)
+
+
+def extend_partitions(conn, weeks: int = PARTITION_WEEKS, lookahead: int = PARTITION_LOOKAHEAD) -> List[str]:
+    """
+    Split new blocks off `pmax` so bounded partitions stay `lookahead` blocks
+    ahead of the newest week; returns the partitions added
+    """
+    partitions = list_partitions(conn)
+    if not partitions or partitions[-1].upper is not None:
+        return []
+    bounded = [p.upper for p in partitions if p.upper is not None]
+    current = max(bounded) if bounded else 1
+    clauses = partition_clauses(current, _target_upper(max_week(conn), weeks, lookahead), weeks)
+    if not clauses:
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE activities REORGANIZE PARTITION {CATCH_ALL} INTO (\n    "
+            + ",\n    ".join(clauses + [f"PARTITION {CATCH_ALL} VALUES LESS THAN MAXVALUE"])
+            + "\n)"
+        )
+    conn.commit()
+    return [clause.split()[1] for clause in clauses]
+
+
+def _after_change(conn) -> None:
+    """Rollups and cache invalidation after archived rows left (or came back to) activities"""
+    from normalized_schema import normalized_schema_installed, rebuild_rollups
+    from result_cache import bump_table_version
+
+    if normalized_schema_installed(conn):
+        print(f"Rebuilt rollup tables from {rebuild_rollups(conn)} rows")
+    with conn.cursor() as cursor:
+        bump_table_version(cursor, "activities")
+    conn.commit()
+
+
+# Archival =============================================================
+def cold_partitions(conn, keep_weeks: int = ARCHIVE_KEEP_WEEKS) -> List[Partition]:
+    """Non-empty partitions whose weeks all lie more than `keep_weeks` before the newest week"""
+    newest = max_week(conn)
+    if newest is None:
+        return []
+    cutoff = newest - keep_weeks + 1  # first week that stays online
+    return [p for p in list_partitions(conn) if p.upper is not None and p.upper <= cutoff]
+
+
+def _partition_rows(conn, name: str) -> int:
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) AS n FROM activities PARTITION ({name})")
+        return cursor.fetchone()["n"]
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def archive_partition(conn, partition: Partition, out_dir: Path = ARCHIVE_DIR) -> Dict[str, Any]:
+    """
+    Stream one partition to <out_dir>/activities_<weeks>.csv.gz, check the file
+    reads back with the same row count, then truncate the partition
+    """
+    start = int(partition.name[1:])
+    stem = f"activities_w{start:04d}-w{partition.upper - 1:04d}"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if (out_dir / f"{stem}.csv.gz").exists():
+        # Late rows archived again: never overwrite the earlier file
+        stem += datetime.now().strftime("_%Y%m%d%H%M%S")
+    path = out_dir / f"{stem}.csv.gz"
+    tmp = path.with_suffix(".gz.tmp")
+
+    exported = 0
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(f"SELECT * FROM activities PARTITION ({partition.name}) ORDER BY id")
+        with gzip.open(tmp, "wt", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([column[0] for column in cursor.description])
+            while True:
+                batch = cursor.fetchmany(RESTORE_BATCH_SIZE)
+                if not batch:
+                    break
+                writer.writerows(batch)
+                exported += len(batch)
+    finally:
+        cursor.close()
+
+    with gzip.open(tmp, "rt", encoding="utf-8", newline="") as f:
+        readback = sum(1 for _ in csv.reader(f)) - 1
+    if readback != exported or _partition_rows(conn, partition.name) != exported:
+        tmp.unlink()
+        raise RuntimeError(
+            f"{partition.name}: exported {exported} rows, read back {readback}; partition left in place"
+        )
+    os.replace(tmp, path)
+
+    manifest = {
+        "partition": partition.name,
+        "weeks": [start, partition.upper - 1],
+        "rows": exported,
+        "file": path.name,
+        "sha256": _sha256(path),
+        "archived_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    path.with_name(f"{stem}.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    # Truncate rather than drop: late rows for these weeks still land in their own partition
+    with conn.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE activities TRUNCATE PARTITION {partition.name}")
+    conn.commit()
+    return manifest
+
+
+def archive(conn, keep_weeks: int = ARCHIVE_KEEP_WEEKS, out_dir: Path = ARCHIVE_DIR, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """Archive every cold, non-empty partition; returns the manifests written"""
+    manifests = []
+    for partition in cold_partitions(conn, keep_weeks):
+        rows = _partition_rows(conn, partition.name)
+        if not rows:
+            continue
+        if dry_run:
+            print(f"Would archive {partition.name} (weeks {partition.weeks}, {rows} rows)")
+            continue
+        with telemetry.span("archive_partition", partition=partition.name) as span:
+            manifest = archive_partition(conn, partition, out_dir)
+            span.set(rows=manifest["rows"])
+        print(f"✅ {partition.name} (weeks {partition.weeks}): {manifest['rows']} rows → {manifest['file']}")
+        manifests.append(manifest)
+    if manifests:
+        _after_change(conn)
+    return manifests
+
+
+def restore(conn, path: Path) -> int:
+    """
+    Load an archive file back into activities; rows whose (employee_id,
+    week_number) was re-ingested since keep the newer data. Returns rows inserted.
+    """
+    manifest_path = path.with_name(path.name.replace(".csv.gz", "") + ".json")
+    if manifest_path.exists():
+        expected = json.loads(manifest_path.read_text(encoding="utf-8"))["sha256"]
+        if _sha256(path) != expected:
+            raise ValueError(f"{path.name} does not match its manifest checksum")
+
+    inserted = 0
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f, conn.cursor() as cursor:
+        reader = csv.reader(f)
+        columns = next(reader)
+        sql = (
+            f"INSERT IGNORE INTO activities ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        batch: List[List[Optional[str]]] = []
+        for row in reader:
+            batch.append([value if value != "" else None for value in row])
+            if len(batch) >= RESTORE_BATCH_SIZE:
+                inserted += cursor.executemany(sql, batch) or 0
+                batch = []
+        if batch:
+            inserted += cursor.executemany(sql, batch) or 0
+    conn.commit()
+    _after_change(conn)
+    return inserted
+
+
+# Query rewriting ======================================================
+_layout_lock = threading.Lock()
+_layout: Tuple[float, Optional[Layout]] = (0.0, None)
+
+
+def reset_layout() -> None:
+    global _layout
+    with _layout_lock:
+        _layout = (0.0, None)
+
+
+def storage_layout(conn) -> Layout:
+    """Whether activities is partitioned / has its FULLTEXT index (cached PARTITION_LAYOUT_TTL seconds)"""
+    global _layout
+    with _layout_lock:
+        checked_at, layout = _layout
+        if layout is not None and time.monotonic() - checked_at < PARTITION_LAYOUT_TTL:
+            return layout
+    from search_index import has_fulltext_index
+
+    layout = Layout(is_partitioned(conn), has_fulltext_index(conn))
+    with _layout_lock:
+        _layout = (time.monotonic(), layout)
+    return layout
+
+
+def inline_week_bounds(sql: str, newest: int) -> str:
+    """Replace `(SELECT MAX(week_number) ± n FROM activities)` with its value"""
+
+    def value(match: "re.Match[str]") -> str:
+        offset = int(match.group(2) or 0)
+        return str(newest - offset if match.group(1) == "-" else newest + offset)
+
+    return _MAX_WEEK_RE.sub(value, sql)
+
+
+def prune_sql(conn, sql: str) -> str:
+    """
+    Rewrite a generated SELECT for partitioned storage: constant week bounds so
+    MySQL prunes partitions, LIKE terms where the FULLTEXT index is gone.
+    Unpartitioned tables get the SQL back unchanged.
+    """
+    layout = storage_layout(conn)
+    if not layout.partitioned:
+        return sql
+    rewritten = sql
+    if _MAX_WEEK_RE.search(rewritten):
+        newest = max_week(conn)
+        if newest is not None:
+            rewritten = inline_week_bounds(rewritten, newest)
+    if not layout.fulltext and _MATCH_RE.search(rewritten):
+        from replica import match_to_like
+
+        rewritten = match_to_like(rewritten)
+    if rewritten != sql:
+        telemetry.count("sql_partition_rewrites")
+    return rewritten
+
+
+def explain_partitions(conn, sql: str) -> List[Tuple[str, str]]:
+    """(table, partitions read) per EXPLAIN row"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}")
+        return [(row.get("table") or "", row.get("partitions") or "") for row in cursor.fetchall()]
+
+
+# CLI ==================================================================
+def print_status(conn) -> None:
+    partitions = list_partitions(conn)
+    if not partitions:
+        print("activities is not partitioned (run --migrate)")
+        return
+    newest = max_week(conn)
+    print(f"{len(partitions)} partitions, newest week {newest}")
+    for p in partitions:
+        print(f"  {p.name:<6} weeks {p.weeks:<9} ~{p.rows} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Week-partitioned activities storage")
+    parser.add_argument("--migrate", action="store_true", help="Partition activities by week_number and add composite indexes")
+    parser.add_argument("--status", action="store_true", help="List partitions with estimated row counts")
+    parser.add_argument("--extend", action="store_true", help="Add partitions ahead of the newest week")
+    parser.add_argument("--archive", action="store_true", help="Export cold partitions to gzip CSV and truncate them")
+    parser.add_argument("--keep-weeks", type=int, default=ARCHIVE_KEEP_WEEKS, help="Weeks before the newest that stay online")
+    parser.add_argument("--dir", default=str(ARCHIVE_DIR), help="Archive directory")
+    parser.add_argument("--dry-run", action="store_true", help="With --archive: list what would be archived")
+    parser.add_argument("--restore", help="Load an archive .csv.gz back into activities")
+    parser.add_argument("--explain", help="Show the partitions a SELECT reads, before and after prune_sql()")
+    parser.add_argument("--weeks", type=int, default=PARTITION_WEEKS, help="Weeks per partition (--migrate)")
+    args = parser.parse_args()
+
+    from db import get_connection
+
+    with get_connection() as conn:
+        if args.migrate:
+            start = time.perf_counter()
+            layout = migrate(conn, args.weeks)
+            print(f"✅ activities has {len(layout)} partitions ({time.perf_counter() - start:.1f}s)")
+        if args.extend:
+            added = extend_partitions(conn)
+            print(f"Added partitions: {', '.join(added)}" if added else "Partitions are up to date")
+        if args.archive:
+            manifests = archive(conn, args.keep_weeks, Path(args.dir), args.dry_run)
+            if not manifests and not args.dry_run:
+                print("No cold partitions to archive")
+        if args.restore:
+            print(f"✅ Restored {restore(conn, Path(args.restore))} rows from {args.restore}")
+        if args.explain:
+            for label, sql in (("as written", args.explain), ("pruned", prune_sql(conn, args.explain))):
+                reads = "; ".join(f"{table}: {parts or 'all'}" for table, parts in explain_partitions(conn, sql))
+                print(f"{label:>10}: {reads}")
+        if args.status or not any((args.migrate, args.extend, args.archive, args.restore, args.explain)):
+            print_status(conn)
+
+
+if __name__ == "__main__":
+    main()
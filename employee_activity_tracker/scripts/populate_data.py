@@ -1,31 +1,22 @@
+import argparse
+import csv
+import hashlib
+import os
 import pymysql
 import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from faker import Faker
-from datetime import datetime, timedelta
-import os
+from datetime import date, datetime, timedelta
 from pathlib import Path
+from typing import NamedTuple, Tuple
 import sys
-from dotenv import load_dotenv
-
-# Load environment variables
-env_path = Path(__file__).parent.parent / ".env"
-load_dotenv(env_path)
-
-# Initialize Faker
-fake = Faker("en_US")
-fake.seed_instance(42)  # Set seed for reproducibility
-
-# Database configuration
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "mysql"),
-    "port": int(os.getenv("DB_PORT", 3306)),
-    "user": os.getenv("DB_USER", "root"),
-    "password": os.getenv("DB_PASSWORD", "123456"),
-    "database": os.getenv("DB_NAME", "employee_tracking"),
-    "charset": "utf8mb4",
-    "cursorclass": pymysql.cursors.DictCursor,
-    "connect_timeout": 10,
-}
+from db import connect, get_pool
+from result_cache import bump_rewrite_version, bump_table_version
+from normalized_schema import normalized_schema_installed, rebuild_rollups, refresh_rollups
+from partitions import extend_partitions
+from search_index import ensure_fulltext_index
 
 # Fixed employee data to match the queries
 employees = [
@@ -266,87 +257,388 @@ for emp_id in [5, 8, 10]:  # Qiang Wang, Xue Wu, Fang Xu - for top 3 hours
                 30000.00 if emp["dept"] == "Sales" else 0.00,
             ]
 
-try:
-    # Establish connection
-    conn = pymysql.connect(**DB_CONFIG)
+ACTIVITY_COLUMNS = (
+    "employee_id",
+    "full_name",
+    "week_number",
+    "num_meetings",
+    "total_sales_rmb",
+    "hours_worked",
+    "activities",
+    "department",
+    "hire_date",
+    "email",
+    "job_title",
+)
+
+# Natural key of an activities row (UNIQUE once ingest.py has run)
+KEY_COLUMNS = ("employee_id", "week_number")
+
+
+def insert_sql(table: str = "activities") -> str:
+    # With the unique key in place a re-run updates rows instead of failing on duplicates
+    return f"""
+    INSERT INTO {table} ({", ".join(ACTIVITY_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(ACTIVITY_COLUMNS))})
+    ON DUPLICATE KEY UPDATE {", ".join(
+        f"{c} = VALUES({c})" for c in ACTIVITY_COLUMNS if c not in KEY_COLUMNS
+    )}
+"""
+
+
+INSERT_SQL = insert_sql()
+
+# Departments and roles used for synthetic (load-test) employees
+DEPARTMENT_ROLES = {
+    "Sales": ["Account Manager", "Sales Representative", "Sales Manager"],
+    "Marketing": ["Marketing Specialist", "SEO Analyst", "Content Strategist"],
+    "Product Development": ["Product Manager", "Software Engineer", "UX Designer"],
+    "Finance": ["Financial Analyst", "Accountant", "Controller"],
+    "IT": ["Data Engineer", "SysAdmin", "Support Engineer"],
+    "Business Development": ["Partnership Manager", "BD Analyst"],
+}
+
+
+# Synthetic employees per shard; part of the dataset definition, not a tuning knob
+SHARD_SIZE = 250
+# Synthetic hire dates: fixed bounds (not relative to today) so a seed always
+# yields the same rows; the activity weeks fall in late 2024
+HIRE_DATE_RANGE = (date(2016, 9, 1), date(2024, 7, 31))
+
+
+class ShardSpec(NamedTuple):
+    """One independently generated slice of the dataset"""
+
+    index: int
+    first_id: int
+    last_id: int
+    weeks: int
+    seed: int
+
+
+def sub_seed(seed: int, shard_index: int) -> int:
+    """Deterministic per-shard seed derived from the run seed"""
+    digest = hashlib.sha256(f"{seed}:{shard_index}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def shard_specs(num_employees: int, weeks: int, seed: int, shard_size: int = SHARD_SIZE):
+    """Shard 0 holds the fixture employees, later shards fixed-size synthetic ID ranges"""
+    specs = [ShardSpec(0, 1, len(employees), weeks, sub_seed(seed, 0))]
+    first_id = len(employees) + 1
+    while first_id <= num_employees:
+        last_id = min(first_id + shard_size - 1, num_employees)
+        specs.append(ShardSpec(len(specs), first_id, last_id, weeks, sub_seed(seed, len(specs))))
+        first_id = last_id + 1
+    return specs
+
+
+def fixture_rows(weeks: int = 10, seed: int = 42):
+    """Rows for the hand-written employees above, one per employee-week"""
+    rng = random.Random(seed)
+    for emp in employees:
+        emp_id = emp["id"]
+        dept = emp["dept"]
+
+        for week in range(1, weeks + 1):
+            # Use predefined activities if available, otherwise generate random ones
+            # (week 7 aligns with "2024-08-28" for query 3)
+            if week in emp["activities"]:
+                activities_str, hours_worked, num_meetings, total_sales = emp[
+                    "activities"
+                ][week]
+            else:
+                hours_worked = round(rng.uniform(35, 40), 1)
+                num_meetings = rng.randint(2, 5)
+                total_sales = (
+                    round(rng.uniform(25000, 30000), 2) if dept == "Sales" else 0.00
+                )
+                activities_str = "Regular weekly activities; Standard meetings"
+
+            yield (
+                f"EMP{emp_id:03d}",
+                emp["name"],
+                week,
+                num_meetings,
+                total_sales,
+                hours_worked,
+                activities_str,
+                dept,
+                emp["hire_date"],
+                emp["email"],
+                emp["job"],
+            )
+
+
+def synthetic_rows(first_id: int, last_id: int, weeks: int, seed: int = 42):
+    """Streaming generator of Faker-based rows for employees first_id..last_id"""
+    rng = random.Random(seed)
+    gen = Faker("en_US")
+    gen.seed_instance(seed)
+    departments = sorted(DEPARTMENT_ROLES)
+
+    for emp_id in range(first_id, last_id + 1):
+        name = gen.name()
+        first, *_, last = name.split()
+        email = f"{first[0].lower()}.{last.lower()}{emp_id}@company.com"
+        dept = rng.choice(departments)
+        job = rng.choice(DEPARTMENT_ROLES[dept])
+        hire_date = gen.date_between(*HIRE_DATE_RANGE).isoformat()
+
+        for week in range(1, weeks + 1):
+            yield (
+                f"EMP{emp_id:03d}",
+                name,
+                week,
+                rng.randint(1, 8),
+                round(rng.uniform(20000, 55000), 2) if dept == "Sales" else 0.00,
+                round(rng.uniform(32, 50), 1),
+                f"{gen.catch_phrase()}; {gen.bs().capitalize()}",
+                dept,
+                hire_date,
+                email,
+                job,
+            )
+
+
+def shard_rows(spec: ShardSpec):
+    if spec.index == 0:
+        yield from fixture_rows(spec.weeks, spec.seed)
+    else:
+        yield from synthetic_rows(spec.first_id, spec.last_id, spec.weeks, spec.seed)
+
+
+def generate_rows(num_employees: int = 10, weeks: int = 10, seed: int = 42):
+    """Fixture employees first, then synthetic ones up to `num_employees`"""
+    for spec in shard_specs(num_employees, weeks, seed):
+        yield from shard_rows(spec)
 
+
+def write_csv(f, rows) -> int:
+    """CSV layout shared by shard files and LOAD DATA LOCAL INFILE"""
+    writer = csv.writer(f, lineterminator="\n")
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def _chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_batched(
+    conn, rows, batch_size: int = 1000, commit_every: int = 50000, table: str = "activities"
+) -> Tuple[int, int]:
+    """
+    executemany in batches (PyMySQL folds each batch into multi-row VALUES);
+    returns (rows sent, affected rows: 1 per insert, 2 per updated row)
+    """
+    sql = INSERT_SQL if table == "activities" else insert_sql(table)
+    inserted = affected = 0
+    uncommitted = 0
+    with conn.cursor() as cursor:
+        for batch in _chunks(rows, batch_size):
+            affected += cursor.executemany(sql, batch) or 0
+            inserted += len(batch)
+            uncommitted += len(batch)
+            if uncommitted >= commit_every:
+                conn.commit()
+                uncommitted = 0
+    conn.commit()
+    return inserted, affected
+
+
+def load_infile(conn, rows, commit_every: int = 50000) -> Tuple[int, int]:
+    """
+    LOAD DATA LOCAL INFILE from a temp CSV per chunk (needs local_infile=1 on the
+    server); returns (rows sent, rows inserted; LOCAL skips duplicate keys)
+    """
+    inserted = affected = 0
     with conn.cursor() as cursor:
+        for chunk in _chunks(rows, commit_every):
+            with tempfile.NamedTemporaryFile(
+                "w", suffix=".csv", newline="", encoding="utf-8", delete=False
+            ) as f:
+                write_csv(f, chunk)
+            try:
+                affected += cursor.execute(
+                    f"""
+                    LOAD DATA LOCAL INFILE %s INTO TABLE activities
+                    CHARACTER SET utf8mb4
+                    FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+                    LINES TERMINATED BY '\\n'
+                    ({", ".join(ACTIVITY_COLUMNS)})
+                    """,
+                    (f.name,),
+                )
+            finally:
+                os.unlink(f.name)
+            conn.commit()
+            inserted += len(chunk)
+    return inserted, affected
+
+
+def run_shard(
+    spec: ShardSpec, method: str, batch_size: int, commit_every: int, output_dir=None
+) -> Tuple[int, int]:
+    """Worker entry point: generate one shard and stream it to a file or the database"""
+    rows = shard_rows(spec)
+    if output_dir:
+        path = Path(output_dir) / f"activities_shard_{spec.index:05d}.csv"
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            written = write_csv(f, rows)
+            return written, written
+
+    # Each process needs its own connection; pools don't survive fork
+    conn = connect(local_infile=True) if method == "infile" else connect()
+    try:
+        if method == "infile":
+            return load_infile(conn, rows, commit_every)
+        return insert_batched(conn, rows, batch_size, commit_every)
+    finally:
+        conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Populate the activities table")
+    parser.add_argument("--reset", action="store_true", help="Truncate activities first")
+    parser.add_argument("--employees", type=int, default=10, help="Total employees (fixtures included)")
+    parser.add_argument("--weeks", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per executemany call")
+    parser.add_argument("--commit-every", type=int, default=50000, help="Rows per transaction")
+    parser.add_argument("--method", choices=("executemany", "infile"), default="executemany")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Generator processes (0 = one per CPU core)"
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="Write per-shard CSV files here instead of the database; "
+        "concatenating them in name order gives the same bytes for any --workers",
+    )
+    return parser.parse_args(argv)
+
+
+def generate_sharded(args, num_employees: int) -> Tuple[int, int]:
+    """Fan shards out over a process pool; returns summed (rows, affected) per run_shard"""
+    specs = shard_specs(num_employees, args.weeks, args.seed)
+    workers = args.workers or os.cpu_count() or 1
+    if args.output_dir:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                run_shard, spec, args.method, args.batch_size, args.commit_every, args.output_dir
+            )
+            for spec in specs
+        ]
+        results = [f.result() for f in futures]
+        return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    num_employees = max(args.employees, len(employees))
+    pool = get_pool()
+    sharded = args.workers != 1 or args.output_dir
+
+    if args.output_dir:
+        start = time.perf_counter()
+        written, _ = generate_sharded(args, num_employees)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Wrote {written} records for {num_employees} employees × {args.weeks} weeks"
+            f" to {args.output_dir} ({written / elapsed:,.0f} rows/s)"
+        )
+        return
+
+    try:
+        # LOAD DATA LOCAL needs a dedicated connection with local_infile enabled
+        conn = connect(local_infile=True) if args.method == "infile" else pool.acquire()
+
         # Reset data
-        if "--reset" in sys.argv:
+        if args.reset:
             print("Resetting existing data...")
-            cursor.execute("TRUNCATE TABLE activities")
+            with conn.cursor() as cursor:
+                cursor.execute("TRUNCATE TABLE activities")
             conn.commit()
 
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS n FROM activities")
+            before = cursor.fetchone()["n"]
+
         # Generate data for all employees and weeks
         print("Generating sample data...")
+        start = time.perf_counter()
+        if sharded:
+            inserted, affected = generate_sharded(args, num_employees)
+        else:
+            rows = generate_rows(num_employees, args.weeks, args.seed)
+            if args.method == "infile":
+                inserted, affected = load_infile(conn, rows, args.commit_every)
+            else:
+                inserted, affected = insert_batched(conn, rows, args.batch_size, args.commit_every)
+        elapsed = time.perf_counter() - start
 
-        # First ensure we have complete data for all employees for all weeks
-        for emp in employees:
-            emp_id = emp["id"]
-            name = emp["name"]
-            email = emp["email"]
-            dept = emp["dept"]
-            job = emp["job"]
-            hire_date = emp["hire_date"]
-
-            # For each week 1-10
-            for week in range(1, 11):
-                # Use predefined activities if available, otherwise generate random ones
-                if week in emp["activities"]:
-                    activities_str = emp["activities"][week][0]
-                    hours_worked = emp["activities"][week][1]
-                    num_meetings = emp["activities"][week][2]
-                    total_sales = emp["activities"][week][3]
-                else:
-                    hours_worked = round(random.uniform(35, 40), 1)
-                    num_meetings = random.randint(2, 5)
-                    total_sales = (
-                        round(random.uniform(25000, 30000), 2)
-                        if dept == "Sales"
-                        else 0.00
-                    )
-                    activities_str = "Regular weekly activities; Standard meetings"
-
-                # Special case for week 7 - aligns with "2024-08-28" for query 3
-                week_start_date = None
-                if week == 7:
-                    week_start_date = "2024-08-28"
-
-                # Insert data
-                cursor.execute(
-                    """
-                    INSERT INTO activities 
-                    (employee_id, full_name, week_number, 
-                     num_meetings, total_sales_rmb, hours_worked, 
-                     activities, department, hire_date, email, job_title)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                    (
-                        f"EMP{emp_id:03d}",
-                        name,
-                        week,
-                        num_meetings,
-                        total_sales,
-                        hours_worked,
-                        activities_str,
-                        dept,
-                        hire_date,
-                        email,
-                        job,
-                    ),
-                )
+        # A re-run upserts on (employee_id, week_number): MySQL counts 1 per new
+        # row and 2 per row changed in place
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS n FROM activities")
+            added_rows = cursor.fetchone()["n"] - before
+        updated = max(0, affected - added_rows) // 2
+
+        # FULLTEXT index for semantic activity searches (kept current by InnoDB from now on)
+        if ensure_fulltext_index(conn):
+            print("Created FULLTEXT index on activities")
+        added = extend_partitions(conn)
+        if added:
+            print(f"Added partitions ahead of the newest week: {', '.join(added)}")
+
+        # Keep the employees dimension and rollup tables in step (after migration)
+        if normalized_schema_installed(conn):
+            # refresh_rollups only folds new ids; changed rows need a recompute
+            folded = rebuild_rollups(conn) if args.reset or updated else refresh_rollups(conn)
+            print(f"Folded {folded} rows into employees / rollup tables")
 
+        # Invalidate cached query results in llm_integration
+        with conn.cursor() as cursor:
+            bump_table_version(cursor, "activities")
+            if updated:
+                # The id-based replica re-copies on its next sync
+                bump_rewrite_version(cursor, "activities")
         conn.commit()
-        print(f"Successfully generated data for 10 employees × 10 weeks = 100 records")
-
-except pymysql.MySQLError as e:
-    print(f"Database error: {e}")
-    if "conn" in locals():
-        conn.rollback()
-    sys.exit(1)
-except Exception as e:
-    print(f"Unexpected error: {e}")
-    sys.exit(1)
-finally:
-    if "conn" in locals() and conn.open:
-        conn.close()
+        print(
+            f"Successfully generated data for {num_employees} employees × {args.weeks} weeks"
+            f" = {inserted} records ({inserted / elapsed:,.0f} rows/s)"
+        )
+        if updated:
+            print(f"{updated} rows were updated in place; the replica re-copies on its next sync")
+
+    except pymysql.MySQLError as e:
+        print(f"Database error: {e}")
+        if "conn" in locals():
+            conn.rollback()
+        sys.exit(1)
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        sys.exit(1)
+    finally:
+        if "conn" in locals():
+            if args.method == "infile":
+                conn.close()
+            else:
+                pool.release(conn)
+
+
+if __name__ == "__main__":
+    main()
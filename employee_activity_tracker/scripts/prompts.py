@@ -0,0 +1,384 @@
+# scripts/prompts.py
+"""Versioned prompt templates for SQL generation and narration.
+
+Each prompt is a PromptTemplate: an optional static system message plus a user
+message with `{field}` slots. Templates are compiled once at import (fields
+parsed, fingerprint hashed) and rendered into chat messages:
+
+    template = get_template("sql")
+    messages = template.render(table_schema=schema, natural_language_query=q)
+
+Versions:
+
+    v1  the original prompts: one user message with the question and results
+        in the middle of the rule blocks
+    v2  all static rules and guidelines in a system message that is
+        byte-identical across calls, variable parts (schema, question, results)
+        at the end of the user message, so provider prefix caches (DeepSeek
+        context caching, OpenAI prompt caching) can serve the shared prefix
+    v3  (narration) v2 plus precomputed company/department/week statistics
+        from stats_engine.py, which the model quotes instead of computing
+
+Each prompt defaults to its newest version. PROMPT_VERSION=vN rolls every
+prompt back to its newest version up to vN; PROMPT_VERSION_<NAME> pins one
+prompt exactly (e.g. PROMPT_VERSION_NARRATION=v2) for A/B runs.
+
+Completion budgets are adaptive instead of a fixed max_tokens: sql_budget()
+scales with how complex a question reads and narration_budget() with the
+number of rows being described, capped by SQL_MAX_TOKENS / NARRATION_MAX_TOKENS.
+"""
+import hashlib
+import os
+import re
+import string
+import textwrap
+from typing import Dict, List, Optional, Tuple
+
+SQL_MIN_TOKENS = int(os.getenv("SQL_MIN_TOKENS", 128))
+SQL_MAX_TOKENS = int(os.getenv("SQL_MAX_TOKENS", 512))
+NARRATION_MIN_TOKENS = int(os.getenv("NARRATION_MIN_TOKENS", 192))
+NARRATION_MAX_TOKENS = int(os.getenv("NARRATION_MAX_TOKENS", 1024))
+# Extra tokens per question in a batched response for the JSON keys and quoting
+BATCH_OVERHEAD_TOKENS = 16
+
+
+class PromptTemplate:
+    """A named, versioned prompt compiled once: static system part + user slots"""
+
+    def __init__(self, name: str, version: str, user: str, system: Optional[str] = None):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.user = user
+        self.fields = _fields(user) | (_fields(system) if system else frozenset())
+        if system and _fields(system):
+            raise ValueError(f"{self.id}: the system prefix must be static")
+        payload = f"{name}\n{version}\n{system or ''}\n---\n{user}".encode("utf-8")
+        self.fingerprint = hashlib.sha256(payload).hexdigest()[:16]
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}/{self.version}"
+
+    def render(self, **fields: str) -> List[Dict[str, str]]:
+        """Chat messages with the slots filled; fields the template does not use are ignored"""
+        missing = self.fields - fields.keys()
+        if missing:
+            raise KeyError(f"{self.id} needs {', '.join(sorted(missing))}")
+        messages = [{"role": "user", "content": self.user.format(**fields)}]
+        if self.system:
+            messages.insert(0, {"role": "system", "content": self.system})
+        return messages
+
+
+def _fields(text: str) -> frozenset:
+    return frozenset(f for _, f, _, _ in string.Formatter().parse(text) if f)
+
+
+def _block(text: str) -> str:
+    return textwrap.dedent(text).strip()
+
+
+# v1: the original single-message prompts =================================
+_V1_SQL_RULES = """
+    # Role
+    You are a professional MySQL database engineer, focused on converting natural language queries into precise SQL statements.
+
+    # Database structure
+    {table_schema}
+
+    # Task
+    Convert the following query into MySQL syntax, strictly following these rules:
+
+    # Rules
+    1. **Output only the SQL statement**, without any explanations, tags, or comments
+    2. You must start with one of these syntax structures:
+       - SELECT
+       - WITH (CTE query)
+    3. Do not use these operations:
+       - DROP, DELETE, UPDATE, INSERT, ALTER
+    4. Field reference format:
+       - Use field names directly (e.g., `department`)
+       - Do not wrap fields in backticks or quotes
+    5. Date handling:
+       - Use `DATE(hire_date)` to process dates
+       - For year comparisons, use `YEAR(hire_date) = 2023`
+
+    # Additional SQL generation guidelines: [NEW SECTION]
+    - Map date references to our week numbering system. Week numbering system (example): Week 1: 2024-08-01 to 2024-08-07, Week 7: 2024-08-28 to 2024-09-03
+    - If the query mentions "2024-08-28", use week_number = 7 instead of WEEK functions
+    - For semantic searches in the activities text, use the FULLTEXT index with MATCH(activities) AGAINST('term*' IN BOOLEAN MODE) instead of LIKE '%term%' (LIKE scans the whole table)
+    - For time periods, map calendar references to our sequential week numbers (e.g., "September 2024" → weeks 7-10)
+    - Always include DISTINCT when counting or listing employees to avoid duplication
+    - When searching for recession periods, include years 2020-2021
+    - For "last 4 weeks", use week_number BETWEEN (SELECT MAX(week_number) - 3 FROM activities) AND (SELECT MAX(week_number) FROM activities)
+    - For customer experience/retention queries, use:
+    WHERE MATCH(activities) AGAINST('retention* engagement* feedback* challenge* solution*' IN BOOLEAN MODE)
+"""
+
+_V1_SQL = _V1_SQL_RULES + """
+    # User query
+    {natural_language_query}
+
+    # Output requirements
+    Only output the SQL statement that complies with the above rules, without any other content!
+    """
+
+_V1_SQL_BATCH = _V1_SQL_RULES + """
+    # User queries
+    {numbered_queries}
+
+    # Output requirements
+    Apply the above rules to each query separately. Output a single JSON object mapping every query number to its SQL statement, e.g. {{"1": "SELECT ...", "2": "SELECT ..."}}, without any other content!
+    """
+
+_V1_NARRATION = """
+    # Task
+    Answer the user's question in natural language based on database query results.
+
+    # User question
+    {query}
+
+    # Query results ({results_label})
+    {results}
+
+    # Response requirements
+    1. Focus processing based on analysis type:
+       - "numerical": Emphasize numbers and statistical information
+       - "qualitative": Analyze patterns and trends
+       - "auto": Automatically determine the best approach
+    2. If results are empty, state "No relevant data found"
+    3. Answer in English, maintaining professionalism while being easy to understand
+    4. If results contain duplicate entries (e.g., same employee appearing multiple times), summarize them as a single entry in the response.
+    5. - For numerical results:
+    -If value > average: "This is X% higher than the company average of Y."
+    -If value < average: "This is X% lower than the company average of Y."
+
+    # Response formatting guidelines: [NEW SECTION]
+    - Focus on answering the question directly without mentioning data structure issues like duplication
+    - Use a consistent structure for responses: start with a direct answer, then provide supporting details
+    - When results are empty, suggest possible reasons and alternatives
+    - For numerical queries, always include the key figures prominently
+    - For qualitative queries, highlight patterns and insights
+    - Ignore duplicate entries in results when formulating your response
+    - For comparisons, clearly state the differences with specific values
+    - If the query involves specific dates, periods, or ranges, reference them explicitly in your answer
+    - Provide context for numerical values when appropriate (e.g., "which is 20% higher than average")
+    """
+
+
+# v2: static system prefix, variable parts last ============================
+# Shared by the single-question and batched SQL prompts, so both hit one cached prefix
+_V2_SQL_SYSTEM = _block("""
+    # Role
+    You are a professional MySQL database engineer, focused on converting natural language queries into precise SQL statements.
+
+    # Task
+    Convert the user's query into MySQL syntax against the database structure given with it, strictly following these rules:
+
+    # Rules
+    1. **Output only the SQL statement**, without any explanations, tags, or comments
+    2. You must start with one of these syntax structures:
+       - SELECT
+       - WITH (CTE query)
+    3. Do not use these operations:
+       - DROP, DELETE, UPDATE, INSERT, ALTER
+    4. Field reference format:
+       - Use field names directly (e.g., `department`)
+       - Do not wrap fields in backticks or quotes
+    5. Date handling:
+       - Use `DATE(hire_date)` to process dates
+       - For year comparisons, use `YEAR(hire_date) = 2023`
+
+    # Additional SQL generation guidelines
+    - Map date references to our week numbering system. Week numbering system (example): Week 1: 2024-08-01 to 2024-08-07, Week 7: 2024-08-28 to 2024-09-03
+    - If the query mentions "2024-08-28", use week_number = 7 instead of WEEK functions
+    - For semantic searches in the activities text, use the FULLTEXT index with MATCH(activities) AGAINST('term*' IN BOOLEAN MODE) instead of LIKE '%term%' (LIKE scans the whole table)
+    - For time periods, map calendar references to our sequential week numbers (e.g., "September 2024" → weeks 7-10)
+    - Always include DISTINCT when counting or listing employees to avoid duplication
+    - When searching for recession periods, include years 2020-2021
+    - For "last 4 weeks", use week_number BETWEEN (SELECT MAX(week_number) - 3 FROM activities) AND (SELECT MAX(week_number) FROM activities)
+    - For customer experience/retention queries, use:
+      WHERE MATCH(activities) AGAINST('retention* engagement* feedback* challenge* solution*' IN BOOLEAN MODE)
+""")
+
+# The schema varies per question (see schema_provider.py), so it opens the user message
+_V2_SQL = _block("""
+    # Database structure
+    {table_schema}
+
+    # User query
+    {natural_language_query}
+
+    # Output requirements
+    Only output the SQL statement that complies with the above rules, without any other content!
+""")
+
+_V2_SQL_BATCH = _block("""
+    # Database structure
+    {table_schema}
+
+    # User queries
+    {numbered_queries}
+
+    # Output requirements
+    Apply the above rules to each query separately. Output a single JSON object mapping every query number to its SQL statement, e.g. {{"1": "SELECT ...", "2": "SELECT ..."}}, without any other content!
+""")
+
+_V2_NARRATION_SYSTEM = _block("""
+    # Task
+    Answer the user's question in natural language based on the database query results that follow it.
+
+    # Response requirements
+    1. Focus processing based on the analysis type given with the question:
+       - "numerical": Emphasize numbers and statistical information
+       - "qualitative": Analyze patterns and trends
+       - "auto": Automatically determine the best approach
+    2. If results are empty, state "No relevant data found"
+    3. Answer in English, maintaining professionalism while being easy to understand
+    4. If results contain duplicate entries (e.g., same employee appearing multiple times), summarize them as a single entry in the response.
+    5. For numerical results:
+       - If value > average: "This is X% higher than the company average of Y."
+       - If value < average: "This is X% lower than the company average of Y."
+
+    # Response formatting guidelines
+    - Focus on answering the question directly without mentioning data structure issues like duplication
+    - Use a consistent structure for responses: start with a direct answer, then provide supporting details
+    - When results are empty, suggest possible reasons and alternatives
+    - For numerical queries, always include the key figures prominently
+    - For qualitative queries, highlight patterns and insights
+    - Ignore duplicate entries in results when formulating your response
+    - For comparisons, clearly state the differences with specific values
+    - If the query involves specific dates, periods, or ranges, reference them explicitly in your answer
+    - Provide context for numerical values when appropriate (e.g., "which is 20% higher than average")
+""")
+
+_V2_NARRATION = _block("""
+    # User question
+    {query}
+
+    # Analysis type
+    {analysis_type}
+
+    # Query results ({results_label})
+    {results}
+""")
+
+# v3: narration quotes figures computed by stats_engine.py instead of doing arithmetic
+_V3_NARRATION_SYSTEM = _block("""
+    # Task
+    Answer the user's question in natural language based on the database query results that follow it.
+
+    # Response requirements
+    1. Focus processing based on the analysis type given with the question:
+       - "numerical": Emphasize numbers and statistical information
+       - "qualitative": Analyze patterns and trends
+       - "auto": Automatically determine the best approach
+    2. If results are empty, state "No relevant data found"
+    3. Answer in English, maintaining professionalism while being easy to understand
+    4. If results contain duplicate entries (e.g., same employee appearing multiple times), summarize them as a single entry in the response.
+    5. Averages, percentages, percentiles and comparisons with the company, a department or a week come from "Precomputed statistics":
+       - Quote those figures as given (e.g., "This is 20.6% higher than the company average of 39.8.") and never compute them yourself
+       - If no statistics are given, do not compare with averages you were not given
+
+    # Response formatting guidelines
+    - Focus on answering the question directly without mentioning data structure issues like duplication
+    - Use a consistent structure for responses: start with a direct answer, then provide supporting details
+    - Keep the answer short: the direct answer and the few figures that support it
+    - When results are empty, suggest possible reasons and alternatives
+    - For numerical queries, always include the key figures prominently
+    - For qualitative queries, highlight patterns and insights
+    - Ignore duplicate entries in results when formulating your response
+    - For comparisons, clearly state the differences with specific values
+    - If the query involves specific dates, periods, or ranges, reference them explicitly in your answer
+""")
+
+_V3_NARRATION = _block("""
+    # User question
+    {query}
+
+    # Analysis type
+    {analysis_type}
+
+    # Precomputed statistics
+    {facts}
+
+    # Query results ({results_label})
+    {results}
+""")
+
+TEMPLATES: Dict[Tuple[str, str], PromptTemplate] = {
+    (t.name, t.version): t
+    for t in (
+        PromptTemplate("sql", "v1", _V1_SQL),
+        PromptTemplate("sql_batch", "v1", _V1_SQL_BATCH),
+        PromptTemplate("narration", "v1", _V1_NARRATION),
+        PromptTemplate("sql", "v2", _V2_SQL, system=_V2_SQL_SYSTEM),
+        PromptTemplate("sql_batch", "v2", _V2_SQL_BATCH, system=_V2_SQL_SYSTEM),
+        PromptTemplate("narration", "v2", _V2_NARRATION, system=_V2_NARRATION_SYSTEM),
+        PromptTemplate("narration", "v3", _V3_NARRATION, system=_V3_NARRATION_SYSTEM),
+    )
+}
+
+
+def _version_number(version: str) -> int:
+    return int(version.lower().lstrip("v"))
+
+
+def get_template(name: str, version: Optional[str] = None) -> PromptTemplate:
+    """
+    Template `name` at `version`, else PROMPT_VERSION_<NAME> (both exact), else
+    the newest version up to PROMPT_VERSION, else the newest version
+    """
+    versions = sorted((v for n, v in TEMPLATES if n == name), key=_version_number)
+    exact = version or os.getenv(f"PROMPT_VERSION_{name.upper()}")
+    ceiling = os.getenv("PROMPT_VERSION")
+    if exact:
+        chosen = exact if (name, exact) in TEMPLATES else None
+    elif ceiling:
+        eligible = [v for v in versions if _version_number(v) <= _version_number(ceiling)]
+        chosen = eligible[-1] if eligible else None
+    else:
+        chosen = versions[-1] if versions else None
+    if chosen is None:
+        raise KeyError(
+            f"Unknown prompt {name}/{exact or ceiling} (known versions: {', '.join(versions)})"
+        )
+    return TEMPLATES[(name, chosen)]
+
+
+# A mistyped PROMPT_VERSION fails at import rather than on the first question
+for _name in sorted({name for name, _ in TEMPLATES}):
+    get_template(_name)
+
+
+# Adaptive completion budgets ===============================================
+# Phrasings that usually mean joins, grouping, subqueries or CTEs in the SQL
+_COMPLEXITY_RE = re.compile(
+    r"\b(compare|comparison|versus|vs|each|per|by|average|avg|total|sum|top|rank|most|"
+    r"least|trend|growth|over time|between|last \d+|month|week|department|and|or|not|"
+    r"without|except|percentage|ratio|both|who also)\b",
+    re.IGNORECASE,
+)
+
+
+def sql_budget(question: str) -> int:
+    """max_tokens for one question's SQL: simple lookups get little, analytical questions more"""
+    markers = len(_COMPLEXITY_RE.findall(question))
+    words = len(question.split())
+    return min(SQL_MAX_TOKENS, SQL_MIN_TOKENS + 32 * markers + 2 * words)
+
+
+def batch_sql_budget(questions: List[str]) -> int:
+    """max_tokens for a batched response: every question's budget plus JSON framing"""
+    return sum(sql_budget(q) + BATCH_OVERHEAD_TOKENS for q in questions)
+
+
+def narration_budget(rows: int, analysis_type: str = "auto", summarized: bool = False) -> int:
+    """max_tokens for narrating `rows` results; qualitative answers get more room"""
+    budget = NARRATION_MIN_TOKENS + 12 * min(rows, 40)
+    if summarized:
+        budget += 128  # summary statistics plus sample rows to describe
+    if analysis_type != "numerical":
+        budget = int(budget * 1.25)
+    return min(NARRATION_MAX_TOKENS, budget)
@@ -0,0 +1,378 @@
+# scripts/regression.py
+"""Accuracy and latency regression harness for the 20 benchmark questions.
+
+Each question is paired with gold SQL. A run answers every question through the
+pipeline (fast path or LLM SQL → execution → narration), executes the gold SQL
+on the same database and compares the result sets order-insensitively. Gold
+columns must appear among the generated ones (extra columns, column names and
+duplicate rows are ignored; numbers are compared to two decimals).
+
+The database is an in-memory replica of the populate_data.py fixture employees,
+so results are known and stable; --mysql uses the configured MySQL database
+instead, which must hold the default `populate_data.py` data.
+
+Per-question latency, token usage and row counts are recorded and the run is
+diffed against a stored baseline. Lost matches, accuracy drops and latency or
+token growth beyond the thresholds fail the run (exit status 1).
+
+    python regression.py --offline --update-baseline   # record a baseline
+    python regression.py --offline                     # compare against it
+    python regression.py --latency-tolerance 0.5 --token-tolerance 0.05
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from benchmark import UsageMeter, summarize_latencies
+from fast_path import FastPath, IntentMatch, load_known_values, run_match as pooled_run_match
+import llm_integration
+from llm_integration import (
+    BENCHMARK_QUERIES,
+    BENCHMARK_SCHEMA,
+    _results_to_natural_language,
+    execute_guarded,
+    query_to_sql,
+)
+
+DEFAULT_BASELINE = Path(__file__).parent / "regression_baseline.json"
+STAGES = ("sql_generation", "execution", "narration", "total")
+
+# Gold SQL over the wide `activities` table, in BENCHMARK_QUERIES order.
+# Interpretations: week 7 starts 2024-08-28, so the first week of September is
+# week 8; the industry recession is 2020-2021; ties for "most" keep every tied row.
+GOLD_SQL = [
+    "SELECT DISTINCT email FROM activities WHERE job_title = 'Sales Manager'",
+    "SELECT DISTINCT full_name FROM activities WHERE department = 'Product Development'",
+    "SELECT total_sales_rmb FROM activities WHERE full_name = 'Wei Zhang' AND week_number = 7",
+    "SELECT DISTINCT full_name FROM activities WHERE department = 'Finance'",
+    "SELECT SUM(num_meetings) AS meetings FROM activities WHERE full_name = 'Na Li'",
+    "SELECT DISTINCT full_name FROM activities WHERE week_number = 1 AND hours_worked > 40",
+    "SELECT COUNT(DISTINCT employee_id) AS employees FROM activities",
+    "SELECT AVG(hours_worked) AS avg_hours FROM activities WHERE week_number = 2",
+    "SELECT SUM(total_sales_rmb) AS total_sales FROM activities WHERE department = 'Sales'",
+    "SELECT SUM(total_sales_rmb) AS total_sales FROM activities WHERE week_number = 1",
+    "SELECT full_name FROM activities WHERE week_number = 8 "
+    "AND hours_worked = (SELECT MAX(hours_worked) FROM activities WHERE week_number = 8)",
+    "SELECT full_name FROM activities WHERE week_number = 2 "
+    "AND num_meetings = (SELECT MAX(num_meetings) FROM activities WHERE week_number = 2)",
+    "SELECT DISTINCT full_name FROM activities WHERE YEAR(hire_date) BETWEEN 2020 AND 2021",
+    "SELECT DISTINCT full_name, activities FROM activities WHERE activities LIKE '%retention%'",
+    "SELECT DISTINCT full_name FROM activities "
+    "WHERE job_title LIKE '%analyst%' OR job_title LIKE '%data%' OR job_title LIKE '%report%'",
+    "SELECT DISTINCT full_name FROM activities WHERE department = 'IT'",
+    "SELECT full_name, hours_worked FROM activities "
+    "WHERE full_name IN ('Wei Zhang', 'Tao Huang') AND week_number = 1",
+    "SELECT full_name, SUM(hours_worked) AS total_hours FROM activities "
+    "WHERE week_number > (SELECT MAX(week_number) - 4 FROM activities) "
+    "GROUP BY employee_id, full_name ORDER BY total_hours DESC LIMIT 3",
+    "SELECT full_name, week_number, total_sales_rmb FROM activities "
+    "WHERE total_sales_rmb = (SELECT MAX(total_sales_rmb) FROM activities)",
+    "SELECT SUM(hours_worked) AS total_hours, AVG(total_sales_rmb) AS avg_sales "
+    "FROM activities WHERE department = 'Business Development'",
+]
+GOLD = dict(zip(BENCHMARK_QUERIES, GOLD_SQL))
+
+
+class Thresholds(NamedTuple):
+    max_accuracy_drop: float = 0.0  # fraction of questions
+    latency_tolerance: float = 0.25  # relative growth of a stage's p50/p95
+    latency_floor_ms: float = 20.0  # ... that also exceeds this many ms
+    token_tolerance: float = 0.10  # relative growth of total tokens
+
+
+# Result comparison ====================================================
+def _normalize(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float, Decimal)):
+        return round(float(value), 2)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    return str(value).strip().casefold()
+
+
+def compare_results(gold_rows: List[Dict[str, Any]], rows: List[Dict[str, Any]]) -> Tuple[bool, str]:
+    """
+    (match, detail): the distinct gold rows must equal the distinct generated rows
+    projected onto some assignment of generated columns to the gold columns
+    """
+    gold = {tuple(_normalize(v) for v in r.values()) for r in gold_rows}
+    if not gold:
+        return (not rows), "both empty" if not rows else f"expected no rows, got {len(rows)}"
+    if not rows:
+        return False, f"expected {len(gold)} rows, got none"
+
+    gold_columns = list(gold_rows[0])
+    columns = list(rows[0])
+    generated = [{c: _normalize(r.get(c)) for c in columns} for r in rows]
+    # Candidate generated columns per gold column: same set of values
+    candidates = []
+    for i, name in enumerate(gold_columns):
+        values = {g[i] for g in gold}
+        matching = [c for c in columns if {r[c] for r in generated} == values]
+        if not matching:
+            return False, f"no column matches gold column {name}"
+        candidates.append(matching)
+
+    for assignment in itertools.product(*candidates):
+        if len(set(assignment)) < len(assignment):
+            continue
+        if {tuple(r[c] for c in assignment) for r in generated} == gold:
+            return True, "match"
+    return False, f"expected {len(gold)} distinct rows, got {len({tuple(r.values()) for r in generated})}"
+
+
+# Running ==============================================================
+def _run_case(
+    query_id: int,
+    query: str,
+    schema: Optional[str],
+    execute: Callable[[str], List[Dict[str, Any]]],
+    llm_client: Any,
+    fast_path: Optional[FastPath],
+    run_match: Callable[[IntentMatch], List[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """Answer one question, then check its rows against the gold SQL"""
+    meter = UsageMeter(llm_client or llm_integration.get_client())
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    served_by, sql, rows, error = "llm", None, [], None
+
+    local = fast_path.answer(query, run=run_match) if fast_path else None
+    if local:
+        served_by, sql, rows = f"fast_path:{local.intent}", local.sql, local.rows
+    else:
+        sql = query_to_sql(query, schema, llm_client=meter, use_cache=False)
+        timings["sql_generation"] = time.perf_counter() - start
+        if sql:
+            t0 = time.perf_counter()
+            try:
+                rows = execute(sql)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            timings["execution"] = time.perf_counter() - t0
+            if not error:
+                t0 = time.perf_counter()
+                _results_to_natural_language(query, rows, "auto", llm_client=meter, use_cache=False)
+                timings["narration"] = time.perf_counter() - t0
+    timings["total"] = time.perf_counter() - start
+
+    gold_rows = execute(GOLD[query])
+    if not sql:
+        status, detail = "no_sql", "no valid SQL generated"
+    elif error:
+        status, detail = "error", error
+    else:
+        matched, detail = compare_results(gold_rows, rows)
+        status = "match" if matched else "mismatch"
+    return {
+        "query_id": query_id,
+        "query": query,
+        "served_by": served_by,
+        "sql": sql,
+        "status": status,
+        "detail": detail,
+        "rows": len(rows),
+        "gold_rows": len(gold_rows),
+        "latency_ms": {k: round(v * 1000, 2) for k, v in timings.items()},
+        "tokens": meter.totals(),
+    }
+
+
+def run_suite(
+    schema: Optional[str],
+    execute: Callable[[str], List[Dict[str, Any]]],
+    llm_client: Any = None,
+    fast_path: Optional[FastPath] = None,
+    run_match: Optional[Callable[[IntentMatch], List[Dict[str, Any]]]] = None,
+    concurrency: int = 1,
+    queries: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Run every benchmark question (default: sequentially, for stable latencies)"""
+    queries = queries or BENCHMARK_QUERIES
+    run_match = run_match or pooled_run_match
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [
+            pool.submit(_run_case, i, q, schema, execute, llm_client, fast_path, run_match)
+            for i, q in enumerate(queries, 1)
+        ]
+        results = [f.result() for f in futures]
+
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    tokens = {
+        key: sum(r["tokens"][key] for r in results)
+        for key in ("llm_calls", "prompt_tokens", "completion_tokens", "cached_prompt_tokens")
+    }
+    summary = {
+        "queries": len(results),
+        "correct": statuses.get("match", 0),
+        "accuracy": round(statuses.get("match", 0) / len(results), 4) if results else 0.0,
+        "statuses": statuses,
+        "stages": {
+            stage: summarize_latencies(
+                [r["latency_ms"][stage] / 1000 for r in results if stage in r["latency_ms"]]
+            )
+            for stage in STAGES
+        },
+        "tokens": tokens,
+    }
+    return {"summary": summary, "results": results}
+
+
+# Baseline diff ========================================================
+def _grew(now: float, before: float, tolerance: float, floor: float = 0.0) -> bool:
+    return now > before * (1 + tolerance) and now - before > floor
+
+
+def diff_reports(
+    report: Dict[str, Any], baseline: Dict[str, Any], thresholds: Thresholds = Thresholds()
+) -> Tuple[List[str], List[str]]:
+    """(failures, notes) of a run compared with a baseline run"""
+    failures: List[str] = []
+    notes: List[str] = []
+    before = {r["query"]: r for r in baseline["results"]}
+
+    for r in report["results"]:
+        old = before.get(r["query"])
+        if old is None:
+            notes.append(f"Q{r['query_id']} is new ({r['status']})")
+            continue
+        if old["status"] == "match" and r["status"] != "match":
+            failures.append(f"Q{r['query_id']} regressed: match → {r['status']} ({r['detail']})")
+        elif old["status"] != "match" and r["status"] == "match":
+            notes.append(f"Q{r['query_id']} fixed: {old['status']} → match")
+        if r["rows"] != old["rows"]:
+            notes.append(f"Q{r['query_id']} row count {old['rows']} → {r['rows']}")
+        if r["served_by"] != old["served_by"]:
+            notes.append(f"Q{r['query_id']} served by {old['served_by']} → {r['served_by']}")
+        old_tokens = old["tokens"]["prompt_tokens"] + old["tokens"]["completion_tokens"]
+        new_tokens = r["tokens"]["prompt_tokens"] + r["tokens"]["completion_tokens"]
+        if _grew(new_tokens, old_tokens, thresholds.token_tolerance):
+            notes.append(f"Q{r['query_id']} tokens {old_tokens} → {new_tokens}")
+
+    now, then = report["summary"], baseline["summary"]
+    if then["accuracy"] - now["accuracy"] > thresholds.max_accuracy_drop:
+        failures.append(f"accuracy dropped {then['accuracy']:.0%} → {now['accuracy']:.0%}")
+
+    for stage in STAGES:
+        for pct in ("p50_ms", "p95_ms"):
+            a, b = then["stages"][stage][pct], now["stages"][stage][pct]
+            if _grew(b, a, thresholds.latency_tolerance, thresholds.latency_floor_ms):
+                failures.append(f"{stage} {pct[:3]} latency {a}ms → {b}ms")
+
+    old_total = then["tokens"]["prompt_tokens"] + then["tokens"]["completion_tokens"]
+    new_total = now["tokens"]["prompt_tokens"] + now["tokens"]["completion_tokens"]
+    if _grew(new_total, old_total, thresholds.token_tolerance):
+        failures.append(f"total tokens {old_total} → {new_total}")
+    if now["tokens"]["llm_calls"] > then["tokens"]["llm_calls"]:
+        notes.append(f"LLM calls {then['tokens']['llm_calls']} → {now['tokens']['llm_calls']}")
+    return failures, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy/latency regression check for the benchmark questions")
+    parser.add_argument("--offline", action="store_true", help="Use the local fake LLM")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency (s)")
+    parser.add_argument(
+        "--mysql", action="store_true",
+        help="Execute on MySQL (seeded by populate_data.py) instead of an in-memory fixture replica",
+    )
+    parser.add_argument("--no-fast-path", action="store_true", help="Send every question to the LLM")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--update-baseline", action="store_true", help="Save this run as the baseline")
+    parser.add_argument("--output", default="regression_results.json")
+    defaults = Thresholds()
+    parser.add_argument("--max-accuracy-drop", type=float, default=defaults.max_accuracy_drop)
+    parser.add_argument("--latency-tolerance", type=float, default=defaults.latency_tolerance)
+    parser.add_argument("--latency-floor-ms", type=float, default=defaults.latency_floor_ms)
+    parser.add_argument("--token-tolerance", type=float, default=defaults.token_tolerance)
+    args = parser.parse_args()
+
+    llm_client = None
+    if args.offline:
+        from fake_llm import FakeLLMClient
+
+        llm_client = FakeLLMClient(latency=args.llm_latency, jitter=args.llm_latency / 2)
+
+    if args.mysql:
+        from db import get_connection
+
+        run_match = pooled_run_match
+        execute = lambda sql: execute_guarded(sql, use_cache=False).rows  # noqa: E731
+        schema = None  # introspected, as in production
+        with get_connection() as conn:
+            known = load_known_values(conn)
+    else:
+        from replica import fixture_replica
+        from stats_engine import fixture_stats, set_stats
+
+        replica = fixture_replica()
+        set_stats(fixture_stats())
+        execute = lambda sql: replica.run_guarded(sql).rows  # noqa: E731
+        run_match = lambda match: replica.query(match.sql, match.params)  # noqa: E731
+        schema = BENCHMARK_SCHEMA
+        known = load_known_values(replica, "activities")
+    fast_path = None if args.no_fast_path else FastPath(known)
+
+    report = run_suite(schema, execute, llm_client, fast_path, run_match, args.concurrency)
+    summary = report["summary"]
+    for r in report["results"]:
+        mark = "✅" if r["status"] == "match" else "❌"
+        print(
+            f"{mark} Q{r['query_id']:<2} {r['status']:<8} {r['latency_ms']['total']:>8.1f}ms "
+            f"{r['tokens']['prompt_tokens'] + r['tokens']['completion_tokens']:>5} tok "
+            f"{r['rows']:>3}/{r['gold_rows']} rows  {r['served_by']}"
+            + ("" if r["status"] == "match" else f"  ({r['detail']})")
+        )
+    total = summary["stages"]["total"]
+    print(
+        f"\nAccuracy {summary['correct']}/{summary['queries']} ({summary['accuracy']:.0%}), "
+        f"total p50={total['p50_ms']}ms p95={total['p95_ms']}ms, "
+        f"{summary['tokens']['llm_calls']} LLM calls, "
+        f"{summary['tokens']['prompt_tokens']}+{summary['tokens']['completion_tokens']} tokens "
+        f"({summary['tokens']['cached_prompt_tokens']} prompt tokens cached)"
+    )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        print(f"Baseline saved to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"⚠️ No baseline at {baseline_path}; record one with --update-baseline")
+        return
+
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    thresholds = Thresholds(
+        args.max_accuracy_drop, args.latency_tolerance, args.latency_floor_ms, args.token_tolerance
+    )
+    failures, notes = diff_reports(report, baseline, thresholds)
+    for note in notes:
+        print(f"  • {note}")
+    if failures:
+        print(f"\n❌ {len(failures)} regression(s) against {baseline_path}:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print(f"\n✅ No regressions against {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
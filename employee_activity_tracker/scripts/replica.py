@@ -0,0 +1,537 @@
+# scripts/replica.py
+"""Local read-only replica of `activities` for analytical queries.
+
+Rows are copied from MySQL incrementally by `id` high-water mark into an
+embedded store: DuckDB (columnar) when it is installed, SQLite otherwise.
+Generated SQL, fast-path templates and dashboard aggregates can then run
+locally instead of on the primary that takes the writes:
+
+    QUERY_BACKEND=replica     route read-only SQL to the replica (default: mysql)
+    REPLICA_ENGINE            auto (default), duckdb or sqlite
+    REPLICA_PATH              store file (default scripts/.cache/replica.<engine>)
+    REPLICA_SYNC_TTL          seconds between incremental syncs (default 60)
+
+MySQL-isms the SQL prompt produces are translated (see to_replica_sql):
+YEAR()/MONTH()/DAY()/DATE(), CONCAT, CURDATE()/NOW(), `LIMIT offset, n`,
+backtick identifiers, MATCH ... AGAINST (as LIKE terms) and MySQL's
+case-insensitive comparisons and decimal division.
+
+Only appended rows are picked up incrementally. Deleted rows are detected and
+trigger a full re-copy, as do rows updated in place by writers that call
+result_cache.bump_rewrite_version (ingest.py, populate_data.py); other manual
+edits need `--full`.
+
+    python replica.py                  # incremental sync from MySQL
+    python replica.py --full           # re-copy everything
+    python replica.py --fixture        # build from the populate_data.py fixture, no MySQL
+    python replica.py --sql "SELECT department, COUNT(*) FROM activities GROUP BY department"
+"""
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cost_guard import GuardedResult, MAX_EXECUTION_MS, MAX_RESULT_ROWS, cap_rows
+from result_cache import read_table_version, rewrites_key
+import telemetry
+
+try:
+    import duckdb
+except ImportError:  # SQLite fallback
+    duckdb = None
+
+QUERY_BACKEND = os.getenv("QUERY_BACKEND", "mysql").lower()
+REPLICA_ENGINE = os.getenv("REPLICA_ENGINE", "auto").lower()
+REPLICA_SYNC_TTL = float(os.getenv("REPLICA_SYNC_TTL", 60))
+REPLICA_SYNC_BATCH = int(os.getenv("REPLICA_SYNC_BATCH", 5000))
+DEFAULT_REPLICA_DIR = Path(__file__).parent / ".cache"
+REWRITES_KEY = rewrites_key("activities")
+
+# (column, DuckDB type, SQLite type); mirrors the MySQL activities table
+COLUMNS = (
+    ("id", "INTEGER", "INTEGER"),
+    ("employee_id", "VARCHAR", "TEXT COLLATE NOCASE"),
+    ("full_name", "VARCHAR", "TEXT COLLATE NOCASE"),
+    ("week_number", "INTEGER", "INTEGER"),
+    ("num_meetings", "INTEGER", "INTEGER"),
+    ("total_sales_rmb", "DOUBLE", "REAL"),
+    ("hours_worked", "DOUBLE", "REAL"),
+    ("activities", "VARCHAR", "TEXT COLLATE NOCASE"),
+    ("department", "VARCHAR", "TEXT COLLATE NOCASE"),
+    ("hire_date", "DATE", "DATE"),
+    ("email", "VARCHAR", "TEXT COLLATE NOCASE"),
+    ("job_title", "VARCHAR", "TEXT COLLATE NOCASE"),
+)
+COLUMN_NAMES = tuple(name for name, _, _ in COLUMNS)
+
+
+def resolve_engine(engine: str = REPLICA_ENGINE) -> str:
+    if engine == "auto":
+        return "duckdb" if duckdb is not None else "sqlite"
+    if engine == "duckdb" and duckdb is None:
+        raise ImportError("REPLICA_ENGINE=duckdb but the duckdb package is not installed")
+    if engine not in ("duckdb", "sqlite"):
+        raise ValueError(f"unknown replica engine: {engine}")
+    return engine
+
+
+# Dialect shim =========================================================
+# String literals and comments (optimizer hints included) are never rewritten as code
+_LITERAL_OR_COMMENT_RE = re.compile(
+    r"(?P<literal>'(?:[^'\\]|\\.|'')*')|(?P<comment>/\*.*?\*/|--(?=\s|$)[^\n]*|#[^\n]*)",
+    re.DOTALL,
+)
+_MATCH_RE = re.compile(
+    r"MATCH\s*\(([^)]*)\)\s*AGAINST\s*\(\s*'((?:[^'\\]|\\.)*)'"
+    r"(?:\s+IN\s+(?:NATURAL\s+LANGUAGE|BOOLEAN)\s+MODE)?(?:\s+WITH\s+QUERY\s+EXPANSION)?\s*\)",
+    re.IGNORECASE,
+)
+_LIMIT_OFFSET_RE = re.compile(r"\bLIMIT\s+(\d+)\s*,\s*(\d+)", re.IGNORECASE)
+_FUNCTION_RENAMES = (
+    (re.compile(r"\bCURDATE\s*\(\s*\)", re.IGNORECASE), "CURRENT_DATE"),
+    (re.compile(r"\bNOW\s*\(\s*\)", re.IGNORECASE), "CURRENT_TIMESTAMP"),
+)
+_LIKE_RE = re.compile(r"\bLIKE\b", re.IGNORECASE)
+
+
+def _match_to_like(match: "re.Match[str]") -> str:
+    """MATCH(cols) AGAINST('a* b') → any column containing any term (no relevance ranking)"""
+    columns = [c.strip() for c in match.group(1).split(",") if c.strip()]
+    terms = [
+        t.strip('+<>()~*"').replace("'", "''")
+        for t in match.group(2).replace("\\'", "'").split()
+        if not t.startswith("-")
+    ]
+    clauses = [f"{c} LIKE '%{t}%'" for c in columns for t in terms if t]
+    return "(" + " OR ".join(clauses) + ")" if clauses else "(1 = 0)"
+
+
+def match_to_like(sql: str) -> str:
+    """Rewrite every MATCH ... AGAINST in `sql` as LIKE terms"""
+    return _MATCH_RE.sub(_match_to_like, sql)
+
+
+def _translate_code(code: str, engine: str, has_params: bool) -> str:
+    """Rewrite one stretch of SQL outside string literals"""
+    code = code.replace("`", '"')
+    code = _LIMIT_OFFSET_RE.sub(r"LIMIT \2 OFFSET \1", code)
+    for pattern, replacement in _FUNCTION_RENAMES:
+        code = pattern.sub(replacement, code)
+    if engine == "duckdb":
+        # MySQL's default collation makes LIKE case-insensitive
+        code = _LIKE_RE.sub("ILIKE", code)
+    else:
+        # MySQL `/` never truncates; SQLite integer division does
+        code = code.replace("/", "* 1.0 /")
+    if has_params:
+        code = code.replace("%s", "?").replace("%%", "%")
+    return code
+
+
+def to_replica_sql(sql: str, engine: str, has_params: bool = False) -> str:
+    """Translate a MySQL SELECT (pymysql `%s` placeholders when has_params) for the replica engine"""
+    sql = match_to_like(sql)
+    parts: List[str] = []
+    position = 0
+    for token in _LITERAL_OR_COMMENT_RE.finditer(sql):
+        parts.append(_translate_code(sql[position : token.start()], engine, has_params))
+        if token.lastgroup == "literal":
+            # MySQL backslash escapes → standard doubled quotes
+            parts.append(token.group(0)[1:-1].replace("\\'", "''").join("''"))
+        else:
+            parts.append(" ")  # comments, MySQL hints included, are dropped
+        position = token.end()
+    parts.append(_translate_code(sql[position:], engine, has_params))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def _sqlite_year(value: Any) -> Optional[int]:
+    return int(str(value)[:4]) if value else None
+
+
+def _sqlite_month(value: Any) -> Optional[int]:
+    return int(str(value)[5:7]) if value else None
+
+
+def _sqlite_day(value: Any) -> Optional[int]:
+    return int(str(value)[8:10]) if value else None
+
+
+def _sqlite_concat(*values: Any) -> Optional[str]:
+    return None if any(v is None for v in values) else "".join(str(v) for v in values)
+
+
+def _sqlite_datediff(a: Any, b: Any) -> Optional[int]:
+    if not a or not b:
+        return None
+    return (date.fromisoformat(str(a)[:10]) - date.fromisoformat(str(b)[:10])).days
+
+
+# Replica ==============================================================
+def _cell(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class ReplicaCursor:
+    """Minimal pymysql DictCursor look-alike so existing helpers can read the replica"""
+
+    def __init__(self, replica: "Replica"):
+        self._replica = replica
+        self._rows: List[Dict[str, Any]] = []
+        self._position = 0
+        self.rowcount = -1
+
+    def __enter__(self) -> "ReplicaCursor":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> int:
+        self._rows = self._replica.query(sql, params)
+        self._position = 0
+        self.rowcount = len(self._rows)
+        return self.rowcount
+
+    def fetchone(self) -> Optional[Dict[str, Any]]:
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    def fetchmany(self, size: int = 1) -> List[Dict[str, Any]]:
+        rows = self._rows[self._position : self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        rows = self._rows[self._position :]
+        self._position = len(self._rows)
+        return rows
+
+    def close(self) -> None:
+        self._rows = []
+
+
+class Replica:
+    """Embedded copy of `activities` with a translated, read-only query interface"""
+
+    def __init__(self, path: Any = None, engine: str = REPLICA_ENGINE):
+        self.engine = resolve_engine(engine)
+        self.path = str(path or DEFAULT_REPLICA_DIR / f"replica.{self.engine}")
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.last_sync = 0.0
+        self._lock = threading.RLock()
+        if self.engine == "duckdb":
+            self._conn = duckdb.connect(self.path)
+            self._conn.execute("PRAGMA default_collation = 'nocase'")
+        else:
+            self._conn = sqlite3.connect(
+                self.path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+            )
+            for name, fn, args in (
+                ("YEAR", _sqlite_year, 1),
+                ("MONTH", _sqlite_month, 1),
+                ("DAY", _sqlite_day, 1),
+                ("CONCAT", _sqlite_concat, -1),
+                ("DATEDIFF", _sqlite_datediff, 2),
+            ):
+                self._conn.create_function(name, args, fn, deterministic=True)
+        self._create_tables()
+
+    # Storage ------------------------------------------------------------
+    def _create_tables(self) -> None:
+        index = 1 if self.engine == "duckdb" else 2
+        columns = ",\n".join(f"{col[0]} {col[index]}" for col in COLUMNS)
+        with self._lock:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS activities (\n{columns}\n)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS replica_state ("
+                "source_table VARCHAR PRIMARY KEY, high_water BIGINT, synced_at DOUBLE)"
+            )
+            if self.engine == "sqlite":
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_replica_week_dept ON activities (week_number, department)"
+                )
+                self._conn.commit()
+
+    def reset(self) -> None:
+        """Drop the copied rows and the high-water mark"""
+        with self._lock:
+            self._conn.execute("DROP TABLE IF EXISTS activities")
+            self._conn.execute("DELETE FROM replica_state")
+            if self.engine == "sqlite":
+                self._conn.commit()
+        self._create_tables()
+
+    def high_water(self) -> int:
+        rows = self._execute("SELECT high_water FROM replica_state WHERE source_table = 'activities'")
+        return int(rows[0][0]) if rows else 0
+
+    def row_count(self) -> int:
+        return int(self._execute("SELECT COUNT(*) FROM activities")[0][0])
+
+    def rewrites(self) -> int:
+        """Source in-place-update counter (result_cache.bump_rewrite_version) as of the last sync"""
+        rows = self._execute(f"SELECT high_water FROM replica_state WHERE source_table = '{REWRITES_KEY}'")
+        return int(rows[0][0]) if rows else 0
+
+    def _set_rewrites(self, rewrites: int) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM replica_state WHERE source_table = '{REWRITES_KEY}'")
+            self._conn.execute(
+                "INSERT INTO replica_state VALUES (?, ?, ?)", [REWRITES_KEY, rewrites, time.time()]
+            )
+            if self.engine == "sqlite":
+                self._conn.commit()
+
+    def version(self) -> str:
+        """Changes whenever synced data changes (result-cache key)"""
+        return f"replica:{self.high_water()}:{self.row_count()}:{self.rewrites()}"
+
+    def _append(self, rows: List[Tuple[Any, ...]], high_water: int) -> None:
+        """Insert full-width rows and advance the high-water mark in one step"""
+        with self._lock:
+            if self.engine == "duckdb":
+                # Row-at-a-time inserts are slow in DuckDB; bulk-load through a CSV file
+                with tempfile.NamedTemporaryFile(
+                    "w", suffix=".csv", delete=False, newline="", encoding="utf-8"
+                ) as f:
+                    csv.writer(f).writerows(rows)
+                try:
+                    self._conn.execute("BEGIN TRANSACTION")
+                    self._conn.execute(
+                        f"COPY activities FROM '{f.name}' (HEADER false, NULLSTR '')"
+                    )
+                    self._set_high_water(high_water)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                finally:
+                    os.unlink(f.name)
+            else:
+                placeholders = ", ".join("?" * len(COLUMNS))
+                with self._conn:  # one transaction
+                    self._conn.executemany(f"INSERT INTO activities VALUES ({placeholders})", rows)
+                    self._set_high_water(high_water)
+
+    def _set_high_water(self, high_water: int) -> None:
+        self._conn.execute("DELETE FROM replica_state WHERE source_table = 'activities'")
+        self._conn.execute(
+            "INSERT INTO replica_state VALUES ('activities', ?, ?)", [high_water, time.time()]
+        )
+
+    def load_rows(self, rows: Iterable[Sequence[Any]], batch_size: int = REPLICA_SYNC_BATCH) -> int:
+        """
+        Append rows without an id (populate_data.ACTIVITY_COLUMNS order), numbering
+        them after the current high-water mark; used to build an offline replica
+        """
+        next_id = self.high_water()
+        loaded = 0
+        batch: List[Tuple[Any, ...]] = []
+        for row in rows:
+            next_id += 1
+            batch.append((next_id, *(_cell(v) for v in row)))
+            if len(batch) >= batch_size:
+                self._append(batch, next_id)
+                loaded += len(batch)
+                batch = []
+        if batch:
+            self._append(batch, next_id)
+            loaded += len(batch)
+        return loaded
+
+    def sync(self, source, batch_size: int = REPLICA_SYNC_BATCH, full: bool = False) -> int:
+        """
+        Copy rows with id above the high-water mark from a MySQL connection.
+        Re-copies everything when asked to, when rows at or below the mark
+        were deleted (e.g. `populate_data.py --reset`) or when a writer updated
+        rows in place since the last sync (its rewrite counter moved). Returns
+        rows copied.
+        """
+        with telemetry.span("replica_sync") as span:
+            select = f"SELECT {', '.join(COLUMN_NAMES)} FROM activities WHERE id > %s ORDER BY id LIMIT %s"
+            with source.cursor() as cursor:
+                rewrites = read_table_version(cursor, REWRITES_KEY)
+                if full or rewrites != self.rewrites():
+                    span.set(full=True)
+                    self.reset()
+                copied = 0
+                for attempt in range(2):
+                    high_water = self.high_water()
+                    while True:
+                        cursor.execute(select, (high_water, batch_size))
+                        rows = cursor.fetchall()
+                        if not rows:
+                            break
+                        high_water = rows[-1]["id"]
+                        self._append([tuple(_cell(r[c]) for c in COLUMN_NAMES) for r in rows], high_water)
+                        copied += len(rows)
+                    cursor.execute("SELECT COUNT(*) AS n FROM activities WHERE id <= %s", (high_water,))
+                    if cursor.fetchone()["n"] == self.row_count() or attempt:
+                        break
+                    # Source rows disappeared below the mark: start over
+                    self.reset()
+                self._set_rewrites(rewrites)
+            source.commit()  # end the read snapshot so the next sync sees new rows
+            self.last_sync = time.time()
+            span.set(rows=copied, high_water=high_water)
+        return copied
+
+    # Queries ------------------------------------------------------------
+    def _execute(
+        self, sql: str, params: Optional[Sequence[Any]] = None, max_rows: Optional[int] = None
+    ) -> List[Tuple[Any, ...]]:
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute(sql, list(params) if params is not None else [])
+                self._description = cursor.description
+                if max_rows is None:
+                    return list(cursor.fetchall())
+                return list(cursor.fetchmany(max_rows))
+            finally:
+                cursor.close()
+
+    def _columns(self) -> List[str]:
+        return [d[0] for d in self._description or ()]
+
+    def query(self, sql: str, params: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """Run a MySQL-dialect SELECT (optionally with pymysql `%s` params); rows as dicts"""
+        translated = to_replica_sql(sql, self.engine, params is not None)
+        with self._lock:
+            rows = self._execute(translated, params)
+            columns = self._columns()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def run_guarded(
+        self, sql: str, max_rows: int = MAX_RESULT_ROWS, timeout_ms: int = MAX_EXECUTION_MS
+    ) -> GuardedResult:
+        """
+        Replica counterpart of cost_guard.run_guarded: row cap and time limit,
+        no EXPLAIN admission (a local scan does not load the primary)
+        """
+        executed_sql = to_replica_sql(cap_rows(sql, max_rows), self.engine)
+        timer = threading.Timer(timeout_ms / 1000, self._conn.interrupt)
+        with telemetry.span("replica_execute") as span, self._lock:
+            timer.start()
+            try:
+                rows = self._execute(executed_sql, max_rows=max_rows + 1)
+                columns = self._columns()
+            finally:
+                timer.cancel()
+            span.set(rows=len(rows))
+        records = [dict(zip(columns, row)) for row in rows]
+        truncated = len(records) > max_rows
+        return GuardedResult(records[:max_rows], truncated, None, executed_sql)
+
+    def cursor(self) -> ReplicaCursor:
+        return ReplicaCursor(self)
+
+    def commit(self) -> None:
+        """No-op, for code written against a pymysql connection"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "engine": self.engine,
+            "path": self.path,
+            "rows": self.row_count(),
+            "high_water": self.high_water(),
+            "last_sync": self.last_sync or None,
+        }
+
+
+def fixture_replica(weeks: int = 10, seed: int = 42) -> Replica:
+    """In-memory replica of the populate_data.py fixture employees (offline runs)"""
+    from populate_data import fixture_rows
+
+    replica = Replica(":memory:")
+    replica.load_rows(fixture_rows(weeks, seed))
+    return replica
+
+
+_default: Optional[Replica] = None
+_default_lock = threading.Lock()
+
+
+def get_replica(enabled: Optional[bool] = None) -> Optional[Replica]:
+    """
+    Process-wide replica when QUERY_BACKEND=replica or `enabled` (else None),
+    synced from MySQL at most every REPLICA_SYNC_TTL seconds. A failed sync
+    keeps serving the existing copy, so queries keep working while MySQL is
+    unreachable.
+    """
+    global _default
+    if not (QUERY_BACKEND == "replica" if enabled is None else enabled):
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = Replica(os.getenv("REPLICA_PATH"))
+        if time.time() - _default.last_sync >= REPLICA_SYNC_TTL:
+            _default.last_sync = time.time()  # failed syncs also wait a full TTL
+            try:
+                from db import get_connection
+
+                with get_connection() as conn:
+                    _default.sync(conn)
+            except Exception as e:
+                print(f"⚠️ Replica sync failed, serving the existing copy: {e}")
+        return _default
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync or query the local activities replica")
+    parser.add_argument("--path", default=os.getenv("REPLICA_PATH"))
+    parser.add_argument("--engine", default=REPLICA_ENGINE, choices=["auto", "duckdb", "sqlite"])
+    parser.add_argument("--full", action="store_true", help="Drop the copy and re-sync everything")
+    parser.add_argument("--fixture", action="store_true", help="Rebuild from the fixture rows, no MySQL")
+    parser.add_argument("--batch-size", type=int, default=REPLICA_SYNC_BATCH)
+    parser.add_argument("--sql", help="Run a (MySQL-dialect) SELECT on the replica and print the rows")
+    args = parser.parse_args()
+
+    replica = Replica(args.path, args.engine)
+    if args.sql:
+        start = time.perf_counter()
+        result = replica.run_guarded(args.sql)
+        for row in result.rows:
+            print(row)
+        print(f"{len(result.rows)} rows in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return
+
+    start = time.perf_counter()
+    if args.fixture:
+        from populate_data import fixture_rows
+
+        replica.reset()
+        copied = replica.load_rows(fixture_rows())
+    else:
+        from db import get_connection
+
+        with get_connection() as conn:
+            copied = replica.sync(conn, args.batch_size, full=args.full)
+    stats = replica.stats()
+    print(
+        f"✅ Copied {copied} rows in {time.perf_counter() - start:.2f}s; "
+        f"{stats['engine']} replica at {stats['path']} holds {stats['rows']} rows "
+        f"(high-water id {stats['high_water']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# scripts/result_cache.py
+"""Two-level result cache for `query_to_natural_language`.
+
+Level 1: generated SQL → rows (as returned by the cost guard), held in memory
+and tagged with the version of the `activities` table they were read from.
+Level 2: (question, rows digest, analysis_type) → narrated answer, persisted
+in SQLite. A changed table produces different rows and therefore a different
+digest, so stale answers are never served.
+
+The table version is a cheap probe (row count, max(id) and a `table_versions`
+counter bumped by writers), memoised for `probe_ttl` seconds.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sql_cache import normalize_question
+
+DEFAULT_CACHE_PATH = Path(__file__).parent / ".cache" / "result_cache.sqlite3"
+
+VERSION_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+)
+"""
+
+
+def ensure_version_table(cursor) -> None:
+    cursor.execute(VERSION_TABLE_DDL)
+
+
+def bump_table_version(cursor, table: str = "activities") -> None:
+    """Writers call this after changing `table` so readers drop cached rows"""
+    ensure_version_table(cursor)
+    cursor.execute(
+        "INSERT INTO table_versions (table_name, version) VALUES (%s, 1) "
+        "ON DUPLICATE KEY UPDATE version = version + 1",
+        (table,),
+    )
+
+
+def rewrites_key(table: str = "activities") -> str:
+    """table_versions row counting in-place updates of `table`"""
+    return f"{table}:rewrites"
+
+
+def bump_rewrite_version(cursor, table: str = "activities") -> None:
+    """
+    Writers call this (besides bump_table_version) after updating rows of
+    `table` in place, which copies synced by id high-water mark cannot see
+    """
+    bump_table_version(cursor, rewrites_key(table))
+
+
+def read_table_version(cursor, name: str) -> int:
+    """Current writer counter for `name` (0 when never bumped or no version table)"""
+    try:
+        cursor.execute(
+            "SELECT COALESCE(MAX(version), 0) AS v FROM table_versions WHERE table_name = %s",
+            (name,),
+        )
+    except Exception:
+        return 0
+    row = cursor.fetchone()
+    return int(row["v"] if isinstance(row, dict) else row[0])
+
+
+def probe_table_version(conn, table: str = "activities") -> str:
+    """One round-trip version string: row count, max(id) and writer counter"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT (SELECT COUNT(*) FROM {table}), (SELECT COALESCE(MAX(id), 0) FROM {table}), "
+            "(SELECT COALESCE(MAX(version), 0) FROM table_versions WHERE table_name = %s)",
+            (table,),
+        )
+    except Exception:
+        # No version table yet: fall back to the count/max(id) probe
+        cursor.execute(f"SELECT COUNT(*), COALESCE(MAX(id), 0), 0 FROM {table}")
+    row = cursor.fetchone()
+    values = row.values() if isinstance(row, dict) else row
+    return ":".join(str(v) for v in values)
+
+
+def rows_digest(rows: List[Dict[str, Any]]) -> str:
+    payload = json.dumps(rows, default=str, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _sql_key(sql: str) -> str:
+    return " ".join(sql.strip().rstrip(";").split())
+
+
+class ResultCache:
+    """In-memory SQL → rows cache plus persistent narrated-answer cache"""
+
+    def __init__(
+        self,
+        version_probe: Callable[[], Optional[str]],
+        path: Any = DEFAULT_CACHE_PATH,
+        max_row_sets: int = 256,
+        max_answers: int = 5000,
+        probe_ttl: float = 2.0,
+    ):
+        self.version_probe = version_probe
+        self.max_row_sets = max_row_sets
+        self.max_answers = max_answers
+        self.probe_ttl = probe_ttl
+        self.row_hits = 0
+        self.row_misses = 0
+        self.answer_hits = 0
+        self.answer_misses = 0
+        self._rows: "OrderedDict[str, Tuple[str, Any]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._version_checked = 0.0
+        self._lock = threading.Lock()
+
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def table_version(self) -> Optional[str]:
+        """Current table version, re-probed at most every `probe_ttl` seconds"""
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked < self.probe_ttl:
+                return self._version
+        try:
+            version = self.version_probe()
+        except Exception as e:
+            print(f"⚠️ Table version probe failed: {e}")
+            version = None
+        with self._lock:
+            if version != self._version:
+                self._rows.clear()
+            self._version, self._version_checked = version, now
+        return version
+
+    def invalidate(self) -> None:
+        """Force a fresh version probe and drop all cached row sets"""
+        with self._lock:
+            self._rows.clear()
+            self._version = None
+
+    def get_rows(self, sql: str) -> Optional[Any]:
+        version = self.table_version()
+        if version is None:
+            return None
+        key = _sql_key(sql)
+        with self._lock:
+            entry = self._rows.get(key)
+            if entry and entry[0] == version:
+                self._rows.move_to_end(key)
+                self.row_hits += 1
+                return entry[1]
+            self.row_misses += 1
+            return None
+
+    def put_rows(self, sql: str, rows: Any) -> None:
+        version = self.table_version()
+        if version is None:
+            return
+        with self._lock:
+            self._rows[_sql_key(sql)] = (version, rows)
+            self._rows.move_to_end(_sql_key(sql))
+            while len(self._rows) > self.max_row_sets:
+                self._rows.popitem(last=False)
+
+    @staticmethod
+    def answer_key(question: str, digest: str, analysis_type: str) -> str:
+        raw = f"{normalize_question(question)}\x1f{digest}\x1f{analysis_type}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_answer(self, question: str, digest: str, analysis_type: str) -> Optional[str]:
+        key = self.answer_key(question, digest, analysis_type)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM answer_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.answer_misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE answer_cache SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.answer_hits += 1
+            return row[0]
+
+    def put_answer(self, question: str, digest: str, analysis_type: str, answer: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answer_cache (key, answer, created_at, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (self.answer_key(question, digest, analysis_type), answer, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM answer_cache WHERE key IN ("
+                "SELECT key FROM answer_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_answers,),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "table_version": self._version,
+                "row_hits": self.row_hits,
+                "row_misses": self.row_misses,
+                "row_sets": len(self._rows),
+                "answer_hits": self.answer_hits,
+                "answer_misses": self.answer_misses,
+            }
+
+
+_default_cache: Optional[ResultCache] = None
+_default_lock = threading.Lock()
+
+
+def get_result_cache(
+    version_probe: Callable[[], Optional[str]]
+) -> Optional[ResultCache]:
+    """Process-wide cache configured from the environment (RESULT_CACHE=off disables it)"""
+    global _default_cache
+    if os.getenv("RESULT_CACHE", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache(
+                version_probe,
+                path=os.getenv("RESULT_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_row_sets=int(os.getenv("RESULT_CACHE_MAX_ROW_SETS", 256)),
+                max_answers=int(os.getenv("RESULT_CACHE_MAX_ANSWERS", 5000)),
+                probe_ttl=float(os.getenv("RESULT_CACHE_PROBE_TTL", 2.0)),
+            )
+        return _default_cache
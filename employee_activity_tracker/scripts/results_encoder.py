@@ -0,0 +1,112 @@
+# scripts/results_encoder.py
+"""Compact serialization of query results for the narration prompt.
+
+Small result sets are sent as CSV with the header once. Above the token
+budget the rows are replaced by a summary (row count, per-column
+min/max/mean or distinct counts) plus the first `top_k` rows.
+"""
+import csv
+import io
+import math
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, NamedTuple, Optional
+
+RESULTS_TOKEN_BUDGET = int(os.getenv("RESULTS_TOKEN_BUDGET", 1500))
+MAX_CELL_CHARS = 200
+
+
+class EncodedResults(NamedTuple):
+    text: str
+    token_estimate: int
+    row_count: int
+    summarized: bool
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English/CSV text)"""
+    return (len(text) + 3) // 4
+
+
+def _strip_zeros(text: str) -> str:
+    return text if "." not in text else text.rstrip("0").rstrip(".")
+
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, Decimal):
+        return _strip_zeros(format(value.normalize(), "f"))
+    if isinstance(value, float):
+        # Fixed point: replica sums come back as floats and must not turn into 1.23457e+06
+        if not math.isfinite(value):
+            return str(value)
+        text = _strip_zeros(f"{value:.{4 if abs(value) >= 1 else 6}f}")
+        return "0" if text == "-0" else text
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    text = str(value)
+    return text if len(text) <= MAX_CELL_CHARS else text[: MAX_CELL_CHARS - 1] + "…"
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def to_csv(results: List[Dict[str, Any]], max_chars: Optional[int] = None) -> Optional[str]:
+    """Header once, then one line per row; None as soon as `max_chars` is exceeded"""
+    if not results:
+        return ""
+    columns = list(results[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for row in results:
+        writer.writerow([_format_value(row.get(c)) for c in columns])
+        if max_chars is not None and buffer.tell() > max_chars:
+            return None
+    return buffer.getvalue()
+
+
+def column_summary(results: List[Dict[str, Any]]) -> List[str]:
+    """One line per column: min/max/mean for numbers, range or distinct count otherwise"""
+    lines = []
+    for column in results[0].keys():
+        values = [r[column] for r in results if r.get(column) is not None]
+        if values and all(_is_number(v) for v in values):
+            numbers = [float(v) for v in values]
+            lines.append(
+                f"{column}: min={_format_value(min(numbers))}, max={_format_value(max(numbers))}, "
+                f"mean={_format_value(sum(numbers) / len(numbers))}"
+            )
+        elif values and all(isinstance(v, (date, datetime)) for v in values):
+            lines.append(f"{column}: from {min(values).isoformat()} to {max(values).isoformat()}")
+        else:
+            lines.append(f"{column}: {len(set(map(str, values)))} distinct values")
+    return lines
+
+
+def encode_results(
+    results: List[Dict[str, Any]],
+    token_budget: int = RESULTS_TOKEN_BUDGET,
+    top_k: int = 20,
+) -> EncodedResults:
+    """CSV if it fits the budget, otherwise summary statistics plus the first rows"""
+    if not results:
+        return EncodedResults("(no rows)", 1, 0, False)
+
+    # Stop serializing as soon as the full CSV would not fit
+    text = to_csv(results, max_chars=token_budget * 4)
+    if text is not None:
+        return EncodedResults(text, estimate_tokens(text), len(results), False)
+
+    # Shrink the sample until the summary fits (always keep at least one row)
+    k = min(top_k, len(results))
+    header = [f"Total rows: {len(results)} (summarized)", *column_summary(results)]
+    while True:
+        text = "\n".join(header + [f"First {k} rows:", to_csv(results[:k])])
+        tokens = estimate_tokens(text)
+        if tokens <= token_budget or k == 1:
+            return EncodedResults(text, tokens, len(results), True)
+        k = max(1, k // 2)
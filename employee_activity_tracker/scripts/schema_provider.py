@@ -0,0 +1,336 @@
+# scripts/schema_provider.py
+"""Introspected, per-question schema text for the SQL prompt.
+
+The provider reads tables and columns from information_schema and samples the
+distinct values of low-cardinality text columns (department, job_title, ...).
+The snapshot is cached in memory and on disk, keyed by a digest of the
+column definitions. A cheap digest probe, run at most every
+SCHEMA_DDL_PROBE_TTL seconds, picks up DDL changes. Sampled values are
+refreshed after SCHEMA_VALUES_TTL.
+
+Per question, only tables and columns that match it lexically (names,
+synonyms, sampled values) are rendered, plus their key and identity columns.
+Prompt size then tracks the question rather than the warehouse. When nothing
+matches, the whole schema is sent.
+
+    python schema_provider.py                          # print the full schema
+    python schema_provider.py "Who works in Finance?"  # print the pruned schema
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from db import get_connection
+from sql_cache import question_tokens
+
+DEFAULT_CACHE_PATH = Path(__file__).parent / ".cache" / "schema.json"
+
+SAMPLE_DISTINCT_LIMIT = int(os.getenv("SCHEMA_SAMPLE_DISTINCT", 20))
+DDL_PROBE_TTL = float(os.getenv("SCHEMA_DDL_PROBE_TTL", 30))
+VALUES_TTL = float(os.getenv("SCHEMA_VALUES_TTL", 3600))
+
+# Bookkeeping and scratch tables the model never needs to see
+EXCLUDED_TABLES = ("table_versions", "rollup_state", "activities_search_bench")
+
+_SAMPLED_TYPES = ("char", "varchar", "enum")
+
+# Column tokens too generic to select a column on their own
+_GENERIC_TOKENS = frozenset({"total", "num", "number", "id"})
+
+# Question words that point at a column without naming it
+COLUMN_SYNONYMS = {
+    "total_sales_rmb": "sales revenue sold deal deals rmb earned",
+    "hours_worked": "hours hour worked overtime workload",
+    "num_meetings": "meetings meeting met attended",
+    "hire_date": "hired hire joined recession tenure",
+    "week_number": "week weeks weekly when month date september august period",
+    "job_title": "role roles job title position manager analyst engineer skills",
+    "full_name": "name employee employees person people staff",
+    "activities": "activities activity update updates challenge challenges retention "
+    "solution solutions customer feedback mentioned proposed",
+    "email": "email mail contact address",
+    "department": "department departments team",
+}
+
+# Always rendered with a selected table so answers can name people
+IDENTITY_COLUMNS = ("employee_id", "full_name")
+
+
+class Column(NamedTuple):
+    name: str
+    type: str
+    key: str
+    values: Tuple[str, ...]  # sampled distinct values, empty unless low-cardinality
+
+
+class Table(NamedTuple):
+    name: str
+    comment: str
+    columns: Tuple[Column, ...]
+
+
+def ddl_digest(conn) -> str:
+    """Digest of every column definition in the current database (metadata only)"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME AS t, COLUMN_NAME AS c, COLUMN_TYPE AS ty, COLUMN_KEY AS k "
+            "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+            "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+        )
+        payload = "\n".join(f"{r['t']}.{r['c']}:{r['ty']}:{r['k']}" for r in cursor.fetchall())
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _sample_values(cursor, table: str, column: str, limit: int) -> Tuple[str, ...]:
+    """Distinct values if there are at most `limit` of them, else ()"""
+    cursor.execute(
+        f"SELECT DISTINCT {column} AS v FROM {table} WHERE {column} IS NOT NULL LIMIT {limit + 1}"
+    )
+    values = [str(row["v"]) for row in cursor.fetchall()]
+    return tuple(sorted(values)) if len(values) <= limit else ()
+
+
+def introspect(
+    conn,
+    exclude_tables: Iterable[str] = EXCLUDED_TABLES,
+    sample_limit: int = SAMPLE_DISTINCT_LIMIT,
+) -> Dict[str, Table]:
+    """Tables, columns and low-cardinality value samples of the current database"""
+    excluded = set(exclude_tables)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME AS t, TABLE_COMMENT AS comment FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'"
+        )
+        comments = {r["t"]: r["comment"] or "" for r in cursor.fetchall() if r["t"] not in excluded}
+        cursor.execute(
+            "SELECT TABLE_NAME AS t, COLUMN_NAME AS c, COLUMN_TYPE AS ty, DATA_TYPE AS dt, "
+            "COLUMN_KEY AS k FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+            "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+        )
+        rows = [r for r in cursor.fetchall() if r["t"] in comments]
+
+        columns: Dict[str, List[Column]] = {t: [] for t in comments}
+        for r in rows:
+            values: Tuple[str, ...] = ()
+            if r["dt"].lower() in _SAMPLED_TYPES and r["k"] != "PRI":
+                values = _sample_values(cursor, r["t"], r["c"], sample_limit)
+            columns[r["t"]].append(Column(r["c"], r["ty"].upper(), r["k"] or "", values))
+    return {t: Table(t, comments[t], tuple(cols)) for t, cols in sorted(columns.items())}
+
+
+def render_schema(tables: Iterable[Table], only: Optional[Dict[str, List[str]]] = None) -> str:
+    """Schema text in the prompt's `table(column TYPE, ...)` style, with sampled values"""
+    lines = [""]
+    for table in tables:
+        if only is not None and table.name not in only:
+            continue
+        columns = [c for c in table.columns if only is None or c.name in only[table.name]]
+        lines.append(f"    {table.name}(" + (f"  -- {table.comment}" if table.comment else ""))
+        for i, col in enumerate(columns):
+            line = f"        {col.name} {col.type}"
+            if col.key == "PRI":
+                line += " PRIMARY KEY"
+            if i < len(columns) - 1:
+                line += ","
+            if col.values:
+                line += "  -- values: " + ", ".join(f"'{v}'" for v in col.values)
+            lines.append(line)
+        lines.append("    )")
+    return "\n".join(lines) + "\n    "
+
+
+def _tokens(text: str) -> FrozenSet[str]:
+    return question_tokens(text.replace("_", " "))
+
+
+class SchemaProvider:
+    """Cached introspection plus lexical per-question pruning"""
+
+    def __init__(
+        self,
+        connect: Callable[[], Any] = get_connection,
+        exclude_tables: Iterable[str] = EXCLUDED_TABLES,
+        visible_columns: Optional[Dict[str, Iterable[str]]] = None,
+        sample_limit: int = SAMPLE_DISTINCT_LIMIT,
+        probe_ttl: float = DDL_PROBE_TTL,
+        values_ttl: float = VALUES_TTL,
+        cache_path: Any = DEFAULT_CACHE_PATH,
+    ):
+        """
+        connect: context manager yielding a DB-API connection
+        visible_columns: per-table column whitelist (e.g. hide the wide
+        activities columns once the normalized layout is in use)
+        """
+        self.connect = connect
+        self.exclude_tables = tuple(exclude_tables)
+        self.visible_columns = {t: set(c) for t, c in (visible_columns or {}).items()}
+        # Part of the on-disk cache key: a different view needs its own snapshot
+        self._view_key = json.dumps(
+            [sorted(self.exclude_tables), sorted((t, sorted(c)) for t, c in self.visible_columns.items())]
+        )
+        self.sample_limit = sample_limit
+        self.probe_ttl = probe_ttl
+        self.values_ttl = values_ttl
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.introspections = 0
+        self._tables: Dict[str, Table] = {}
+        self._digest: Optional[str] = None
+        self._loaded_at = 0.0
+        self._probed_at = 0.0
+        self._lock = threading.Lock()
+
+    # Snapshot ---------------------------------------------------------------
+    def _load_disk(self, digest: str) -> bool:
+        if not self.cache_path or not self.cache_path.exists():
+            return False
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except ValueError:
+            return False
+        if (
+            data.get("digest") != digest
+            or data.get("view") != self._view_key
+            or time.time() - data.get("loaded_at", 0) > self.values_ttl
+        ):
+            return False
+        self._tables = {
+            name: Table(name, t["comment"], tuple(Column(*c[:3], tuple(c[3])) for c in t["columns"]))
+            for name, t in data["tables"].items()
+        }
+        self._loaded_at = time.monotonic() - (time.time() - data["loaded_at"])
+        return True
+
+    def _save_disk(self, digest: str) -> None:
+        if not self.cache_path:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "digest": digest,
+            "view": self._view_key,
+            "loaded_at": time.time(),
+            "tables": {
+                t.name: {"comment": t.comment, "columns": [list(c) for c in t.columns]}
+                for t in self._tables.values()
+            },
+        }
+        self.cache_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+
+    def tables(self) -> Dict[str, Table]:
+        """Current snapshot, re-introspected after a DDL change or once values go stale"""
+        now = time.monotonic()
+        with self._lock:
+            fresh = self._tables and now - self._loaded_at < self.values_ttl
+            if fresh and now - self._probed_at < self.probe_ttl:
+                return self._tables
+            with self.connect() as conn:
+                digest = ddl_digest(conn)
+                self._probed_at = now
+                if fresh and digest == self._digest:
+                    return self._tables
+                if digest != self._digest and self._load_disk(digest):
+                    self._digest = digest
+                    return self._tables
+                self._tables = introspect(conn, self.exclude_tables, self.sample_limit)
+            self._tables = self._apply_visibility(self._tables)
+            self._digest, self._loaded_at = digest, now
+            self.introspections += 1
+            self._save_disk(digest)
+            return self._tables
+
+    def _apply_visibility(self, tables: Dict[str, Table]) -> Dict[str, Table]:
+        return {
+            name: table._replace(
+                columns=tuple(c for c in table.columns if c.name in self.visible_columns[name])
+            )
+            if name in self.visible_columns
+            else table
+            for name, table in tables.items()
+        }
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._tables, self._digest = {}, None
+
+    # Pruning -----------------------------------------------------------------
+    def relevant(self, question: str) -> Dict[str, List[str]]:
+        """table → columns that the question touches (empty when nothing matches)"""
+        words = _tokens(question)
+        lowered = question.lower()
+        selected: Dict[str, List[str]] = {}
+        for table in self.tables().values():
+            table_hit = bool(_tokens(table.name) & words)
+            matched = []
+            for col in table.columns:
+                col_words = (_tokens(col.name) - _GENERIC_TOKENS) | _tokens(
+                    COLUMN_SYNONYMS.get(col.name, "")
+                )
+                value_hit = any(
+                    re.search(rf"\b{re.escape(v.lower())}\b", lowered) for v in col.values
+                )
+                if col_words & words or value_hit:
+                    matched.append(col.name)
+            if not matched and not table_hit:
+                continue
+            keep = {
+                c.name for c in table.columns if c.key == "PRI" or c.name in IDENTITY_COLUMNS
+            }
+            selected[table.name] = [c.name for c in table.columns if c.name in keep or c.name in matched]
+        return selected
+
+    def full_schema(self) -> str:
+        return render_schema(self.tables().values())
+
+    def schema_for(self, question: str) -> str:
+        return self.schema_for_many([question])
+
+    def schema_for_many(self, questions: List[str]) -> str:
+        """Union of the tables/columns relevant to any of `questions`"""
+        union: Dict[str, set] = {}
+        for question in questions:
+            for table, columns in self.relevant(question).items():
+                union.setdefault(table, set()).update(columns)
+        if not union:
+            return self.full_schema()
+        tables = self.tables()
+        only = {t: [c.name for c in tables[t].columns if c.name in cols] for t, cols in union.items()}
+        return render_schema(tables.values(), only)
+
+
+_default: Optional[SchemaProvider] = None
+_default_lock = threading.Lock()
+
+
+def get_schema_provider(
+    exclude_tables: Iterable[str] = EXCLUDED_TABLES,
+    visible_columns: Optional[Dict[str, Iterable[str]]] = None,
+) -> SchemaProvider:
+    """Process-wide provider (the first caller's view settings win)"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SchemaProvider(
+                exclude_tables=exclude_tables,
+                visible_columns=visible_columns,
+                cache_path=os.getenv("SCHEMA_CACHE_PATH", DEFAULT_CACHE_PATH),
+            )
+        return _default
+
+
+if __name__ == "__main__":
+    from results_encoder import estimate_tokens
+
+    provider = SchemaProvider(cache_path=None)
+    full = provider.full_schema()
+    if len(sys.argv) > 1:
+        pruned = provider.schema_for(" ".join(sys.argv[1:]))
+        print(pruned)
+        print(f"(~{estimate_tokens(pruned)} of ~{estimate_tokens(full)} schema tokens)", file=sys.stderr)
+    else:
+        print(full)
@@ -0,0 +1,158 @@
+# scripts/search_index.py
+"""FULLTEXT search over activities.activities and a LIKE-vs-MATCH benchmark.
+
+InnoDB keeps the FULLTEXT index up to date on every insert, so the only
+ingest-time work is making sure it exists (populate_data.py does this after
+loading). The SQL prompt asks the model for MATCH ... AGAINST instead of
+chains of LIKE '%term%', which are full table scans.
+Partitioned storage (partitions.py) cannot carry the index; there MATCH is
+rewritten to LIKE before execution.
+
+    python search_index.py --ensure                 # create the index if missing
+    python search_index.py --benchmark 1000 10000 50000
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+from db import get_connection
+
+FULLTEXT_INDEX = "ft_activities"
+
+# Terms the prompt uses for customer retention / challenge questions
+RETENTION_TERMS = ["retention", "engagement", "feedback", "challenge", "solution"]
+
+
+def has_fulltext_index(conn, table: str = "activities") -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) AS n FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            (table, FULLTEXT_INDEX),
+        )
+        return cursor.fetchone()["n"] > 0
+
+
+def ensure_fulltext_index(conn, table: str = "activities") -> bool:
+    """
+    Create the FULLTEXT index if missing; returns True when it was created.
+    Partitioned tables cannot have one (partitions.py rewrites MATCH instead).
+    """
+    from partitions import is_partitioned
+
+    if has_fulltext_index(conn, table) or is_partitioned(conn, table):
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} ADD FULLTEXT INDEX {FULLTEXT_INDEX} (activities)")
+    conn.commit()
+    return True
+
+
+def like_clause(terms: List[str], column: str = "activities") -> str:
+    return " OR ".join(f"{column} LIKE '%{t}%'" for t in terms)
+
+
+def match_clause(terms: List[str], column: str = "activities") -> str:
+    """Boolean-mode MATCH with prefix wildcards (any term matches)"""
+    return f"MATCH({column}) AGAINST('{' '.join(t + '*' for t in terms)}' IN BOOLEAN MODE)"
+
+
+def _time_query(cursor, sql: str, repeat: int) -> Dict[str, float]:
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(sql)
+        rows = len(cursor.fetchall())
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(timings), 2), "rows": rows}
+
+
+def benchmark(sizes: List[int], weeks: int = 52, repeat: int = 5, terms=None) -> List[Dict]:
+    """
+    Grow a scratch copy of activities to each employee count in `sizes` and time
+    the LIKE chain against MATCH ... AGAINST at every step.
+    """
+    from partitions import is_partitioned
+    from populate_data import insert_batched, shard_rows, shard_specs
+
+    terms = terms or RETENTION_TERMS
+    table = "activities_search_bench"
+    like_sql = f"SELECT DISTINCT employee_id FROM {table} WHERE {like_clause(terms)}"
+    match_sql = f"SELECT DISTINCT employee_id FROM {table} WHERE {match_clause(terms)}"
+    report = []
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"CREATE TABLE {table} LIKE activities")
+            if is_partitioned(conn, table):
+                # LIKE copies the partitioning, which rules out the FULLTEXT index under test
+                cursor.execute(f"ALTER TABLE {table} REMOVE PARTITIONING")
+        ensure_fulltext_index(conn, table)
+
+        try:
+            loaded_employees = 0
+            for size in sorted(sizes):
+                # Only load the shards that are new at this size
+                specs = [
+                    s for s in shard_specs(size, weeks, seed=42) if s.last_id > loaded_employees
+                ]
+                rows = (
+                    row
+                    for spec in specs
+                    for row in shard_rows(spec)
+                    if int(row[0][3:]) > loaded_employees
+                )
+                insert_batched(conn, rows, 2000, 100000, table=table)
+                loaded_employees = size
+
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SELECT COUNT(*) AS n FROM {table}")
+                    total_rows = cursor.fetchone()["n"]
+                    like = _time_query(cursor, like_sql, repeat)
+                    match = _time_query(cursor, match_sql, repeat)
+                step = {
+                    "employees": size,
+                    "rows": total_rows,
+                    "like_ms": like["median_ms"],
+                    "match_ms": match["median_ms"],
+                    "like_rows": like["rows"],
+                    "match_rows": match["rows"],
+                    "speedup": round(like["median_ms"] / match["median_ms"], 1)
+                    if match["median_ms"]
+                    else None,
+                }
+                print(
+                    f"{total_rows:>10} rows: LIKE {step['like_ms']}ms vs MATCH {step['match_ms']}ms"
+                    f" ({step['speedup']}x)"
+                )
+                report.append(step)
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FULLTEXT index tooling for activities")
+    parser.add_argument("--ensure", action="store_true", help="Create the FULLTEXT index if missing")
+    parser.add_argument(
+        "--benchmark", type=int, nargs="+", metavar="EMPLOYEES",
+        help="Employee counts to grow a scratch table through",
+    )
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.ensure:
+        with get_connection() as conn:
+            created = ensure_fulltext_index(conn)
+        print("✅ FULLTEXT index created." if created else "FULLTEXT index already present.")
+    if args.benchmark:
+        benchmark(args.benchmark, args.weeks, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
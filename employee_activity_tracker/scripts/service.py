@@ -0,0 +1,340 @@
+# scripts/service.py
+"""HTTP API for analysts: POST /ask, POST /sql, GET /health.
+
+The event loop only handles HTTP, admission and coalescing. The pipeline
+(query_to_sql → cost-guarded execution → narration) runs in a worker pool
+sized to the DB connection pool, so every running question holds at most one
+pooled connection. Admission has three gates:
+
+    per-client token bucket   429 + Retry-After when a client exceeds its rate
+    bounded queue             503 + Retry-After when workers and queue are full
+    single-flight             identical in-flight questions share one run
+                              (one LLM call, one DB query)
+
+    python service.py --port 8000
+    python service.py --offline          # fake LLM, no database (load testing)
+
+    curl -s localhost:8000/ask -d '{"question": "Who works in the IT department?"}'
+"""
+import argparse
+import asyncio
+import functools
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Tuple
+
+from aiohttp import web
+
+from db import DB_POOL_SIZE
+from sql_cache import normalize_question
+
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", DB_POOL_SIZE))
+SERVICE_MAX_QUEUE = int(os.getenv("SERVICE_MAX_QUEUE", 64))
+SERVICE_RATE_LIMIT = float(os.getenv("SERVICE_RATE_LIMIT", 5))  # requests/s per client
+SERVICE_RATE_BURST = int(os.getenv("SERVICE_RATE_BURST", 20))
+# Peers (e.g. a reverse proxy) allowed to name the client via X-Client-Id / X-Forwarded-For
+SERVICE_TRUSTED_PROXIES = frozenset(
+    p.strip() for p in os.getenv("SERVICE_TRUSTED_PROXIES", "").split(",") if p.strip()
+)
+
+ANALYSIS_TYPES = ("auto", "numerical", "qualitative")
+
+
+class Overloaded(Exception):
+    """Workers and queue are full; the caller should retry later"""
+
+
+class TokenBucketLimiter:
+    """Per-client token buckets refilled at `rate` tokens/s up to `burst`"""
+
+    def __init__(self, rate: float, burst: int, idle_ttl: float = 600.0):
+        self.rate = rate
+        self.burst = burst
+        self.idle_ttl = idle_ttl
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # client -> (tokens, updated)
+        self._last_sweep = time.monotonic()
+
+    def acquire(self, client: str) -> Tuple[bool, float]:
+        """(allowed, seconds until the next token)"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+        self._buckets[client] = (tokens, now)
+        if now - self._last_sweep > self.idle_ttl:
+            self._sweep(now)
+        return allowed, 0.0 if allowed else (1.0 - tokens) / self.rate
+
+    def _sweep(self, now: float) -> None:
+        self._buckets = {c: b for c, b in self._buckets.items() if now - b[1] < self.idle_ttl}
+        self._last_sweep = now
+
+
+class SingleFlight:
+    """Concurrent calls with the same key await one shared execution"""
+
+    def __init__(self):
+        self._inflight: Dict[Any, "asyncio.Future[Any]"] = {}
+        self.coalesced = 0
+
+    def _done(self, key: Any, task: "asyncio.Future[Any]") -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter went away
+
+    async def do(self, key: Any, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        (result, shared) where shared is True when another caller started the work.
+        The work runs as its own task, so a caller that disconnects does not
+        cancel it for the others.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+        return await asyncio.shield(task), shared
+
+
+class WorkerPool:
+    """Bounded thread pool for the blocking pipeline with a bounded wait queue"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline")
+        self._slots = asyncio.Semaphore(workers)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self.running + self.waiting >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+Pipeline = Tuple[Callable[[str, str], str], Callable[[str], Optional[str]], Any]
+
+
+def live_pipeline() -> Pipeline:
+    """(ask, to_sql, llm gateway) backed by DeepSeek and MySQL"""
+    from llm_integration import get_client, query_to_natural_language, query_to_sql
+
+    def ask(question: str, analysis_type: str) -> str:
+        return query_to_natural_language(question, None, analysis_type)
+
+    return ask, query_to_sql, get_client()
+
+
+def offline_pipeline(latency: float = 0.05) -> Pipeline:
+    """(ask, to_sql, llm gateway) over the fake LLM with empty result sets and no caches"""
+    from fake_llm import FakeLLMClient
+    from llm_gateway import LLMGateway
+    from llm_integration import BENCHMARK_SCHEMA, _results_to_natural_language, query_to_sql
+
+    llm = LLMGateway(FakeLLMClient(latency=latency, jitter=latency / 2))
+
+    def to_sql(question: str) -> Optional[str]:
+        return query_to_sql(question, BENCHMARK_SCHEMA, llm_client=llm, use_cache=False)
+
+    def ask(question: str, analysis_type: str) -> str:
+        if not to_sql(question):
+            return "❌ Unable to generate a valid database query."
+        return _results_to_natural_language(
+            question, [], analysis_type, llm_client=llm, use_cache=False
+        )
+
+    return ask, to_sql, llm
+
+
+def _client_id(request: web.Request, trusted_proxies: FrozenSet[str] = SERVICE_TRUSTED_PROXIES) -> str:
+    """
+    Rate-limit key: the peer address. Client-supplied ids are only honoured
+    from a trusted proxy; anyone else could send a fresh one per request.
+    """
+    remote = request.remote or "anonymous"
+    if remote in trusted_proxies:
+        forwarded = request.headers.get("X-Forwarded-For", "").split(",")[-1].strip()
+        return request.headers.get("X-Client-Id") or forwarded or remote
+    return remote
+
+
+def _error(status: int, message: str, retry_after: Optional[float] = None) -> web.Response:
+    headers = None
+    if retry_after is not None:
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+    return web.json_response({"error": message}, status=status, headers=headers)
+
+
+def create_app(
+    ask: Optional[Callable[[str, str], str]] = None,
+    to_sql: Optional[Callable[[str], Optional[str]]] = None,
+    llm: Any = None,
+    workers: int = SERVICE_WORKERS,
+    max_queue: int = SERVICE_MAX_QUEUE,
+    rate: float = SERVICE_RATE_LIMIT,
+    burst: int = SERVICE_RATE_BURST,
+    trusted_proxies: FrozenSet[str] = SERVICE_TRUSTED_PROXIES,
+) -> web.Application:
+    """
+    aiohttp application; `ask`/`to_sql` default to the live pipeline. `llm` is
+    the gateway the pipeline calls, whose breaker and counters /health reports.
+    """
+    if ask is None or to_sql is None:
+        live_ask, live_to_sql, live_llm = live_pipeline()
+        ask, to_sql, llm = ask or live_ask, to_sql or live_to_sql, llm or live_llm
+
+    limiter = TokenBucketLimiter(rate, burst)
+    flights = SingleFlight()
+    started = time.time()
+    state: Dict[str, Any] = {"pool": None, "requests": 0}
+
+    async def on_startup(app: web.Application) -> None:
+        # Semaphores must be created on the serving loop
+        state["pool"] = WorkerPool(workers, max_queue)
+
+    async def on_cleanup(app: web.Application) -> None:
+        state["pool"].shutdown()
+
+    async def read_question(request: web.Request) -> Tuple[str, str, Optional[web.Response]]:
+        """(question, analysis_type, error response or None)"""
+        try:
+            body = await request.json()
+        except ValueError:
+            return "", "", _error(400, "body must be a JSON object")
+        if not isinstance(body, dict):
+            return "", "", _error(400, "body must be a JSON object")
+        question = str(body.get("question", "")).strip()
+        analysis_type = body.get("analysis_type", "auto")
+        if not question:
+            return "", "", _error(400, "question is required")
+        if analysis_type not in ANALYSIS_TYPES:
+            return "", "", _error(400, f"analysis_type must be one of {', '.join(ANALYSIS_TYPES)}")
+        return question, analysis_type, None
+
+    async def admit_and_run(request: web.Request, key: Any, fn: Callable[..., Any], *args: Any):
+        state["requests"] += 1
+        allowed, retry_after = limiter.acquire(_client_id(request, trusted_proxies))
+        if not allowed:
+            return None, _error(429, "rate limit exceeded", retry_after)
+        try:
+            result, shared = await flights.do(key, lambda: state["pool"].run(fn, *args))
+        except Overloaded:
+            return None, _error(503, "server busy", 1.0)
+        return (result, shared), None
+
+    async def handle_ask(request: web.Request) -> web.Response:
+        start = time.perf_counter()
+        question, analysis_type, error = await read_question(request)
+        if error:
+            return error
+        key = ("ask", normalize_question(question), analysis_type)
+        outcome, error = await admit_and_run(request, key, ask, question, analysis_type)
+        if error:
+            return error
+        answer, shared = outcome
+        return web.json_response(
+            {
+                "question": question,
+                "answer": answer,
+                "coalesced": shared,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+        )
+
+    async def handle_sql(request: web.Request) -> web.Response:
+        start = time.perf_counter()
+        question, _, error = await read_question(request)
+        if error:
+            return error
+        key = ("sql", normalize_question(question))
+        outcome, error = await admit_and_run(request, key, to_sql, question)
+        if error:
+            return error
+        sql, shared = outcome
+        if not sql:
+            return _error(422, "Unable to generate a valid database query")
+        return web.json_response(
+            {
+                "question": question,
+                "sql": sql,
+                "coalesced": shared,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+        )
+
+    async def handle_health(request: web.Request) -> web.Response:
+        from db import get_pool
+
+        breaker = getattr(llm, "breaker", None)
+        return web.json_response(
+            {
+                "status": "degraded" if breaker and breaker.is_open() else "ok",
+                "uptime_s": round(time.time() - started, 1),
+                "requests": state["requests"],
+                "coalesced": flights.coalesced,
+                "workers": state["pool"].stats(),
+                "db_pool": get_pool().stats(),
+                "llm": llm.stats() if hasattr(llm, "stats") else None,
+            }
+        )
+
+    app = web.Application()
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/ask", handle_ask)
+    app.router.add_post("/sql", handle_sql)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the NL query pipeline over HTTP")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_PORT", 8000)))
+    parser.add_argument("--offline", action="store_true", help="Fake LLM, no database")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency (s)")
+    args = parser.parse_args()
+
+    ask = to_sql = llm = None
+    if args.offline:
+        ask, to_sql, llm = offline_pipeline(args.llm_latency)
+    web.run_app(create_app(ask, to_sql, llm), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# scripts/sql_cache.py
+"""Persistent NL → SQL cache in front of `query_to_sql`.
+
+Entries are keyed on a normalized question plus a fingerprint of the table
+schema and the prompt template, stored in SQLite with LRU + TTL eviction.
+By default only the exact normalized question hits. SQL_CACHE_SIMILARITY
+enables a token-set (Jaccard) lookup so paraphrases hit too, as long as the
+literal values in the question (signed numbers, quoted strings, proper nouns)
+and the operator words are the same: aggregates and ordering (max, min, avg,
+sum, top, bottom, asc, desc), comparisons (more/less than, above, below, at
+least, at most) and negations (not, outside, except, without, excluding), each
+with their synonyms.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+DEFAULT_CACHE_PATH = Path(__file__).parent / ".cache" / "sql_cache.sqlite3"
+
+STOPWORDS = frozenset(
+    """a an the is are was were be been of in on at to for by with from and or
+    what which who whom whose how many much do does did has have had all any
+    please show list give me tell find get our their his her its that this
+    those these there within during""".split()
+)
+
+# A leading minus stays on numbers: "-40" and "40" are different questions
+_WORD_RE = re.compile(r"(?:(?<![\w.-])-(?=\d))?[a-z0-9]+(?:[.'-][a-z0-9]+)*")
+_QUOTED_RE = re.compile(r"'([^']+)'|\"([^\"]+)\"")
+_NUMBER_RE = re.compile(r"(?<![\w.-])-?\d+(?:[.-]\d+)*\b")
+# Two-word comparisons, folded into one token before operator lookup
+_PHRASE_RE = re.compile(r"\b(at least|at most|no more|no less|not more|not less)\b")
+_ALPHA_RE = re.compile(r"[A-Za-z]+")
+
+# Words that flip or change the aggregate, mapped to the operation they ask for;
+# "bottom 3" and "top 3" share every other token
+OPERATOR_WORDS = {
+    **dict.fromkeys(("max", "maximum", "highest", "most", "largest", "greatest", "best"), "max"),
+    **dict.fromkeys(("min", "minimum", "lowest", "least", "fewest", "smallest", "worst"), "min"),
+    **dict.fromkeys(("avg", "average", "mean"), "avg"),
+    **dict.fromkeys(("sum", "total"), "sum"),
+    **dict.fromkeys(("count", "number"), "count"),
+    **{word: word for word in ("top", "bottom", "first", "last")},
+    **dict.fromkeys(("asc", "ascending", "increasing"), "asc"),
+    **dict.fromkeys(("desc", "descending", "decreasing"), "desc"),
+    # Comparisons and negations: "less than 40" and "outside Sales" share every other token
+    **dict.fromkeys(("more", "above", "over", "greater", "exceeding", "exceeds", "exceed", "beyond"), "gt"),
+    **dict.fromkeys(("less", "below", "under", "fewer", "lower"), "lt"),
+    **dict.fromkeys(("at_least", "no_less", "not_less", "minimum_of"), "gte"),
+    **dict.fromkeys(("at_most", "no_more", "not_more", "maximum_of"), "lte"),
+    **dict.fromkeys(("equal", "equals", "exactly"), "eq"),
+    **dict.fromkeys(
+        (
+            "not", "no", "none", "never", "outside", "except", "excluding", "exclude", "without",
+            "other", "besides", "neither", "nor", "isn't", "aren't", "wasn't", "weren't",
+            "didn't", "don't", "doesn't", "hasn't", "haven't",
+        ),
+        "not",
+    ),
+}
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace"""
+    return " ".join(_WORD_RE.findall(question.lower()))
+
+
+def question_tokens(question: str) -> FrozenSet[str]:
+    """Content tokens used for near-duplicate matching"""
+    return frozenset(
+        t.rstrip("s") if len(t) > 3 else t
+        for t in _WORD_RE.findall(question.lower())
+        if t not in STOPWORDS
+    )
+
+
+def question_literals(question: str) -> FrozenSet[str]:
+    """Values that must match exactly for a paraphrase to reuse cached SQL"""
+    quoted = {a or b for a, b in _QUOTED_RE.findall(question)}
+    numbers = set(_NUMBER_RE.findall(question))
+    # Capitalized words after the first one are treated as names/departments
+    proper = {w for w in _ALPHA_RE.findall(question)[1:] if w[0].isupper()}
+    return frozenset(v.lower() for v in quoted | numbers | proper)
+
+
+def question_operators(question: str) -> FrozenSet[str]:
+    """Aggregate, ordering, comparison and negation operations the question asks for"""
+    text = _PHRASE_RE.sub(lambda m: m.group(1).replace(" ", "_"), question.lower())
+    return frozenset(
+        OPERATOR_WORDS[t] for t in re.findall(r"[a-z0-9_]+(?:'[a-z]+)?", text) if t in OPERATOR_WORDS
+    )
+
+
+def schema_fingerprint(table_schema: str, prompt_template: str) -> str:
+    """Hash of the schema text and prompt template; any change invalidates entries"""
+    normalized_schema = " ".join(table_schema.split())
+    payload = f"{normalized_schema}\n---\n{prompt_template}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class SQLCache:
+    """SQLite-backed LRU/TTL cache of generated SQL"""
+
+    def __init__(
+        self,
+        path: Any = DEFAULT_CACHE_PATH,
+        max_entries: int = 1000,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        similarity_threshold: Optional[float] = None,
+    ):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sql_cache (
+                fingerprint TEXT NOT NULL,
+                question TEXT NOT NULL,
+                literals TEXT NOT NULL,
+                tokens TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (fingerprint, question)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sql_cache_lru ON sql_cache (last_used)"
+        )
+        self._conn.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _touch(self, fingerprint: str, question: str, now: float) -> None:
+        self._conn.execute(
+            "UPDATE sql_cache SET last_used = ?, hit_count = hit_count + 1 "
+            "WHERE fingerprint = ? AND question = ?",
+            (now, fingerprint, question),
+        )
+        self._conn.commit()
+
+    def get(self, question: str, fingerprint: str) -> Optional[str]:
+        """Return cached SQL for the question (or a close paraphrase), else None"""
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sql, created_at FROM sql_cache WHERE fingerprint = ? AND question = ?",
+                (fingerprint, normalized),
+            ).fetchone()
+            if row and not self._expired(row[1], now):
+                self._touch(fingerprint, normalized, now)
+                self.hits += 1
+                return row[0]
+
+            match = self._near_duplicate(question, fingerprint, now)
+            if match:
+                self._touch(fingerprint, match[0], now)
+                self.near_hits += 1
+                return match[1]
+
+            self.misses += 1
+            return None
+
+    def _near_duplicate(
+        self, question: str, fingerprint: str, now: float
+    ) -> Optional[Tuple[str, str]]:
+        if self.similarity_threshold is None:
+            return None
+        tokens = question_tokens(question)
+        operators = question_operators(question)
+        literals = "|".join(sorted(question_literals(question)))
+        best: Optional[Tuple[str, str]] = None
+        best_score = self.similarity_threshold
+        rows = self._conn.execute(
+            "SELECT question, tokens, sql, created_at FROM sql_cache "
+            "WHERE fingerprint = ? AND literals = ?",
+            (fingerprint, literals),
+        )
+        for cached_question, cached_tokens, sql, created_at in rows:
+            if self._expired(created_at, now) or question_operators(cached_question) != operators:
+                continue
+            score = jaccard(tokens, frozenset(cached_tokens.split()))
+            if score >= best_score:
+                best, best_score = (cached_question, sql), score
+        return best
+
+    def put(self, question: str, fingerprint: str, sql: str) -> None:
+        """Store validated SQL and evict expired / least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sql_cache "
+                "(fingerprint, question, literals, tokens, sql, created_at, last_used, hit_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (
+                    fingerprint,
+                    normalize_question(question),
+                    "|".join(sorted(question_literals(question))),
+                    " ".join(sorted(question_tokens(question))),
+                    sql,
+                    now,
+                    now,
+                ),
+            )
+            if self.ttl_seconds is not None:
+                self._conn.execute(
+                    "DELETE FROM sql_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+                )
+            self._conn.execute(
+                "DELETE FROM sql_cache WHERE rowid IN ("
+                "SELECT rowid FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sql_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus persisted totals"""
+        with self._lock:
+            entries, lifetime_hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM sql_cache"
+            ).fetchone()
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 3) if lookups else 0.0,
+            "llm_calls_saved": self.hits + self.near_hits,
+            "entries": entries,
+            "lifetime_hits": lifetime_hits,
+        }
+
+
+_default_cache: Optional[SQLCache] = None
+_default_lock = threading.Lock()
+
+
+def get_sql_cache() -> Optional[SQLCache]:
+    """Process-wide cache configured from the environment (SQL_CACHE=off disables it)"""
+    global _default_cache
+    if os.getenv("SQL_CACHE", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            threshold = os.getenv("SQL_CACHE_SIMILARITY", "")  # e.g. 0.8; unset: exact matches only
+            _default_cache = SQLCache(
+                path=os.getenv("SQL_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", 1000)),
+                ttl_seconds=float(os.getenv("SQL_CACHE_TTL", 7 * 24 * 3600)),
+                similarity_threshold=float(threshold) if threshold else None,
+            )
+        return _default_cache
@@ -0,0 +1,370 @@
+# scripts/stats_engine.py
+"""Precomputed reference statistics for narrating query results.
+
+Narration used to ask the model for "X% higher than the company average of Y"
+without giving it the company average, so it either did the arithmetic itself
+or made the figure up. Instead, the numeric columns of a result
+(hours_worked, total_sales_rmb, num_meetings and aliases such as avg_hours or
+total_sales) are compared here with company, department and week figures. The
+prompt gets a few lines of finished facts:
+
+    hours_worked per employee-week (company, n=100): mean 39.8, p25 36.9, median 38.5, p75 42, p90 47
+    avg_hours over 4 rows: mean 46.9, +17.8% vs company mean 39.8
+    - Wei Zhang (Sales): avg_hours 48 = +20.6% vs company mean 39.8, 92nd percentile; +8.1% vs Sales mean 44.4
+
+Reference figures come from a cached aggregate table: one row per
+employee-week (employee_id, department, week_number, the three metrics) held
+as a pandas DataFrame. From it, company percentiles, per-department and
+per-week means are computed once per snapshot, at three grains:
+
+    row             employee-week values (columns named like the metric)
+    employee_avg    per-employee averages (avg/average/mean columns)
+    employee_total  per-employee totals (total/sum columns without a week)
+
+Comparing result rows against those tables is vectorized per column. The
+snapshot is re-read when the activities version changes, checked at most every
+STATS_TTL seconds (default 300). It is read from the replica when
+QUERY_BACKEND=replica, else from MySQL. NARRATION_STATS=off disables facts.
+
+    python stats_engine.py --fixture
+    python stats_engine.py --sql "SELECT full_name, department, AVG(hours_worked) AS avg_hours FROM activities GROUP BY full_name, department"
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import telemetry
+
+STATS_TTL = float(os.getenv("STATS_TTL", 300))
+STATS_MAX_ROWS = int(os.getenv("STATS_MAX_ROWS", 10))
+
+METRICS = ("hours_worked", "total_sales_rmb", "num_meetings")
+GRAINS = ("row", "employee_avg", "employee_total")
+GRAIN_LABELS = {
+    "row": "per employee-week",
+    "employee_avg": "per-employee average",
+    "employee_total": "per-employee total",
+}
+PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+
+AGGREGATE_SQL = (
+    f"SELECT employee_id, department, week_number, {', '.join(METRICS)} FROM activities"
+)
+
+_METRIC_PATTERNS = (
+    ("hours_worked", re.compile(r"hour")),
+    ("total_sales_rmb", re.compile(r"sales|revenue|rmb")),
+    ("num_meetings", re.compile(r"meeting")),
+)
+_AVG_RE = re.compile(r"avg|average|mean")
+_SUM_RE = re.compile(r"total|sum|overall|cumulative")
+# Columns that name a result row, in order of preference
+_LABEL_COLUMNS = ("full_name", "employee_id", "department")
+
+
+def classify_column(name: str, columns: List[str]) -> Optional[Tuple[str, str]]:
+    """(metric, grain) for a result column, or None if it is not one of the metrics"""
+    lowered = name.lower()
+    if lowered in METRICS:
+        return lowered, "row"
+    metric = next((m for m, pattern in _METRIC_PATTERNS if pattern.search(lowered)), None)
+    if metric is None:
+        return None
+    if _AVG_RE.search(lowered):
+        return metric, "employee_avg"
+    # A "total" per employee-week is just the weekly value
+    if _SUM_RE.search(lowered.replace("total_sales_rmb", "")) and "week_number" not in columns:
+        return metric, "employee_total"
+    return metric, "row"
+
+
+def _fmt(value: float) -> str:
+    if abs(value) >= 1000:
+        return f"{value:,.0f}"
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _ordinal(n: int) -> str:
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+def _pct(change: float) -> str:
+    return "±0%" if abs(change) < 0.05 else f"{change:+.1f}%"
+
+
+def _delta(value: float, reference: float) -> str:
+    if not reference:
+        return "±0" if value == reference else ("+" if value > 0 else "-") + _fmt(abs(value))
+    return _pct((value - reference) / abs(reference) * 100)
+
+
+class CompanyStats:
+    """Reference distributions of the activities metrics, precomputed from one snapshot"""
+
+    def __init__(self, frame: pd.DataFrame, version: Optional[str] = None):
+        self.version = version
+        self.rows = len(frame)
+        frame = frame.copy()
+        for metric in METRICS:
+            frame[metric] = pd.to_numeric(frame[metric], errors="coerce").astype(float)
+        frame["department"] = frame["department"].astype(str)
+
+        per_employee = frame.groupby("employee_id")
+        department_of = per_employee["department"].first()
+        samples = {
+            "row": frame,
+            "employee_avg": per_employee[list(METRICS)].mean().join(department_of),
+            "employee_total": per_employee[list(METRICS)].sum().join(department_of),
+        }
+        self.count: Dict[str, int] = {}
+        self.sorted: Dict[str, Dict[str, np.ndarray]] = {}
+        self.company: Dict[str, pd.DataFrame] = {}
+        self.department: Dict[str, pd.DataFrame] = {}
+        for grain, sample in samples.items():
+            values = sample[list(METRICS)]
+            self.count[grain] = len(values)
+            # Rounded so sums computed by the database and by pandas compare equal
+            self.sorted[grain] = {
+                m: np.sort(values[m].dropna().to_numpy().round(6)) for m in METRICS
+            }
+            quantiles = values.quantile(list(PERCENTILES)).T
+            quantiles.columns = [f"p{int(q * 100)}" for q in PERCENTILES]
+            self.company[grain] = quantiles.assign(mean=values.mean())
+            self.department[grain] = sample.groupby("department")[list(METRICS)].mean()
+        self.week = frame.groupby("week_number")[list(METRICS)].mean()
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], version: Optional[str] = None) -> "CompanyStats":
+        frame = pd.DataFrame.from_records(
+            rows, columns=["employee_id", "department", "week_number", *METRICS]
+        )
+        return cls(frame, version)
+
+    def reference_line(self, metric: str, grain: str) -> str:
+        c = self.company[grain].loc[metric]
+        return (
+            f"{metric} {GRAIN_LABELS[grain]} (company, n={self.count[grain]}): mean {_fmt(c['mean'])}, "
+            f"p25 {_fmt(c['p25'])}, median {_fmt(c['p50'])}, p75 {_fmt(c['p75'])}, p90 {_fmt(c['p90'])}"
+        )
+
+    def facts(self, results: List[Dict[str, Any]], max_rows: int = STATS_MAX_ROWS) -> str:
+        """Precomputed comparison lines for the metric columns of `results` ("" if none)"""
+        if not results or not self.rows:
+            return ""
+        df = pd.DataFrame.from_records(results)
+        columns = list(df.columns)
+        mapped = {}
+        for column in columns:
+            kind = classify_column(str(column), [str(c).lower() for c in columns])
+            if kind:
+                mapped[column] = kind
+        if not mapped:
+            return ""
+
+        lines: List[str] = []
+        per_employee = _is_per_employee(columns)
+        shown = df.head(max_rows)
+        row_notes: List[List[str]] = [[] for _ in range(len(shown))]
+        for column, (metric, grain) in mapped.items():
+            values = pd.to_numeric(df[column], errors="coerce").astype(float)
+            if values.isna().all():
+                continue
+            company_mean = self.company[grain].loc[metric, "mean"]
+            lines.append(self.reference_line(metric, grain))
+            # Only employees (or raw employee-week rows) are comparable with the
+            # per-employee distribution; department or company totals are not
+            if not (per_employee or (grain == "row" and str(column).lower() in METRICS and "week_number" in df.columns)):
+                continue
+            if len(df) > 1:
+                lines.append(
+                    f"{column} over {int(values.notna().sum())} rows: mean {_fmt(values.mean())}, "
+                    f"{_delta(values.mean(), company_mean)} vs company mean {_fmt(company_mean)}"
+                )
+
+            # Vectorized per-row comparisons for the rows that get their own line
+            head = values.head(max_rows)
+            # Mid-rank, so a value shared by many employees (e.g. zero sales) lands mid-tie
+            reference, probe = self.sorted[grain][metric], head.to_numpy().round(6)
+            ranks = (
+                np.searchsorted(reference, probe, side="left")
+                + np.searchsorted(reference, probe, side="right")
+            ) / 2
+            percentiles = np.clip(np.rint(ranks / max(1, len(reference)) * 100), 1, 99)
+            company_delta = (head - company_mean) / abs(company_mean) * 100 if company_mean else head * 0
+            department_mean = (
+                shown["department"].astype(str).map(self.department[grain][metric])
+                # Rows that are departments themselves gain nothing from this
+                if "department" in shown.columns and per_employee
+                else None
+            )
+            week_mean = (
+                pd.to_numeric(shown["week_number"], errors="coerce").map(self.week[metric])
+                if grain == "row" and "week_number" in shown.columns
+                else None
+            )
+            for i, value in enumerate(head):
+                if np.isnan(value):
+                    continue
+                note = (
+                    f"{column} {_fmt(value)} = {_pct(company_delta.iloc[i])} vs company mean "
+                    f"{_fmt(company_mean)}, {_ordinal(int(percentiles[i]))} percentile"
+                )
+                if department_mean is not None and not np.isnan(department_mean.iloc[i]):
+                    note += (
+                        f"; {_delta(value, department_mean.iloc[i])} vs {shown['department'].iloc[i]} "
+                        f"mean {_fmt(department_mean.iloc[i])}"
+                    )
+                if week_mean is not None and not np.isnan(week_mean.iloc[i]):
+                    note += (
+                        f"; {_delta(value, week_mean.iloc[i])} vs week "
+                        f"{int(shown['week_number'].iloc[i])} mean {_fmt(week_mean.iloc[i])}"
+                    )
+                row_notes[i].append(note)
+
+        for i, notes in enumerate(row_notes):
+            if notes:
+                lines.append(f"- {_row_label(shown.iloc[i])}: " + "; ".join(notes))
+        if len(df) > max_rows and any(row_notes):
+            lines.append(f"(per-row figures for the first {max_rows} of {len(df)} rows)")
+        return "\n".join(lines)
+
+
+def _is_per_employee(columns: List[Any]) -> bool:
+    return any(str(c).lower() in ("full_name", "employee_id") for c in columns)
+
+
+def _row_label(row: pd.Series) -> str:
+    """Who or what a result row is about: name (department, week) as far as the columns tell"""
+    names = [str(row[c]) for c in _LABEL_COLUMNS if c in row.index and pd.notna(row[c])]
+    label = names[0] if names else f"row {row.name + 1}"
+    details = []
+    if "department" in row.index and pd.notna(row["department"]) and label != str(row["department"]):
+        details.append(str(row["department"]))
+    if "week_number" in row.index and pd.notna(row["week_number"]):
+        week = row["week_number"]
+        details.append(f"week {int(week) if float(week).is_integer() else week}")
+    return f"{label} ({', '.join(details)})" if details else label
+
+
+def fixture_stats(weeks: int = 10, seed: int = 42) -> CompanyStats:
+    """Reference statistics of the populate_data.py fixture employees (offline runs)"""
+    from populate_data import ACTIVITY_COLUMNS, fixture_rows
+
+    rows = [dict(zip(ACTIVITY_COLUMNS, row)) for row in fixture_rows(weeks, seed)]
+    return CompanyStats.from_rows(rows, version="fixture")
+
+
+def _source() -> Tuple[Optional[str], Any]:
+    """(version, loader) of the current activities snapshot: replica when enabled, else MySQL"""
+    from replica import get_replica
+
+    replica = get_replica()
+    if replica:
+        return replica.version(), lambda: replica.query(AGGREGATE_SQL)
+
+    from db import get_connection
+    from result_cache import probe_table_version
+
+    def load() -> List[Dict[str, Any]]:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(AGGREGATE_SQL)
+                return cursor.fetchall()
+
+    with get_connection() as conn:
+        return probe_table_version(conn, "activities"), load
+
+
+_default: Optional[CompanyStats] = None
+_pinned: Optional[CompanyStats] = None
+_checked_at = 0.0
+_default_lock = threading.Lock()
+
+
+def set_stats(stats: Optional[CompanyStats]) -> None:
+    """Pin a snapshot (offline benchmark / regression runs); None returns to the database"""
+    global _pinned
+    with _default_lock:
+        _pinned = stats
+
+
+def get_stats() -> Optional[CompanyStats]:
+    """
+    Process-wide reference statistics, rebuilt when the activities version
+    changes (checked at most every STATS_TTL seconds); None when disabled or
+    the data cannot be read
+    """
+    global _default, _checked_at
+    if os.getenv("NARRATION_STATS", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    with _default_lock:
+        if _pinned is not None:
+            return _pinned
+        if time.monotonic() - _checked_at >= STATS_TTL:
+            _checked_at = time.monotonic()  # failed loads also wait a full TTL
+            try:
+                version, load = _source()
+                if _default is None or version != _default.version:
+                    with telemetry.span("stats_load") as span:
+                        _default = CompanyStats.from_rows(load(), version)
+                        span.set(rows=_default.rows)
+            except Exception as e:
+                print(f"⚠️ Narration statistics unavailable: {e}")
+        return _default
+
+
+def narration_facts(results: List[Dict[str, Any]]) -> str:
+    """Facts block for the narration prompt ("" when there is nothing to compare)"""
+    if not results:
+        return ""
+    stats = get_stats()
+    if stats is None:
+        return ""
+    with telemetry.span("narration_stats", rows=len(results)) as span:
+        facts = stats.facts(results)
+        span.set(lines=facts.count("\n") + 1 if facts else 0)
+        return facts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reference statistics for narration")
+    parser.add_argument("--fixture", action="store_true", help="Use the fixture employees, no database")
+    parser.add_argument("--sql", help="Run this SELECT and print the facts narration would get")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.fixture:
+        from replica import fixture_replica
+
+        stats, replica = fixture_stats(), fixture_replica()
+        run = replica.query
+    else:
+        stats = get_stats()
+        if stats is None:
+            raise SystemExit("❌ No statistics (NARRATION_STATS=off or the database is unreachable)")
+        from llm_integration import execute_guarded
+
+        run = lambda sql: execute_guarded(sql, use_cache=False).rows  # noqa: E731
+    print(f"Snapshot of {stats.rows} employee-weeks in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    if args.sql:
+        rows = run(args.sql)
+        start = time.perf_counter()
+        facts = stats.facts(rows)
+        print(facts or "(no metric columns in the result)")
+        print(f"{len(rows)} rows → facts in {(time.perf_counter() - start) * 1000:.1f}ms")
+    else:
+        for grain in GRAINS:
+            for metric in METRICS:
+                print(stats.reference_line(metric, grain))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+# scripts/telemetry.py
+"""Per-stage instrumentation for the NL → SQL → answer pipeline.
+
+Code under measurement opens spans and bumps counters:
+
+    with telemetry.span("sql_generation", cache_hit=False) as s:
+        ...
+        s.set(rows=len(rows))
+    telemetry.count("llm_prompt_tokens", usage.prompt_tokens, stage="sql_generation")
+
+Spans nest: each event carries the trace id of the outermost span so one
+question's stages can be grouped. Events go to every registered sink:
+
+    JsonLogSink        one JSON object per line (file or stderr)
+    HistogramSink      in-memory latency buckets, percentiles and counter totals
+    PrometheusTextSink Prometheus text-format file for a node_exporter textfile collector
+
+Sinks come from TELEMETRY_SINKS (comma-separated: json, histogram, prometheus)
+or are added with add_sink(). With no sinks, spans only cost two clock reads.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_PROM_PATH = Path(__file__).parent / ".cache" / "metrics.prom"
+
+# Latency bucket bounds in seconds (Prometheus `le` labels)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current: ContextVar[Optional["Span"]] = ContextVar("telemetry_span", default=None)
+
+
+class Span:
+    """One timed stage; attributes set while it runs are attached to its event"""
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        parent = _current.get()
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.perf_counter()
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """Time the enclosed block; exceptions are recorded as `error` and re-raised"""
+    current = Span(name, attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        _record_span(name, time.perf_counter() - current.start, current.attrs, current)
+
+
+def observe(name: str, seconds: float, **attrs: Any) -> None:
+    """Record a duration measured elsewhere (e.g. across generator yields)"""
+    _record_span(name, seconds, attrs, None)
+
+
+def _record_span(
+    name: str, seconds: float, attrs: Dict[str, Any], current: Optional[Span]
+) -> None:
+    sinks = get_sinks()
+    if not sinks:
+        return
+    parent = _current.get()
+    if current is not None:
+        trace_id, parent_id = current.trace_id, current.parent_id
+    else:
+        trace_id = parent.trace_id if parent else None
+        parent_id = parent.span_id if parent else None
+    event = {
+        "type": "span",
+        "name": name,
+        "ts": time.time(),
+        "duration_ms": round(seconds * 1000, 3),
+        "trace_id": trace_id,
+        "parent_id": parent_id,
+        "attrs": attrs,
+    }
+    _emit(event, sinks)
+
+
+def count(name: str, value: float = 1, **labels: Any) -> None:
+    """Add `value` to counter `name` (rows returned, tokens, cache hits ...)"""
+    sinks = get_sinks()
+    if not sinks or not value:
+        return
+    parent = _current.get()
+    event = {
+        "type": "counter",
+        "name": name,
+        "ts": time.time(),
+        "value": value,
+        "trace_id": parent.trace_id if parent else None,
+        "labels": labels,
+    }
+    _emit(event, sinks)
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """Prompt tokens served from the provider's prefix cache (DeepSeek or OpenAI field names)"""
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+    return cached or 0
+
+
+def record_usage(response: Any, stage: str, **labels: Any) -> None:
+    """
+    Prompt/completion/cached-prompt token counters from an OpenAI-style `usage`
+    field, if present; the totals are also attached to the enclosing span
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    tokens = {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_prompt_tokens": cached_prompt_tokens(usage),
+    }
+    for name, value in tokens.items():
+        count(f"llm_{name}", value, stage=stage, **labels)
+    current = _current.get()
+    if current:
+        current.set(**{k: current.attrs.get(k, 0) + v for k, v in tokens.items()})
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    count("cache_hits" if hit else "cache_misses", 1, cache=cache)
+
+
+def _emit(event: Dict[str, Any], sinks: List[Any]) -> None:
+    for sink in sinks:
+        try:
+            sink.emit(event)
+        except Exception as e:
+            print(f"⚠️ Telemetry sink {type(sink).__name__} failed: {e}", file=sys.stderr)
+
+
+# Sinks ================================================================
+class JsonLogSink:
+    """Structured log: one JSON event per line"""
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        if path and path != "-":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._stream = open(path, "a", encoding="utf-8")
+        else:
+            self._stream = sys.stderr
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        line = json.dumps(event, default=str, ensure_ascii=False)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class HistogramSink:
+    """In-memory span latency histograms (plus recent samples for percentiles) and counter totals"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, max_samples: int = 2048):
+        self.buckets = tuple(sorted(buckets))
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hist: Dict[str, Dict[str, Any]] = {}
+            self._samples: Dict[str, Deque[float]] = {}
+            self._counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            if event["type"] == "span":
+                seconds = event["duration_ms"] / 1000
+                hist = self._hist.setdefault(
+                    event["name"], {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                )
+                for i, bound in enumerate(self.buckets):
+                    if seconds <= bound:
+                        hist["counts"][i] += 1
+                hist["sum"] += seconds
+                hist["count"] += 1
+                self._samples.setdefault(event["name"], deque(maxlen=self.max_samples)).append(
+                    event["duration_ms"]
+                )
+            elif event["type"] == "counter":
+                series = self._counters.setdefault(event["name"], {})
+                key = _label_key(event["labels"])
+                series[key] = series.get(key, 0) + event["value"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-span count/mean/percentiles (ms) and per-label counter totals"""
+        with self._lock:
+            spans = {}
+            for name, hist in self._hist.items():
+                ordered = sorted(self._samples[name])
+                spans[name] = {
+                    "count": hist["count"],
+                    "mean_ms": round(hist["sum"] * 1000 / hist["count"], 2),
+                    "p50_ms": round(_percentile(ordered, 50), 2),
+                    "p95_ms": round(_percentile(ordered, 95), 2),
+                    "p99_ms": round(_percentile(ordered, 99), 2),
+                }
+            counters = {
+                name: {",".join(f"{k}={v}" for k, v in key) or "total": value for key, value in series.items()}
+                for name, series in self._counters.items()
+            }
+            return {"spans": spans, "counters": counters}
+
+    def histograms(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {"counts": list(h["counts"]), "sum": h["sum"], "count": h["count"]}
+                for name, h in self._hist.items()
+            }
+
+    def counters(self) -> Dict[str, Dict[Tuple[Tuple[str, str], ...], float]]:
+        with self._lock:
+            return {name: dict(series) for name, series in self._counters.items()}
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def _prom_labels(pairs: Tuple[Tuple[str, str], ...]) -> str:
+    if not pairs:
+        return ""
+    escaped = []
+    for key, value in pairs:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class PrometheusTextSink:
+    """
+    Aggregates like HistogramSink and rewrites a Prometheus text-format file at
+    most every `interval` seconds (and on flush / exit). The file is replaced
+    atomically so a textfile collector never reads a partial write.
+    """
+
+    def __init__(self, path: Any = DEFAULT_PROM_PATH, interval: float = 5.0, prefix: str = "nlq"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self.prefix = prefix
+        self._hist = HistogramSink()
+        self._last_write = 0.0
+        self._write_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        self._hist.emit(event)
+        if time.monotonic() - self._last_write >= self.interval:
+            self.flush()
+
+    def render(self) -> str:
+        metric = f"{self.prefix}_span_duration_seconds"
+        lines = [
+            f"# HELP {metric} Pipeline stage latency.",
+            f"# TYPE {metric} histogram",
+        ]
+        for name, hist in sorted(self._hist.histograms().items()):
+            for bound, n in zip(self._hist.buckets, hist["counts"]):
+                labels = _prom_labels((("span", name), ("le", repr(bound))))
+                lines.append(f"{metric}_bucket{labels} {n}")
+            lines.append(f'{metric}_bucket{_prom_labels((("span", name), ("le", "+Inf")))} {hist["count"]}')
+            lines.append(f"{metric}_sum{_prom_labels((('span', name),))} {hist['sum']:.6f}")
+            lines.append(f"{metric}_count{_prom_labels((('span', name),))} {hist['count']}")
+        for name, series in sorted(self._hist.counters().items()):
+            counter = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {counter} counter")
+            for key, value in sorted(series.items()):
+                # Full precision: `:g` would print 1234567 as 1.23457e+06
+                text = str(int(value)) if float(value).is_integer() else repr(float(value))
+                lines.append(f"{counter}{_prom_labels(key)} {text}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self) -> None:
+        with self._write_lock:
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(self.render(), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._last_write = time.monotonic()
+
+
+# Registry =============================================================
+_sinks: Optional[List[Any]] = None
+_sinks_lock = threading.Lock()
+
+
+def _sinks_from_env() -> List[Any]:
+    sinks: List[Any] = []
+    for name in filter(None, (n.strip().lower() for n in os.getenv("TELEMETRY_SINKS", "").split(","))):
+        if name == "json":
+            sinks.append(JsonLogSink(os.getenv("TELEMETRY_JSON_PATH")))
+        elif name == "histogram":
+            sinks.append(HistogramSink())
+        elif name == "prometheus":
+            sinks.append(
+                PrometheusTextSink(
+                    os.getenv("TELEMETRY_PROM_PATH", DEFAULT_PROM_PATH),
+                    interval=float(os.getenv("TELEMETRY_PROM_INTERVAL", 5.0)),
+                )
+            )
+        else:
+            print(f"⚠️ Unknown telemetry sink: {name}", file=sys.stderr)
+    return sinks
+
+
+def get_sinks() -> List[Any]:
+    global _sinks
+    if _sinks is None:
+        with _sinks_lock:
+            if _sinks is None:
+                _sinks = _sinks_from_env()
+    return _sinks
+
+
+def add_sink(sink: Any) -> Any:
+    global _sinks
+    with _sinks_lock:
+        _sinks = list(_sinks if _sinks is not None else _sinks_from_env()) + [sink]
+    return sink
+
+
+def remove_sink(sink: Any) -> None:
+    global _sinks
+    with _sinks_lock:
+        if _sinks is not None:
+            _sinks = [s for s in _sinks if s is not sink]
@@ -1,101 +1,342 @@
 # Save as scripts/visualize_db.py
-import matplotlib.pyplot as plt
-import pandas as pd
-import pymysql
+import argparse
+import hashlib
 import os
-import seaborn as sns
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")  # headless, no pyplot state machine needed
+
+import pandas as pd
+import seaborn as sns
+from matplotlib.figure import Figure
 from scipy import stats
+from db import get_connection
+from replica import QUERY_BACKEND, get_replica
+
+# Aggregates are computed by MySQL so only chart-sized results reach Python
+AGGREGATE_QUERIES = {
+    "department_counts": """
+        SELECT department, COUNT(*) AS records
+        FROM activities
+        GROUP BY department
+        ORDER BY records DESC
+    """,
+    "hours_by_employee": """
+        SELECT full_name, AVG(hours_worked) AS avg_hours
+        FROM activities
+        GROUP BY full_name
+        ORDER BY avg_hours DESC
+    """,
+    "weekly_sales": """
+        SELECT week_number, full_name, SUM(total_sales_rmb) AS sales
+        FROM activities
+        WHERE department = 'Sales'
+        GROUP BY week_number, full_name
+    """,
+    "meetings": """
+        SELECT department, full_name, SUM(num_meetings) AS meetings
+        FROM activities
+        GROUP BY department, full_name
+    """,
+}
+
+# Numeric columns for the correlation heatmap
+NUMERIC_COLUMNS = ["week_number", "num_meetings", "total_sales_rmb", "hours_worked"]
+
+
+def _moments_query(columns):
+    """One-pass sums from which Pearson correlations are derived"""
+    terms = ["COUNT(*) AS n"]
+    for i, a in enumerate(columns):
+        terms.append(f"SUM({a}) AS s_{a}")
+        for b in columns[i:]:
+            terms.append(f"SUM({a} * {b}) AS p_{a}__{b}")
+    return f"SELECT {', '.join(terms)} FROM activities"
+
+
+def correlation_from_moments(moments, columns) -> pd.DataFrame:
+    """Pearson correlation matrix from count, sums and cross-product sums"""
+    n = float(moments["n"] or 0)
+    corr = pd.DataFrame(index=columns, columns=columns, dtype="float64")
+    for i, a in enumerate(columns):
+        for b in columns[i:]:
+            sa, sb = float(moments[f"s_{a}"] or 0), float(moments[f"s_{b}"] or 0)
+            cov = float(moments[f"p_{a}__{b}"] or 0) - sa * sb / n if n else 0.0
+            var_a = float(moments[f"p_{a}__{a}"] or 0) - sa * sa / n if n else 0.0
+            var_b = float(moments[f"p_{b}__{b}"] or 0) - sb * sb / n if n else 0.0
+            denom = (var_a * var_b) ** 0.5
+            corr.loc[a, b] = corr.loc[b, a] = cov / denom if denom > 0 else float("nan")
+    return corr
+
+
+def load_aggregates(db):
+    """
+    Run every aggregate query and return compact DataFrames keyed by name
+    (`db` is a MySQL connection or a replica.Replica)
+    """
+    frames = {}
+    with db.cursor() as cursor:
+        for name, sql in AGGREGATE_QUERIES.items():
+            cursor.execute(sql)
+            frame = pd.DataFrame(list(cursor.fetchall()))
+            for col in frame.columns:
+                if col in ("department", "full_name"):
+                    frame[col] = frame[col].astype("category")
+                elif col == "week_number":
+                    frame[col] = frame[col].astype("int32")
+                else:
+                    frame[col] = frame[col].astype("float32")
+            frames[name] = frame
 
+        cursor.execute(_moments_query(NUMERIC_COLUMNS))
+        frames["correlation"] = correlation_from_moments(cursor.fetchone(), NUMERIC_COLUMNS)
+    return frames
 
-# Database connection
-db = pymysql.connect(
-    host=os.getenv("DB_HOST", "mysql"),
-    user=os.getenv("DB_USER", "root"),
-    password=os.getenv("DB_PASSWORD", "123456"),
-    database=os.getenv("DB_NAME", "employee_tracking"),
-)
-
-# Get data
-query = "SELECT * FROM activities"
-df = pd.read_sql(query, db)
-db.close()
-
-# Create output directory
-output_dir = Path("./visualizations")
-output_dir.mkdir(exist_ok=True)
-
-# Set style
-sns.set(style="whitegrid")
-
-# 1. Department Distribution
-plt.figure(figsize=(10, 6))
-dept_counts = df["department"].value_counts()
-dept_counts.plot(kind="bar", color=sns.color_palette("viridis", len(dept_counts)))
-plt.title("Employee Distribution by Department")
-plt.xlabel("Department")
-plt.ylabel("Number of Records")
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig(output_dir / "1_department_distribution.png")
-print(f"Saved department distribution to {output_dir}/1_department_distribution.png")
-
-# 2. Hours Worked by Employee
-plt.figure(figsize=(12, 6))
-hours_by_emp = (
-    df.groupby("full_name")["hours_worked"].mean().sort_values(ascending=False)
-)
-hours_by_emp.plot(kind="bar", color=sns.color_palette("magma", len(hours_by_emp)))
-plt.title("Average Hours Worked by Employee")
-plt.xlabel("Employee")
-plt.ylabel("Average Hours")
-plt.axhline(y=40, color="r", linestyle="--", label="40 Hour Threshold")
-plt.legend()
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig(output_dir / "2_hours_by_employee.png")
-print(f"Saved hours by employee to {output_dir}/2_hours_by_employee.png")
-
-# 3. Sales Performance (for Sales department)
-plt.figure(figsize=(12, 6))
-sales_df = df[df["department"] == "Sales"]
-if not sales_df.empty:
+
+def _rotate_xticks(ax, rotation=45):
+    ax.tick_params(axis="x", labelrotation=rotation)
+
+
+# Each chart function draws onto its own Figure and saves it to `path`
+def plot_department_distribution(frames, path):
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    dept_counts = frames["department_counts"].set_index("department")["records"]
+    dept_counts.index = dept_counts.index.astype(str)
+    dept_counts.plot(
+        kind="bar", ax=ax, color=sns.color_palette("viridis", len(dept_counts))
+    )
+    ax.set_title("Employee Distribution by Department")
+    ax.set_xlabel("Department")
+    ax.set_ylabel("Number of Records")
+    _rotate_xticks(ax)
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def plot_hours_by_employee(frames, path):
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    hours_by_emp = frames["hours_by_employee"].set_index("full_name")["avg_hours"]
+    hours_by_emp.index = hours_by_emp.index.astype(str)
+    hours_by_emp.plot(
+        kind="bar", ax=ax, color=sns.color_palette("magma", len(hours_by_emp))
+    )
+    ax.set_title("Average Hours Worked by Employee")
+    ax.set_xlabel("Employee")
+    ax.set_ylabel("Average Hours")
+    ax.axhline(y=40, color="r", linestyle="--", label="40 Hour Threshold")
+    ax.legend()
+    _rotate_xticks(ax)
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def plot_sales_performance(frames, path):
+    """Sales department only; nothing is drawn when there are no Sales rows"""
+    sales_df = frames["weekly_sales"]
+    if sales_df.empty:
+        return False
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
     pivot = sales_df.pivot_table(
         index="week_number",
         columns="full_name",
-        values="total_sales_rmb",
+        values="sales",
         aggfunc="sum",
+        observed=True,
     )
-    pivot.plot(marker="o")
-    plt.title("Weekly Sales Performance by Employee")
-    plt.xlabel("Week Number")
-    plt.ylabel("Sales (RMB)")
-    plt.grid(True)
-    plt.legend(title="Employee")
-    plt.tight_layout()
-    plt.savefig(output_dir / "3_sales_performance.png")
-    print(f"Saved sales performance to {output_dir}/3_sales_performance.png")
-
-# 4. Meetings Distribution
-plt.figure(figsize=(10, 6))
-meetings = df.groupby(["department", "full_name"])["num_meetings"].sum().unstack(0)
-meetings.plot(kind="bar", stacked=True)
-plt.title("Total Meetings by Employee and Department")
-plt.xlabel("Employee")
-plt.ylabel("Number of Meetings")
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig(output_dir / "4_meetings_distribution.png")
-print(f"Saved meetings distribution to {output_dir}/4_meetings_distribution.png")
-
-# 5. Correlation Heatmap
-plt.figure(figsize=(8, 6))
-numeric_cols = df.select_dtypes(include=["number"]).columns
-corr = df[numeric_cols].corr()
-sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f", linewidths=0.5)
-plt.title("Correlation Between Numeric Variables")
-plt.tight_layout()
-plt.savefig(output_dir / "5_correlation_heatmap.png")
-print(f"Saved correlation heatmap to {output_dir}/5_correlation_heatmap.png")
-
-print("\nAll visualizations completed!")
+    pivot.plot(marker="o", ax=ax)
+    ax.set_title("Weekly Sales Performance by Employee")
+    ax.set_xlabel("Week Number")
+    ax.set_ylabel("Sales (RMB)")
+    ax.grid(True)
+    ax.legend(title="Employee")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def plot_meetings_distribution(frames, path):
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    meetings = frames["meetings"].pivot_table(
+        index="full_name",
+        columns="department",
+        values="meetings",
+        aggfunc="sum",
+        observed=True,
+    )
+    meetings.plot(kind="bar", stacked=True, ax=ax)
+    ax.set_title("Total Meetings by Employee and Department")
+    ax.set_xlabel("Employee")
+    ax.set_ylabel("Number of Meetings")
+    _rotate_xticks(ax)
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def plot_correlation_heatmap(frames, path):
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    sns.heatmap(
+        frames["correlation"], annot=True, cmap="coolwarm", fmt=".2f", linewidths=0.5, ax=ax
+    )
+    ax.set_title("Correlation Between Numeric Variables")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+# name -> (output file, aggregate inputs, renderer)
+CHARTS = {
+    "department_distribution": (
+        "1_department_distribution.png",
+        ["department_counts"],
+        plot_department_distribution,
+    ),
+    "hours_by_employee": (
+        "2_hours_by_employee.png",
+        ["hours_by_employee"],
+        plot_hours_by_employee,
+    ),
+    "sales_performance": (
+        "3_sales_performance.png",
+        ["weekly_sales"],
+        plot_sales_performance,
+    ),
+    "meetings_distribution": (
+        "4_meetings_distribution.png",
+        ["meetings"],
+        plot_meetings_distribution,
+    ),
+    "correlation_heatmap": (
+        "5_correlation_heatmap.png",
+        ["correlation"],
+        plot_correlation_heatmap,
+    ),
+}
+
+
+def aggregate_digest(name, frames):
+    """Digest of the chart's input data; bump the chart name or use --force after style changes"""
+    h = hashlib.sha256(name.encode("utf-8"))
+    for key in CHARTS[name][1]:
+        h.update(key.encode("utf-8"))
+        h.update(frames[key].to_csv().encode("utf-8"))
+    return h.hexdigest()
+
+
+def _digest_path(png_path):
+    return png_path.with_suffix(".digest")
+
+
+def _init_worker():
+    # Set style
+    sns.set(style="whitegrid")
+
+
+def render_chart(name, frames, output_dir):
+    """Worker entry point: render one chart and record its input digest next to the PNG"""
+    filename, _, renderer = CHARTS[name]
+    path = Path(output_dir) / filename
+    if renderer(frames, path) is False:
+        return name, None
+    _digest_path(path).write_text(aggregate_digest(name, frames))
+    return name, path
+
+
+def stale_charts(names, aggregates, output_dir):
+    """Charts whose PNG is missing or whose recorded digest no longer matches"""
+    stale = []
+    for name in names:
+        path = Path(output_dir) / CHARTS[name][0]
+        digest_file = _digest_path(path)
+        if (
+            path.exists()
+            and digest_file.exists()
+            and digest_file.read_text().strip() == aggregate_digest(name, aggregates)
+        ):
+            print(f"Unchanged, skipping {path}")
+            continue
+        stale.append(name)
+    return stale
+
+
+def render_charts(names, aggregates, output_dir, workers=None):
+    """Render charts in a process pool, each worker getting only its inputs"""
+    if not names:
+        return []
+    rendered = []
+    with ProcessPoolExecutor(
+        max_workers=min(len(names), workers or os.cpu_count() or 1),
+        initializer=_init_worker,
+    ) as executor:
+        futures = [
+            executor.submit(
+                render_chart,
+                name,
+                {key: aggregates[key] for key in CHARTS[name][1]},
+                output_dir,
+            )
+            for name in names
+        ]
+        for future in futures:
+            name, path = future.result()
+            if path is None:
+                print(f"No data for {name}, skipped")
+            else:
+                print(f"Saved {name.replace('_', ' ')} to {path}")
+                rendered.append(name)
+    return rendered
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render dashboard charts")
+    parser.add_argument(
+        "charts",
+        nargs="*",
+        metavar="CHART",
+        help=f"Charts to render (default: all). Choices: {', '.join(CHARTS)}",
+    )
+    parser.add_argument("--force", action="store_true", help="Re-render even if data is unchanged")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (default: CPU count)")
+    parser.add_argument("--output-dir", default="./visualizations")
+    parser.add_argument(
+        "--source",
+        choices=["mysql", "replica"],
+        default="replica" if QUERY_BACKEND == "replica" else "mysql",
+        help="Aggregate on MySQL or on the local replica (synced first)",
+    )
+    args = parser.parse_args(argv)
+    unknown = [c for c in args.charts if c not in CHARTS]
+    if unknown:
+        parser.error(f"unknown chart(s): {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.charts or list(CHARTS)
+
+    # Get data
+    if args.source == "replica":
+        aggregates = load_aggregates(get_replica(enabled=True))
+    else:
+        with get_connection() as db:
+            aggregates = load_aggregates(db)
+
+    # Create output directory
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(exist_ok=True)
+
+    if not args.force:
+        names = stale_charts(names, aggregates, output_dir)
+    rendered = render_charts(names, aggregates, output_dir, args.workers)
+
+    print(f"\nAll visualizations completed! ({len(rendered)} rendered)")
+
+
+if __name__ == "__main__":
+    main()